@@ -3,8 +3,8 @@ import time
 import os
 import subprocess
 
-# Suppress ALSA error messages
-os.environ['ALSA_OUTPUT_STDERR'] = '0'
+# audio setup is shared with the instruments, run from the repository root
+from imogenviz.pyo_server import AudioSession, detect_backend, probe_buffer_size
 
 # Function to get default PulseAudio sink index
 def get_default_pulse_sink():
@@ -25,79 +25,34 @@ def get_default_pulse_sink():
         print(f"Error getting default sink: {e}")
         return 0
 
-# Function to check if JACK is running
-def is_jack_running():
-    try:
-        result = subprocess.run(['jack_control', 'status'], capture_output=True, text=True)
-        return "started" in result.stdout.lower()
-    except:
-        return False
-
-# Function to list available pyo audio backends
-def list_available_backends():
-    print("\nAvailable pyo audio backends:")
-    for backend in ['jack', 'portaudio', 'pa', 'coreaudio', 'offline']:
-        try:
-            # Create a test server to see if the backend is available
-            test_server = Server(audio=backend)
-            print(f"- {backend} (available)")
-        except:
-            print(f"- {backend} (not available)")
-
 # Determine the best audio backend to use
 print("Checking audio system...")
-if is_jack_running():
-    print("JACK audio server detected!")
-    audio_backend = 'jack'
-    print("Using JACK audio - this should work well with other audio applications")
-else:
-    print("JACK not running, using PortAudio with PulseAudio")
-    audio_backend = 'pa'  # PortAudio will use PulseAudio on Linux
+audio_backend = detect_backend()
+print(f"Detected backend: {audio_backend}")
 
-# List backends and available devices
-list_available_backends()
+OUTPUT_DEVICE = None
+if audio_backend == "portaudio":
+    # Display audio devices
+    print("\nAvailable audio devices:")
+    pa_list_devices()
 
-# Display audio devices
-print("\nAvailable audio devices:")
-pa_list_devices()
+    # Try to get the default PulseAudio sink
+    default_device = get_default_pulse_sink()
+    print(f"\nDetected default PulseAudio sink: {default_device}")
 
-# Try to get the default PulseAudio sink
-default_device = get_default_pulse_sink()
-print(f"\nDetected default PulseAudio sink: {default_device}")
+    # Let user choose the device
+    device_input = input(f"Enter output device number (press Enter for default {default_device}): ")
+    OUTPUT_DEVICE = int(device_input) if device_input.strip() else default_device
 
-# Let user choose the device
-device_input = input(f"Enter output device number (press Enter for default {default_device}): ")
-if device_input.strip():
-    OUTPUT_DEVICE = int(device_input)
-else:
-    OUTPUT_DEVICE = default_device
+print("\nProbing the smallest buffer size without dropouts...")
+buffersize = probe_buffer_size(audio_backend, output_device=OUTPUT_DEVICE)
+print(f"Stable buffer size: {buffersize}")
 
-# Audio configuration
-SAMPLING_RATE = 44100  # Standard rate
-N_CHANNELS = 2
-BUFFERSIZE = 1024  # Larger buffer for better stability
-
-# Server configuration for better compatibility
-s = Server(
-    sr=SAMPLING_RATE,
-    nchnls=N_CHANNELS,
-    buffersize=BUFFERSIZE,
-    duplex=0,  # Output only for now
-    audio=audio_backend,
-    jackname="pyo_test"
-)
-
-# Set output device (not needed if using JACK)
-if audio_backend != 'jack':
-    s.setOutputDevice(OUTPUT_DEVICE)
+session = AudioSession(backend=audio_backend, buffersize=buffersize, output_device=OUTPUT_DEVICE)
 
 try:
     print(f"Starting audio server with {audio_backend} backend on device {OUTPUT_DEVICE}...")
-    s.boot()
-    
-    # Wait a moment before starting the server
-    time.sleep(0.5)
-    s.start()
+    s = session.start()
     print("Server started successfully!")
     
     # Create a simple sine wave
@@ -123,8 +78,7 @@ try:
     
     # Clean up
     sine.stop()
-    s.stop()
-    s.shutdown()
+    session.close()
     print("Audio test completed!")
     
 except Exception as e:
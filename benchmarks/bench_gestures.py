@@ -0,0 +1,67 @@
+# Micro-benchmark: vectorized gesture features vs the python limb helpers.
+#
+# usage: python benchmarks/bench_gestures.py [n_frames]
+
+import sys
+import timeit
+
+import numpy as np
+
+from fixtures import synthetic_landmarks
+
+from limbs import average_distance, calculate_center_of_mass, r2distance, LimbIndex
+from gestures import compute_features, stack_hands
+from limb_trigger import process_hands
+
+
+def legacy_features(limb_list):
+    """The per frame work process_hand used to do on a list of LimbPositions"""
+    by_index = {limb.index: limb for limb in limb_list}
+    average_distance(limb_list)
+    calculate_center_of_mass(limb_list)
+    r2distance(by_index[LimbIndex.THUMB_TIP], by_index[LimbIndex.INDEX_FINGER_TIP])
+
+
+def bench(name, func, number, n_frames):
+    """Best of three, returns seconds per frame"""
+    seconds = min(timeit.repeat(func, number=number, repeat=3)) / number / n_frames
+    print(f"{name:<40}{seconds * 1e6:>10.1f} us/frame")
+    return seconds
+
+
+def main(n_frames=200):
+    frames = synthetic_landmarks(n_frames, n_hands=2)
+    limb_lists = [[hand.to_limb_list() for hand in frame] for frame in frames]
+    stacked = np.stack([stack_hands(frame) for frame in frames])
+
+    # sanity check the two implementations agree before timing them
+    features = compute_features(stacked[0])
+    for i, limb_list in enumerate(limb_lists[0]):
+        assert np.isclose(features.average_distance[i], average_distance(limb_list))
+
+    def run_legacy():
+        for frame in limb_lists:
+            for limb_list in frame:
+                legacy_features(limb_list)
+
+    def run_vectorized():
+        for frame in stacked:
+            compute_features(frame)
+
+    def run_process_hands():
+        for frame in frames:
+            process_hands(frame)
+
+    def run_batched():
+        compute_features(stacked.reshape(-1, *stacked.shape[2:]))
+
+    print(f"{n_frames} frames, 2 hands per frame")
+    legacy = bench("limbs helpers (python loops)", run_legacy, 1, n_frames)
+    vectorized = bench("gestures.compute_features", run_vectorized, 5, n_frames)
+    bench("limb_trigger.process_hands", run_process_hands, 5, n_frames)
+    bench("compute_features, all frames at once", run_batched, 5, n_frames)
+    print(f"speedup: {legacy / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,111 @@
+# Benchmark: mediapipe in-process vs in an InferenceWorker process, and
+# the default tracking mode vs roi_tracking.
+#
+# Each configuration tracks the same frames while a background thread does
+# python work, standing in for drawing, gesture logic and pyo calls. The
+# worker backend should keep both the tracking rate and the background
+# thread's progress up, as the model no longer holds this process's GIL.
+# roi_tracking only differs from the default on frames with fewer hands
+# than maxHands in view, so compare them on a clip of one hand: its per
+# frame time should drop by about the palm detector's share, and the roi /
+# full frame counts show how many frames skipped detection. Random frames
+# have no hands, every one of them is a full frame.
+#
+# usage: python benchmarks/bench_inference.py [--video clip.mp4] [--frames 300]
+#            [--configs inprocess,roi,process]
+
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+import fixtures  # noqa: F401, puts imogenviz/ on sys.path
+from handtracking import HandTrackingDynamic
+
+
+def load_frames(video, n_frames, width=640, height=480):
+    if video is None:
+        rng = np.random.default_rng(0)
+        return [rng.integers(0, 255, (height, width, 3), dtype=np.uint8) for _ in range(n_frames)]
+
+    cap = cv2.VideoCapture(video)
+    frames = []
+    while len(frames) < n_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(cv2.resize(frame, (width, height)))
+    cap.release()
+    return frames
+
+
+def busy_loop(stop, counter):
+    while not stop.is_set():
+        sum(i * i for i in range(1000))
+        counter[0] += 1
+
+
+CONFIGS = {
+    "inprocess": dict(backend="inprocess"),
+    "roi": dict(backend="inprocess", roi_tracking=True),
+    "process": dict(backend="process"),
+}
+
+
+def run(config, frames):
+    detector = HandTrackingDynamic(draw=False, **CONFIGS[config])
+    detector.warm_up(frames[0].shape)   # load the model, start the worker
+
+    stop = threading.Event()
+    counter = [0]
+    background = threading.Thread(target=busy_loop, args=(stop, counter), daemon=True)
+    background.start()
+
+    times = np.zeros(len(frames))
+    start = time.perf_counter()
+    for i, frame in enumerate(frames):
+        t0 = time.perf_counter()
+        detector.findFingers(frame, draw=False)
+        times[i] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    background.join()
+    detector.close()
+    return {
+        "fps": len(frames) / elapsed,
+        "mean_ms": float(times.mean() * 1000),
+        "p50_ms": float(np.percentile(times, 50) * 1000),
+        "p95_ms": float(np.percentile(times, 95) * 1000),
+        "background_iterations_per_s": counter[0] / elapsed,
+        # roi / full frames, only counted by the in process model
+        "frames": (getattr(detector, "roi_frames", 0), getattr(detector, "full_frames", 0)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--video", help="clip with hands in it, random frames if omitted")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--configs", default=",".join(CONFIGS), help=f"comma separated, of {tuple(CONFIGS)}")
+    args = parser.parse_args()
+
+    configs = args.configs.split(",")
+    unknown = [config for config in configs if config not in CONFIGS]
+    if unknown:
+        parser.error(f"unknown configs {unknown}, expected some of {tuple(CONFIGS)}")
+
+    frames = load_frames(args.video, args.frames)
+    print(f"{'config':<12}{'fps':>8}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'bg it/s':>12}{'roi/full':>12}")
+    for config in configs:
+        result = run(config, frames)
+        roi_frames, full_frames = result["frames"]
+        print(f"{config:<12}{result['fps']:>8.1f}{result['mean_ms']:>10.2f}{result['p50_ms']:>10.2f}"
+              f"{result['p95_ms']:>10.2f}{result['background_iterations_per_s']:>12.0f}"
+              f"{f'{roi_frames}/{full_frames}':>12}")
+
+
+if __name__ == "__main__":
+    main()
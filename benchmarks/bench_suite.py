@@ -0,0 +1,212 @@
+# Benchmark suite over the hot paths of a frame, from landmarks to audio.
+#
+#   tracking  mediapipe landmarks -> HandLandmarks, as findPosition gets them
+#   gestures  process_hand(s) and the limbs helpers
+#   control   PAD.play_chord / set_filter and a full controller frame
+#   render    realtime factor of PAD + Drums through the Mixer on the
+#             manual offline server
+#
+# Landmarks are synthetic by default, --recording uses a main.py --record
+# session instead. Every group runs --rounds times and each result keeps
+# its best round. Results are printed, --save writes them as JSON and
+# --compare checks them against an earlier file, exiting with 1 if any
+# benchmark got worse by more than --threshold.
+#
+# usage: python benchmarks/bench_suite.py [--recording session.npz] [--rounds 3]
+#            [--groups tracking,gestures] [--save run.json] [--compare base.json]
+
+import argparse
+import itertools
+import sys
+import time
+
+import numpy as np
+
+from fixtures import mediapipe_hands, recorded_landmarks, synthetic_landmarks, synthetic_recording
+from harness import DEFAULT_THRESHOLD, Suite, compare, load_results
+
+from limbs import HandLandmarks, average_distance, calculate_center_of_mass
+from limb_trigger import process_hand, process_hands
+
+GROUPS = ("tracking", "gestures", "control", "render")
+WIDTH, HEIGHT = 640, 480
+
+
+def bench_tracking(suite, frames):
+    mp_frames = mediapipe_hands(frames, WIDTH, HEIGHT)
+    n_hands = sum(len(frame) for frame in frames)
+
+    def convert():
+        for frame in mp_frames:
+            for hand in frame:
+                HandLandmarks.from_mediapipe(hand, WIDTH, HEIGHT)
+
+    def find_position():
+        # what findPosition does per hand: the converted landmarks and their bbox
+        for frame in mp_frames:
+            for hand in frame:
+                HandLandmarks.from_mediapipe(hand, WIDTH, HEIGHT).bbox()
+
+    suite.timing("tracking.from_mediapipe", convert, n_hands, unit="hand")
+    suite.timing("tracking.find_position", find_position, n_hands, unit="hand")
+
+
+def bench_gestures(suite, frames):
+    hands = [hand for frame in frames for hand in frame]
+    limb_lists = [hand.to_limb_list() for hand in hands]
+
+    def run_process_hand():
+        for hand in hands:
+            process_hand(hand)
+
+    def run_process_hands():
+        for frame in frames:
+            process_hands(frame)
+
+    def run_average_distance():
+        for limb_list in limb_lists:
+            average_distance(limb_list)
+
+    def run_center_of_mass():
+        for limb_list in limb_lists:
+            calculate_center_of_mass(limb_list)
+
+    def run_center_of_mass_array():
+        for hand in hands:
+            calculate_center_of_mass(hand)
+
+    suite.timing("gestures.process_hand", run_process_hand, len(hands), unit="hand")
+    suite.timing("gestures.process_hands", run_process_hands, len(frames), unit="frame")
+    suite.timing("gestures.average_distance", run_average_distance, len(hands), unit="hand")
+    suite.timing("gestures.center_of_mass", run_center_of_mass, len(hands), unit="hand")
+    suite.timing("gestures.center_of_mass_array", run_center_of_mass_array, len(hands), unit="hand")
+
+
+def bench_control(suite, frames):
+    from pyo_server import setup_offline_server, close_server
+    from pad_drone import PAD
+    from drums import Drums
+    from mixer import instrument_mixer
+    from controller import GestureController, TrackedFrame, chord_progression
+    from replay import ReplayClock
+
+    server = setup_offline_server(None)
+    pad = PAD(server=server, reverb=False)
+    drums = Drums(server=server)
+    mixer = instrument_mixer(server, pad, drums)
+
+    chords = itertools.cycle(chord_progression)
+    suite.timing("control.play_chord", lambda: pad.play_chord(*next(chords)), unit="call")
+
+    # a sweep, so every call moves the cutoff by more than its min_delta
+    cutoffs = itertools.cycle(np.geomspace(200, 8000, 64).tolist() + np.geomspace(8000, 200, 64).tolist())
+    suite.timing("control.set_filter", lambda: pad.set_filter(next(cutoffs), 0.5), unit="call")
+
+    clock = ReplayClock()
+    controller = GestureController(pad, drums, clock=clock, mixer=mixer)
+    tracked = [TrackedFrame(None, *(frame + [HandLandmarks(), HandLandmarks()])[:2], i / 30)
+               for i, frame in enumerate(frames)]
+
+    def run_frames():
+        for frame in tracked:
+            clock.now += 1 / 30
+            controller(frame)
+
+    suite.timing("control.controller_frame", run_frames, len(tracked), unit="frame")
+    close_server(server)
+
+
+def bench_render(suite, recording, seconds=20.0):
+    from pyo_server import setup_offline_server, close_server
+    from pad_drone import PAD
+    from drums import Drums
+    from mixer import instrument_mixer
+    from controller import GestureController
+    from replay import ReplayClock, replay
+
+    # instruments through the mixer: a held chord and a drum pattern of eighth notes
+    server = setup_offline_server(None)
+    pad = PAD(server=server, reverb=False)
+    drums = Drums(server=server)
+    instrument_mixer(server, pad, drums)
+    pad.play_chord("C", "maj7", 4)
+    block_time = server.getBufferSize() / server.getSamplingRate()
+    pattern = [drums.play_kick, drums.play_hihat, drums.play_snare, drums.play_hihat]
+    step, next_hit, audio_time = 0, 0.0, 0.0
+    start = time.perf_counter()
+    while audio_time < seconds:
+        if audio_time >= next_hit:
+            pattern[step % len(pattern)]()
+            step += 1
+            next_hit += 0.25
+        server.process()
+        audio_time += block_time
+    suite.add("render.pad_drums", audio_time / (time.perf_counter() - start),
+              "x realtime", higher_is_better=True)
+    close_server(server)
+
+    # the whole control path driving them, as replay.py renders a session
+    server = setup_offline_server(None)
+    clock = ReplayClock()
+    pad = PAD(server=server, reverb=False)
+    drums = Drums(server=server)
+    controller = GestureController(pad, drums, clock=clock, mixer=instrument_mixer(server, pad, drums))
+    audio_time, wall_time = replay(recording, controller, server, clock)
+    suite.add("render.replay", audio_time / wall_time, "x realtime", higher_is_better=True)
+    close_server(server)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the tracking, gesture, control and DSP hot paths")
+    parser.add_argument("--recording", metavar="NPZ", help="landmarks from main.py --record, synthetic if omitted")
+    parser.add_argument("--frames", type=int, default=300, help="synthetic frames")
+    parser.add_argument("--groups", default=",".join(GROUPS), help=f"comma separated, of {GROUPS}")
+    parser.add_argument("--rounds", type=int, default=3,
+                        help="passes over the groups, every result keeps its best pass")
+    parser.add_argument("--save", metavar="JSON", help="write the results to a file")
+    parser.add_argument("--compare", metavar="JSON", help="flag regressions against an earlier result file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fraction a result may get worse before it counts as a regression, "
+                             f"default {DEFAULT_THRESHOLD} is above the run to run noise")
+    args = parser.parse_args()
+
+    groups = args.groups.split(",")
+    unknown = [group for group in groups if group not in GROUPS]
+    if unknown:
+        parser.error(f"unknown groups {unknown}, expected some of {GROUPS}")
+
+    if args.recording:
+        from replay import load_recording
+        frames = recorded_landmarks(args.recording)
+        recording = load_recording(args.recording)
+    else:
+        frames = synthetic_landmarks(args.frames, n_hands=2)
+        recording = synthetic_recording(args.frames * 3)
+
+    suite = Suite({"fixture": args.recording or f"synthetic {args.frames} frames", "rounds": args.rounds})
+    if "control" in groups or "render" in groups:
+        import pyo
+        suite.meta["pyo"] = pyo.PYO_VERSION
+    for round_ in range(args.rounds):
+        print(f"round {round_ + 1}/{args.rounds}")
+        if "tracking" in groups:
+            bench_tracking(suite, frames)
+        if "gestures" in groups:
+            bench_gestures(suite, frames)
+        if "control" in groups:
+            bench_control(suite, frames)
+        if "render" in groups:
+            bench_render(suite, recording)
+
+    if args.save:
+        suite.save(args.save)
+    if args.compare:
+        current = {"meta": suite.meta, "results": suite.results}
+        regressions = compare(current, load_results(args.compare), args.threshold)
+        if regressions:
+            print(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
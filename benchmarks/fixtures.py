@@ -0,0 +1,86 @@
+# Landmark fixtures shared by the benchmarks.
+#
+# The modules in imogenviz/ import each other by plain name, so the package
+# directory is put on sys.path here instead of requiring an install.
+
+import os
+import sys
+
+import numpy as np
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "imogenviz")
+if PACKAGE_DIR not in sys.path:
+    sys.path.insert(0, PACKAGE_DIR)
+
+from limbs import HandLandmarks, NUM_LIMBS
+
+# Open right hand, palm facing the camera, wrist at the origin (pixels)
+HAND_TEMPLATE = np.array([
+    (0, 0),                                     # wrist
+    (-30, -20), (-50, -45), (-65, -70), (-75, -95),   # thumb
+    (-25, -90), (-28, -130), (-30, -155), (-32, -175),  # index
+    (0, -95), (0, -140), (0, -168), (0, -190),        # middle
+    (22, -90), (25, -130), (27, -155), (28, -172),    # ring
+    (42, -80), (48, -110), (52, -130), (55, -145),    # pinky
+    ], dtype=np.float64)
+
+
+def synthetic_hands(n_frames=1000, n_hands=2, seed=0) -> np.ndarray:
+    """(n_frames, n_hands, 21, 2) int32 landmarks of hands wandering over a 640x480 frame"""
+    rng = np.random.default_rng(seed)
+    t = np.arange(n_frames)[:, None]
+    centers = np.stack([
+        160 + 320 * np.arange(n_hands)[None, :] + 40 * np.sin(t / 30 + np.arange(n_hands)),
+        360 + 30 * np.cos(t / 45 + np.arange(n_hands)),
+        ], axis=-1)
+    scale = (0.7 + 0.3 * np.sin(t / 60))[:, :, None, None]
+    jitter = rng.normal(0, 2.0, (n_frames, n_hands, NUM_LIMBS, 2))
+    points = centers[:, :, None, :] + HAND_TEMPLATE * scale + jitter
+    return points.astype(np.int32)
+
+
+def synthetic_landmarks(n_frames=1000, n_hands=2, seed=0) -> list[list[HandLandmarks]]:
+    points = synthetic_hands(n_frames, n_hands, seed)
+    return [[HandLandmarks(hand) for hand in frame] for frame in points]
+
+
+def synthetic_recording(n_frames=900, fps=30.0, seed=0):
+    """replay.Recording of synthetic_hands, both hands present, at fps"""
+    from replay import Recording
+
+    hands = synthetic_hands(n_frames, n_hands=2, seed=seed).astype(np.int16)
+    timestamps = np.arange(n_frames) / fps
+    present = np.ones((n_frames, 2), dtype=bool)
+    return Recording(timestamps, hands, present)
+
+
+def recorded_landmarks(path) -> list[list[HandLandmarks]]:
+    """Frames of a main.py --record recording, missing hands left out"""
+    from replay import load_recording
+
+    recording = load_recording(path)
+    frames = []
+    for i in range(len(recording)):
+        tracked = recording.frame(i)
+        frames.append([hand for hand in (tracked.left_hand, tracked.right_hand) if len(hand) > 0])
+    return frames
+
+
+class _Landmark:
+    __slots__ = ("x", "y", "z")
+
+    def __init__(self, x, y, z=0.0):
+        self.x, self.y, self.z = x, y, z
+
+
+class _LandmarkList:
+    """Stands in for a mediapipe NormalizedLandmarkList"""
+
+    def __init__(self, landmark):
+        self.landmark = landmark
+
+
+def mediapipe_hands(frames, width=640, height=480) -> list[list[_LandmarkList]]:
+    """The hands of frames as mediapipe would return them, normalized to the frame size"""
+    return [[_LandmarkList([_Landmark(x / width, y / height) for x, y in hand.points])
+             for hand in frame] for frame in frames]
@@ -0,0 +1,130 @@
+# Timing, result files and regression checks for the benchmark suite.
+#
+# A result file is JSON:
+#   {"meta": {"date": ..., "python": ..., "numpy": ..., ...},
+#    "results": {"gestures.process_hand": {"value": 12.3, "unit": "us/hand",
+#                                          "higher_is_better": false, ...}}}
+#
+# Two files are compared benchmark by benchmark, on the best run of each. A
+# result counts as a regression when it is worse than the baseline by more
+# than the threshold, in whichever direction is worse for it (time goes up,
+# realtime factor goes down). Results in the baseline that the current run
+# does not have are listed as missing.
+#
+# Every timed run lasts at least min_time, and the suite can run several
+# rounds, a result keeping the best of all of them. Slow phases of a shared
+# machine last longer than one benchmark, so back to back runs alone do not
+# filter them, rounds minutes apart help. On the development VM (one shared
+# core) two single round runs of the same code differed by up to 70%, the
+# best of 3 rounds by up to 31%, DEFAULT_THRESHOLD sits above that. On a
+# quiet machine a tighter --threshold can be used.
+
+import json
+import math
+import platform
+import sys
+import timeit
+from datetime import datetime
+
+import numpy as np
+
+# fraction a result may get worse before it counts as a regression, above
+# the run to run noise of the suite
+DEFAULT_THRESHOLD = 0.4
+
+
+def time_per_unit(func, units=1, number=None, repeat=5, min_time=1.0) -> dict:
+    """
+    Seconds per unit of work of func, best and median of repeat runs
+
+    Parameters:
+    - units: Units of work one call of func does, e.g. frames or hands
+    - number: Calls per run, None picks enough for every run to last at
+      least min_time seconds
+    """
+    func()  # warm up caches and lazily built state
+    if number is None:
+        # a rough estimate on a fraction of min_time, then scaled up
+        number = 1
+        while True:
+            elapsed = timeit.timeit(func, number=number)
+            if elapsed >= 0.1 * min_time or number >= 1 << 20:
+                break
+            number *= 2
+        number = max(number, math.ceil(number * min_time / max(elapsed, 1e-9)))
+    runs = np.array(timeit.repeat(func, number=number, repeat=repeat)) / number / units
+    return {"best": float(runs.min()), "median": float(np.median(runs)), "calls": number}
+
+
+class Suite:
+    """Collects named results, see the module header for the file format"""
+
+    def __init__(self, meta=None):
+        self.results = {}
+        self.meta = {
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "argv": sys.argv[1:],
+        }
+        self.meta.update(meta or {})
+
+    def timing(self, name, func, units=1, unit="frame", scale=1e6, **kwargs):
+        """Time func, stored as microseconds (scale) per unit, lower is better"""
+        timing = time_per_unit(func, units, **kwargs)
+        self.add(name, timing["best"] * scale, f"us/{unit}", higher_is_better=False,
+                 median=timing["median"] * scale, calls=timing["calls"])
+
+    def add(self, name, value, unit, higher_is_better=False, **extra):
+        """Store a result, a name added again in a later round keeps the better value"""
+        old = self.results.get(name)
+        if old is None or (value > old["value"] if higher_is_better else value < old["value"]):
+            self.results[name] = {"value": float(value), "unit": unit,
+                                  "higher_is_better": higher_is_better, **extra}
+        self.results[name]["rounds"] = 1 if old is None else old["rounds"] + 1
+        print(f"{name:<36}{value:>12.2f} {unit}")
+
+    def save(self, path):
+        with open(path, "w") as f:
+            json.dump({"meta": self.meta, "results": self.results}, f, indent=2)
+
+
+def load_results(path) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(current: dict, baseline: dict, threshold=DEFAULT_THRESHOLD) -> list:
+    """
+    Print current results against a baseline, returns the regressed names
+
+    Parameters:
+    - current, baseline: Result files as loaded by load_results
+    - threshold: Fraction a result may get worse before it is flagged
+    """
+    regressions = []
+    if current["meta"].get("fixture") != baseline["meta"].get("fixture"):
+        print(f"note: fixtures differ, {baseline['meta'].get('fixture')} -> {current['meta'].get('fixture')}")
+    print(f"{'benchmark':<36}{'baseline':>12}{'current':>12}{'change':>10}")
+    for name, result in current["results"].items():
+        old = baseline["results"].get(name)
+        if old is None or old["unit"] != result["unit"] or old["value"] == 0:
+            print(f"{name:<36}{'-':>12}{result['value']:>12.2f}")
+            continue
+        change = result["value"] / old["value"] - 1
+        # positive worse means this result got worse
+        worse = -change if result["higher_is_better"] else change
+        flag = ""
+        if worse > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        elif worse < -threshold:
+            flag = "  faster"
+        print(f"{name:<36}{old['value']:>12.2f}{result['value']:>12.2f}{change:>+10.1%}{flag}")
+    for name, old in baseline["results"].items():
+        if name not in current["results"]:
+            print(f"{name:<36}{old['value']:>12.2f}{'-':>12}{'missing':>10}")
+    return regressions
+
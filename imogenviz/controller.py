@@ -0,0 +1,133 @@
+# Gesture -> instrument control shared by the live loop and offline replay
+
+import functools
+import time
+from contextlib import ExitStack
+import numpy as np
+from dataclasses import dataclass
+from limbs import HandLandmarks
+from limb_trigger import (
+        GestureData,
+        process_hands,
+    )
+from trigger_engine import TriggerEngine, TriggerEvent
+from mapping import load_mapping
+from theory import parse_progression
+
+# C major, F sus4, F maj7, G7, A minor, --key/--progression play others
+DEFAULT_KEY = "C"
+DEFAULT_PROGRESSION = "I IVsus4 IVmaj7 V7 vi"
+chord_progression = parse_progression(DEFAULT_PROGRESSION, key=DEFAULT_KEY)
+
+
+@dataclass
+class TrackedFrame:
+    frame: np.ndarray
+    left_hand: HandLandmarks
+    right_hand: HandLandmarks
+    capture_time: float = 0.0
+    inference_time: float = 0.0
+
+
+class GestureController:
+    """Trigger stage: turns the tracked hands of a frame into instrument calls"""
+
+    def __init__(self, pad, drums, clock=time.time, latency=None, triggers=None,
+                 quantizer=None, mapping=None, smoother=None, predict=False, progression=None, vocals=None, mixer=None):
+        self.pad = pad
+        # optional VocalChain and Mixer, reached by "vocals.<param>" and
+        # "mixer.<param>" mapping targets
+        self.vocals = vocals
+        self.mixer = mixer
+        self.drums = drums
+        # optional QuantizedScheduler, drum hits are snapped to its grid
+        self.quantizer = quantizer
+        # optional LatencyTracker, stamped for every frame and drum hit
+        self.latency = latency
+        # replay swaps this for the position in the recording
+        self.clock = clock
+        # optional OneEuroFilter on the landmarks, with predict=True the hands
+        # are extrapolated by the latency measured by self.latency
+        self.smoother = smoother
+        self.predict = predict
+
+        # drums fire on finger bend edges of the left hand (slot 0)
+        self.triggers = triggers or TriggerEngine(n_hands=2)
+        self.triggers.register(0, "index", lambda event: self.hit("kick", self.drums.play_kick, event))
+        self.triggers.register(0, "ring", lambda event: self.hit("snare", self.drums.play_snare, event))
+        self.triggers.register(0, "middle", lambda event: self.hit("hihat", self.drums.play_hihat, event))
+        self.tracked = None
+        self.decision_time = 0.0
+
+        # Chord and cooldown values
+        self.current_chord: tuple = ("F", "maj7", 4)
+        self.current_index = 0
+        # list of (root, quality, octave), see theory.parse_progression
+        self.progression = progression or chord_progression
+
+        # continuous pad parameters and the chord change rule, from a config
+        self.mapping = mapping or load_mapping()
+        instruments = {"pad": self.pad}
+        if vocals is not None:
+            instruments["vocals"] = vocals
+        if mixer is not None:
+            instruments["mixer"] = mixer
+        self.mapping.bind(instruments, {"next_chord": self.next_chord})
+        self.param_banks = [instrument.params for instrument in instruments.values()]
+
+        self.pad.play_chord(*self.current_chord)
+
+    def __call__(self, tracked: TrackedFrame):
+        ctime = self.clock()
+        self.tracked = tracked
+        self.decision_time = time.time()
+        if self.latency is not None:
+            self.latency.frame(tracked.capture_time, tracked.inference_time, self.decision_time)
+
+        hands = [tracked.left_hand, tracked.right_hand]
+        if self.smoother is not None:
+            lead = 0.0
+            if self.predict and self.latency is not None:
+                lead = self.latency.expected_latency()
+            hands = self.smoother(hands, tracked.capture_time, lead)
+        left_hand, right_hand = process_hands(hands)
+
+        # LEFT HAND PROCESSING -> drum callbacks registered in __init__
+        self.triggers.update(hands, ctime)
+
+        # RIGHT HAND PROCESSING -> mapping config
+        # every parameter set in this frame goes to the server in one write per instrument
+        present = [len(tracked.left_hand) > 0, len(tracked.right_hand) > 0]
+        with ExitStack() as stack:
+            for params in self.param_banks:
+                stack.enter_context(params.batch())
+            self.mapping.update([left_hand, right_hand], present, ctime)
+
+    def next_chord(self):
+        chord = self.progression[self.current_index]
+        self.current_chord = chord
+        self.pad.play_chord(*chord)
+        self.current_index = (self.current_index + 1) % len(self.progression)
+
+    def hit(self, name, play, event: TriggerEvent):
+        if self.latency is not None:
+            stamps = self.latency.trigger(
+                    name, self.tracked.capture_time, self.tracked.inference_time, self.decision_time)
+            play = functools.partial(self._play_stamped, stamps, play)
+        if self.quantizer is not None:
+            self.quantizer.schedule(play, velocity=event.velocity)
+        else:
+            play(velocity=event.velocity)
+
+
+    def _play_stamped(self, stamps, play, **kwargs):
+        # runs where Trig.play() happens, in the audio thread for quantized hits
+        self.latency.played(stamps)
+        play(**kwargs)
+
+
+def track_hands(detector, frame, capture_time) -> TrackedFrame:
+    """Inference stage: run the hand model on a frame, slots come from the identity tracker"""
+    frame = detector.findFingers(frame)
+    left_hand, right_hand = detector.tracked_hands[:2]
+    return TrackedFrame(frame, left_hand, right_hand, capture_time, time.time())
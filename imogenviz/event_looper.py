@@ -0,0 +1,303 @@
+# Loop the instrument events instead of the audio.
+#
+# Drum hits, chord changes and parameter moves are stored as a timestamped
+# event log (a few bytes per event) and replayed on the audio clock into the
+# same Drums and PAD objects. As the log only holds which drum or which
+# chord was played, a loop can be edited afterwards: swap the drum kit,
+# re-voice a chord, and the loop plays the new sound.
+#
+# Recording goes through InstrumentProxy objects that stand in for the real
+# Drums/PAD in the GestureController, log the call and pass it on. Parameter
+# moves are only logged when they changed the target, and while a loop plays
+# a parameter it automates, live moves of that parameter are ignored, so the
+# loop is not overwritten on the next frame.
+#
+# The log is written by the trigger thread and finished (sorted, swapped in)
+# by whichever thread ends the recording, both under a lock. The audio thread
+# only tries the lock and otherwise finishes on the next block. Chords are
+# voiced when the recording is finished, the audio thread only hands the
+# ready notes to the pad.
+
+import threading
+
+import numpy as np
+
+from pyo import Pattern
+
+BEATS_PER_BAR = 4
+
+KIND_DRUM = 0
+KIND_CHORD = 1
+KIND_FILTER = 2
+KIND_PARAM = 3
+
+DRUM_VOICES = ("kick", "snare", "hihat", "clap")
+
+# (times, kinds, args, values, voiced chords) of a loop without events
+EMPTY_LOOP = (np.full(1, np.inf), [], [], [], [])
+
+
+class EventLog:
+    """Preallocated log, unused slots have time = inf so the arrays stay sorted"""
+
+    def __init__(self, capacity=4096):
+        self.times = np.full(capacity, np.inf)
+        self.kinds = np.zeros(capacity, dtype=np.uint8)
+        self.args = np.zeros(capacity, dtype=np.int16)
+        self.values = np.zeros(capacity, dtype=np.float32)
+        self.count = 0
+        self.dropped = 0
+
+    @property
+    def nbytes(self) -> int:
+        return self.times.nbytes + self.kinds.nbytes + self.args.nbytes + self.values.nbytes
+
+    def append(self, time, kind, arg, value):
+        if self.count == len(self.times):
+            self.dropped += 1
+            return
+        i = self.count
+        self.times[i] = time
+        self.kinds[i] = kind
+        self.args[i] = arg
+        self.values[i] = value
+        self.count += 1
+
+    def sort(self):
+        order = np.argsort(self.times[:self.count], kind="stable")
+        for array in (self.times, self.kinds, self.args, self.values):
+            array[:self.count] = array[:self.count][order]
+
+    def clear(self):
+        self.times[:] = np.inf
+        self.count = 0
+        self.dropped = 0
+
+
+class InstrumentProxy:
+    """Drums/PAD stand in that logs every call to an EventLooper"""
+
+    def __init__(self, looper, instrument):
+        self._looper = looper
+        self._instrument = instrument
+
+    def __getattr__(self, name):
+        return getattr(self._instrument, name)
+
+
+class DrumsProxy(InstrumentProxy):
+    def _play(self, voice, velocity):
+        self._looper.log(KIND_DRUM, voice, velocity)
+        self._looper.drum_players[voice](velocity)
+
+    def play_kick(self, velocity=1.0):
+        self._play(0, velocity)
+
+    def play_snare(self, velocity=1.0):
+        self._play(1, velocity)
+
+    def play_hihat(self, velocity=1.0):
+        self._play(2, velocity)
+
+    def play_clap(self, velocity=1.0):
+        self._play(3, velocity)
+
+
+class PadProxy(InstrumentProxy):
+    def play_chord(self, root_note, chord_type="major", base_octave=4):
+        self._looper.log(KIND_CHORD, self._looper.chord_id((root_note, chord_type, base_octave)), 0.0)
+        return self._instrument.play_chord(root_note, chord_type, base_octave)
+
+    def set_filter(self, cutoff_freq, resonance=0.5):
+        params = self._instrument.params
+        if self._looper.automates(KIND_FILTER, 0):
+            return {"cutoff": params.get("cutoff"), "resonance": params.get("resonance")}
+        old = params.get("cutoff")
+        result = self._instrument.set_filter(cutoff_freq, resonance)
+        if result["cutoff"] != old:
+            self._looper.log(KIND_FILTER, 0, result["cutoff"])
+        return result
+
+    def set_param(self, name, value):
+        params = self._instrument.params
+        index = params.index[name]
+        if self._looper.automates(KIND_PARAM, index):
+            return params.get(name)
+        old = params.get(name)
+        value = self._instrument.set_param(name, value)
+        if value != old:
+            self._looper.log(KIND_PARAM, index, value)
+        return value
+
+
+class EventLooper:
+    """
+    Record instrument events for one loop and replay them every loop
+
+    Parameters:
+    - server: Running pyo server, its sample clock is the loop clock
+    - drums, pad: The real instruments events are replayed into
+    - bpm, bars: Loop length, same meaning as for Looper
+    - capacity: Maximum number of events per loop
+    """
+
+    def __init__(self, server, drums, pad, bpm=100.0, bars=2, capacity=4096):
+        self.server = server
+        self.sr = server.getSamplingRate()
+        self.pad = pad
+        self.set_drums(drums)
+        self.loop_duration = bars * BEATS_PER_BAR * 60.0 / bpm
+        self.origin = self.now()
+
+        # chords are stored by id, edit self.chords and revoice() to re-voice a loop
+        self.chords = []
+        self.log_data = EventLog(capacity)
+        self.lock = threading.Lock()
+        self.recording = False
+        self.record_end = 0.0
+
+        # what the audio thread plays, python lists so reading an event
+        # does not create a numpy scalar
+        self.play_events = EMPTY_LOOP
+        # (kind, arg) of the parameters the loop plays, live moves of those
+        # are ignored while it is not recording
+        self.automated = frozenset()
+        self.last_position = 0.0
+
+        # recorded filter events carry the cutoff
+        self.cutoff_index = pad.params.index["cutoff"]
+        self.drums_proxy = DrumsProxy(self, self.drums)
+        self.pad_proxy = PadProxy(self, pad)
+
+        block = server.getBufferSize() / self.sr
+        self.pattern = Pattern(self._tick, time=block).play()
+
+    def set_drums(self, drums):
+        """Swap the kit, recorded hits play on the new one from now on"""
+        self.drums = drums
+        self.drum_players = [getattr(drums, "play_" + voice) for voice in DRUM_VOICES]
+
+    def now(self) -> float:
+        return self.server.getCurrentTimeInSamples() / self.sr
+
+    def position(self) -> float:
+        return (self.now() - self.origin) % self.loop_duration
+
+    def chord_id(self, chord) -> int:
+        if chord not in self.chords:
+            self.chords.append(chord)
+        return self.chords.index(chord)
+
+    def automates(self, kind, arg) -> bool:
+        """True if the playing loop owns this parameter, see PadProxy"""
+        return not self.recording and (kind, arg) in self.automated
+
+    def log(self, kind, arg, value):
+        if not self.recording:
+            return
+        with self.lock:
+            if not self.recording:
+                return
+            if self.now() >= self.record_end:
+                self._finish()
+                return
+            self.log_data.append(self.position(), kind, arg, value)
+
+    def record(self, loops=1, overdub=True):
+        """Log events for loops loop lengths, on top of the log unless overdub=False"""
+        if not overdub:
+            self.clear()
+        self.record_end = self.now() + loops * self.loop_duration
+        self.recording = True
+
+    def stop_recording(self):
+        with self.lock:
+            self._finish()
+
+    def _finish(self):
+        # holding self.lock, no event can be appended while sorting
+        self.recording = False
+        self.log_data.sort()
+        n = self.log_data.count
+        if n == 0:
+            self.automated = frozenset()
+            self.play_events = EMPTY_LOOP
+            return
+        times = self.log_data.times[:n].copy()
+        kinds = self.log_data.kinds[:n].tolist()
+        args = self.log_data.args[:n].tolist()
+        values = self.log_data.values[:n].tolist()
+        self.automated = frozenset(
+                (kind, arg) for kind, arg in zip(kinds, args) if kind in (KIND_FILTER, KIND_PARAM))
+        # swap in the new loop in one assignment, the audio thread reads it
+        self.play_events = (times, kinds, args, values, self._voice_chords(kinds, args))
+
+    def revoice(self):
+        """Voice the chords of the playing loop again, after editing self.chords"""
+        with self.lock:
+            times, kinds, args, values, _ = self.play_events
+            self.play_events = (times, kinds, args, values, self._voice_chords(kinds, args))
+
+    def _voice_chords(self, kinds, args) -> list:
+        # voice leading of every chord change of the loop, each from the one
+        # before, so the audio thread does no table lookups. Two passes, the
+        # second leads the first chord from the last one as the loop wraps
+        voiced = [None] * len(kinds)
+        chord_events = [i for i, kind in enumerate(kinds) if kind == KIND_CHORD]
+        previous = None
+        for _ in range(2 if chord_events else 0):
+            for i in chord_events:
+                voiced[i] = self.pad.voice_chord(*self.chords[args[i]], previous=previous)
+                previous = voiced[i][1]
+        return voiced
+
+    def toggle_record(self):
+        if self.recording:
+            self.stop_recording()
+        else:
+            self.record()
+
+    def clear(self):
+        with self.lock:
+            self.recording = False
+            self.log_data.clear()
+            self.automated = frozenset()
+            self.play_events = EMPTY_LOOP
+
+    def _tick(self):
+        # audio thread, once per block: play events between the last and
+        # the current loop position
+        if self.recording and self.now() >= self.record_end:
+            # never wait on the trigger thread here, try again next block
+            if self.lock.acquire(blocking=False):
+                try:
+                    if self.recording:
+                        self._finish()
+                finally:
+                    self.lock.release()
+        position = self.position()
+        start = self.last_position
+        self.last_position = position
+        if position < start:
+            self._dispatch(start, self.loop_duration)
+            start = 0.0
+        self._dispatch(start, position)
+
+    def _dispatch(self, start, end):
+        # parameter events write their stream directly, set_filter and
+        # set_param would allocate a report and a list for every write
+        times, kinds, args, values, voiced = self.play_events
+        drum_players = self.drum_players
+        params = self.pad.params
+        first = int(np.searchsorted(times, start))
+        last = int(np.searchsorted(times, end))
+        for i in range(first, last):
+            kind = kinds[i]
+            if kind == KIND_DRUM:
+                drum_players[args[i]](values[i])
+            elif kind == KIND_CHORD:
+                self.pad.play_voiced(voiced[i])
+            elif kind == KIND_FILTER:
+                params.set_index(self.cutoff_index, values[i])
+            elif kind == KIND_PARAM:
+                params.set_index(args[i], values[i])
@@ -0,0 +1,237 @@
+# Where frames come from: a webcam, a video file or frames held in memory.
+#
+# Every source reads into a small ring of preallocated buffers instead of
+# allocating a new array per frame, and can hand out RGB directly, so the
+# BGR -> RGB conversion MediaPipe needs happens once, in the capture thread,
+# into a reused buffer instead of in the inference stage.
+#
+# A buffer is handed out again n_buffers reads later, which has to be more
+# than the number of frames alive in the pipeline at once (capture and
+# inference each hold at most one, plus one per queue). Anything keeping a
+# frame longer, like the renderer, takes a copy first (Renderer.handoff).
+# The ring can also be memory owned by someone else, like the shared frames
+# of an InferenceWorker, so frames are decoded right where the model reads
+# them.
+
+import time
+
+import cv2
+import numpy as np
+
+
+class FrameSource:
+    """
+    Base class, subclasses implement _grab(buffer) -> bool
+
+    Parameters:
+    - width, height: Frame size the buffers are allocated for
+    - rgb: Deliver RGB instead of OpenCV's BGR
+    - n_buffers: Size of the buffer ring
+    """
+
+    def __init__(self, width, height, rgb=True, n_buffers=6):
+        self.width = width
+        self.height = height
+        self.rgb = rgb
+        self.buffers = [np.zeros((height, width, 3), dtype=np.uint8) for _ in range(n_buffers)]
+        # BGR scratch frame the backend decodes into before the conversion
+        self.scratch = np.zeros((height, width, 3), dtype=np.uint8)
+        self.next_buffer = 0
+        self.frames_read = 0
+
+    def _take_buffer(self) -> np.ndarray:
+        buffer = self.buffers[self.next_buffer]
+        self.next_buffer = (self.next_buffer + 1) % len(self.buffers)
+        return buffer
+
+    def use_buffers(self, buffers):
+        """
+        Deliver frames in these arrays from now on instead of the own ring,
+        they must have the frame shape, the ring size is len(buffers)
+        """
+        for buffer in buffers:
+            if buffer.shape != self.scratch.shape or buffer.dtype != np.uint8:
+                raise ValueError(f"Buffer {buffer.shape} {buffer.dtype} != frame {self.scratch.shape} uint8")
+        self.buffers = list(buffers)
+        self.next_buffer = 0
+
+    def _resize_buffers(self, shape):
+        # the backend ignored the requested size, follow what it delivers
+        self.height, self.width = shape[:2]
+        self.buffers = [np.zeros(shape, dtype=np.uint8) for _ in self.buffers]
+        self.scratch = np.zeros(shape, dtype=np.uint8)
+
+    def _deliver(self, bgr) -> np.ndarray:
+        if bgr.shape != self.scratch.shape:
+            self._resize_buffers(bgr.shape)
+        buffer = self._take_buffer()
+        if self.rgb:
+            cv2.cvtColor(bgr, cv2.COLOR_BGR2RGB, dst=buffer)
+        else:
+            np.copyto(buffer, bgr)
+        self.frames_read += 1
+        return buffer
+
+    def read(self):
+        """Next (frame, capture time), or (None, None) at the end of the source"""
+        frame = self._grab()
+        if frame is None:
+            return None, None
+        return frame, time.time()
+
+    def _grab(self):
+        raise NotImplementedError
+
+    @property
+    def opened(self) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+
+class CaptureSource(FrameSource):
+    """Shared reading for OpenCV VideoCapture based sources"""
+
+    def __init__(self, capture, width, height, rgb=True, n_buffers=6):
+        super().__init__(width, height, rgb, n_buffers)
+        self.capture = capture
+
+    @property
+    def opened(self) -> bool:
+        return self.capture.isOpened()
+
+    def _grab(self):
+        # decode straight into the scratch frame, no allocation per frame
+        ok, frame = self.capture.read(self.scratch)
+        if not ok:
+            return None
+        return self._deliver(frame)
+
+    def close(self):
+        self.capture.release()
+
+
+class WebcamSource(CaptureSource):
+    """
+    Parameters:
+    - device: Camera index
+    - fps: Requested camera frame rate
+    - fourcc: Pixel format, "MJPG" lets most USB cameras deliver 640x480
+      and above at full frame rate, None keeps the driver default
+    - buffer_size: Frames the driver queues, 1 drops stale frames so every
+      read is the newest picture
+    """
+
+    def __init__(self, device=0, width=640, height=480, fps=30, fourcc="MJPG",
+                 buffer_size=1, rgb=True, n_buffers=6):
+        capture = cv2.VideoCapture(device)
+        if fourcc:
+            capture.set(cv2.CAP_PROP_FOURCC, cv2.VideoWriter_fourcc(*fourcc))
+        capture.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        capture.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        capture.set(cv2.CAP_PROP_FPS, fps)
+        capture.set(cv2.CAP_PROP_BUFFERSIZE, buffer_size)
+        super().__init__(
+                capture,
+                int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)) or width,
+                int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)) or height,
+                rgb, n_buffers)
+
+
+class VideoFileSource(CaptureSource):
+    """
+    Parameters:
+    - path: Any file OpenCV can open
+    - loop: Start over at the end instead of ending the source
+    - realtime: Pace reads to the file's frame rate like a camera would,
+      otherwise read as fast as the consumer asks
+    """
+
+    def __init__(self, path, loop=False, realtime=True, rgb=True, n_buffers=6):
+        capture = cv2.VideoCapture(path)
+        if not capture.isOpened():
+            raise FileNotFoundError(f"Could not open video {path}")
+        super().__init__(
+                capture,
+                int(capture.get(cv2.CAP_PROP_FRAME_WIDTH)),
+                int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+                rgb, n_buffers)
+        self.loop = loop
+        self.realtime = realtime
+        self.interval = 1.0 / (capture.get(cv2.CAP_PROP_FPS) or 30.0)
+        self.next_time = None
+
+    def _grab(self):
+        if self.realtime:
+            now = time.perf_counter()
+            if self.next_time is not None and now < self.next_time:
+                time.sleep(self.next_time - now)
+            self.next_time = max(now, self.next_time or now) + self.interval
+
+        frame = super()._grab()
+        if frame is None and self.loop:
+            self.capture.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            frame = super()._grab()
+        return frame
+
+
+class ArraySource(FrameSource):
+    """
+    Frames from memory, for tests and benchmarks without a camera
+
+    Parameters:
+    - frames: (N, height, width, 3) uint8 BGR frames
+    - fps: Read rate, None reads as fast as the consumer asks
+    - loop: Start over at the end instead of ending the source
+    """
+
+    def __init__(self, frames, fps=30.0, loop=True, rgb=True, n_buffers=6):
+        frames = np.asarray(frames, dtype=np.uint8)
+        super().__init__(frames.shape[2], frames.shape[1], rgb, n_buffers)
+        self.frames = frames
+        self.loop = loop
+        self.interval = 1.0 / fps if fps else 0.0
+        self.position = 0
+        self.next_time = None
+
+    @classmethod
+    def synthetic(cls, n_frames=60, width=640, height=480, seed=0, **kwargs):
+        """A noise background with a bright square moving across it"""
+        rng = np.random.default_rng(seed)
+        frames = rng.integers(0, 64, (n_frames, height, width, 3), dtype=np.uint8)
+        size = min(width, height) // 6
+        for i in range(n_frames):
+            x = int((width - size) * i / max(n_frames - 1, 1))
+            y = (height - size) // 2
+            frames[i, y:y + size, x:x + size] = (180, 200, 220)
+        return cls(frames, **kwargs)
+
+    def _grab(self):
+        if self.position == len(self.frames):
+            if not self.loop:
+                return None
+            self.position = 0
+        if self.interval:
+            now = time.perf_counter()
+            if self.next_time is not None and now < self.next_time:
+                time.sleep(self.next_time - now)
+            self.next_time = max(now, self.next_time or now) + self.interval
+
+        frame = self._deliver(self.frames[self.position])
+        self.position += 1
+        return frame
+
+
+def open_source(spec, width=640, height=480, fps=30, fourcc="MJPG", rgb=True) -> FrameSource:
+    """
+    Source from a command line value
+
+    Parameters:
+    - spec: Camera index ("0"), "synthetic", or a video file path
+    """
+    if isinstance(spec, int) or str(spec).isdigit():
+        return WebcamSource(int(spec), width, height, fps, fourcc, rgb=rgb)
+    if spec == "synthetic":
+        return ArraySource.synthetic(width=width, height=height, fps=fps, rgb=rgb)
+    return VideoFileSource(spec, loop=True, rgb=rgb)
@@ -0,0 +1,91 @@
+# Vectorized gesture features for one or many hands at once.
+#
+# Everything is derived from a single pairwise distance matrix per hand, so
+# the per frame cost is a handful of numpy calls instead of ~200 python
+# distance calculations per hand.
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from limbs import (
+        LimbIndex,
+        NUM_LIMBS,
+        HandLandmarks,
+        )
+
+# upper triangle of the distance matrix, every landmark pair once
+PAIR_I, PAIR_J = np.triu_indices(NUM_LIMBS, k=1)
+
+FINGER_PIPS = np.array([
+    LimbIndex.INDEX_FINGER_PIP.value,
+    LimbIndex.MIDDLE_FINGER_PIP.value,
+    LimbIndex.RING_FINGER_PIP.value,
+    LimbIndex.PINKY_PIP.value,
+    ])
+FINGER_TIPS = np.array([
+    LimbIndex.INDEX_FINGER_TIP.value,
+    LimbIndex.MIDDLE_FINGER_TIP.value,
+    LimbIndex.RING_FINGER_TIP.value,
+    LimbIndex.PINKY_TIP.value,
+    ])
+THUMB_TIP = LimbIndex.THUMB_TIP.value
+
+# average landmark distance (pixels) mapped to hand_size 0..1
+HAND_SIZE_MIN = 20
+HAND_SIZE_MAX = 150
+
+
+@dataclass
+class HandFeatures:
+    """Per hand feature arrays, first axis is the hand"""
+    average_distance: np.ndarray    # (H,)
+    hand_size: np.ndarray           # (H,) normalized, >= 0
+    fingers_bent: np.ndarray        # (H, 4) index, middle, ring, pinky
+    pinch_distances: np.ndarray     # (H, 4) thumb tip to each finger tip
+    center_of_mass: np.ndarray      # (H, 2)
+
+    def __len__(self):
+        return len(self.hand_size)
+
+
+def stack_hands(hands: list[HandLandmarks]) -> np.ndarray:
+    """Stack the non empty hands into a (H, 21, 2) float array"""
+    points = [hand.points for hand in hands if hand is not None and len(hand) > 0]
+    if not points:
+        return np.empty((0, NUM_LIMBS, 2), dtype=np.float64)
+    return np.stack(points).astype(np.float64)
+
+
+def pairwise_distances(points: np.ndarray) -> np.ndarray:
+    """(..., 21, 2) landmarks -> (..., 21, 21) euclidean distance matrix"""
+    diff = points[..., :, None, :] - points[..., None, :, :]
+    return np.hypot(diff[..., 0], diff[..., 1])
+
+
+def compute_features(points: np.ndarray) -> HandFeatures:
+    """
+    Compute all gesture features for a batch of hands
+
+    Parameters:
+    - points: (21, 2) for one hand or (H, 21, 2) for H hands
+    """
+    points = np.asarray(points, dtype=np.float64)
+    if points.ndim == 2:
+        points = points[None]
+
+    distances = pairwise_distances(points)
+    average_distance = distances[:, PAIR_I, PAIR_J].mean(axis=1)
+    hand_size = np.maximum(
+            0, (average_distance - HAND_SIZE_MIN) / (HAND_SIZE_MAX - HAND_SIZE_MIN))
+
+    # image y grows downwards, a tip below its pip means the finger is bent
+    fingers_bent = points[:, FINGER_PIPS, 1] < points[:, FINGER_TIPS, 1]
+
+    return HandFeatures(
+            average_distance = average_distance,
+            hand_size = hand_size,
+            fingers_bent = fingers_bent,
+            pinch_distances = distances[:, THUMB_TIP, FINGER_TIPS],
+            center_of_mass = points.mean(axis=1),
+        )
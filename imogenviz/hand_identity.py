@@ -0,0 +1,184 @@
+# Persistent hand identities across frames.
+#
+# MediaPipe returns the hands of a frame in no particular order, so "hand 0"
+# can be a different hand every frame. Here every detected hand is matched
+# to a track from the previous frames by wrist position and handedness, with
+# an optimal assignment over the cost matrix. A track keeps its id and its
+# slot (which instrument it plays) for as long as it is seen, even when the
+# hands cross, and survives a few missed frames.
+#
+# Slots are picked once when a track starts: from the MediaPipe handedness
+# label when that slot is free, otherwise the free slot on the matching side
+# of the picture.
+
+import itertools
+from dataclasses import dataclass, field
+
+import numpy as np
+
+from limbs import LimbIndex, HandLandmarks
+
+WRIST = LimbIndex.WRIST.value
+
+# MediaPipe labels assume a mirrored selfie image, on a plain camera frame a
+# "Left" hand shows up on the left of the picture, the old left_hand slot
+LABEL_SLOTS = {"Left": 0, "Right": 1}
+
+# beyond this many hands an exhaustive assignment gets slow, match greedily
+EXACT_ASSIGNMENT_MAX = 5
+
+
+@dataclass
+class HandTrack:
+    id: int
+    slot: int
+    wrist: np.ndarray
+    # running handedness vote, > 0 "Right", < 0 "Left"
+    label_vote: float = 0.0
+    missing: int = 0
+    hand: HandLandmarks = field(default_factory=HandLandmarks)
+
+    @property
+    def label(self) -> str:
+        return "Right" if self.label_vote > 0 else "Left"
+
+
+def assign(cost: np.ndarray) -> list[tuple[int, int]]:
+    """
+    Minimum cost matching of rows to columns, as (row, column) pairs
+
+    Exhaustive for a handful of hands, which gives the same result as the
+    Hungarian algorithm, greedy nearest first for more.
+    """
+    rows, cols = cost.shape
+    if rows == 0 or cols == 0:
+        return []
+    if max(rows, cols) <= EXACT_ASSIGNMENT_MAX:
+        best, best_cost = (), np.inf
+        if rows <= cols:
+            for perm in itertools.permutations(range(cols), rows):
+                total = cost[range(rows), perm].sum()
+                if total < best_cost:
+                    best, best_cost = tuple(zip(range(rows), perm)), total
+        else:
+            for perm in itertools.permutations(range(rows), cols):
+                total = cost[perm, range(cols)].sum()
+                if total < best_cost:
+                    best, best_cost = tuple(zip(perm, range(cols))), total
+        return list(best)
+
+    pairs = []
+    used_rows, used_cols = set(), set()
+    for flat in np.argsort(cost, axis=None):
+        row, col = divmod(int(flat), cols)
+        if row not in used_rows and col not in used_cols:
+            pairs.append((row, col))
+            used_rows.add(row)
+            used_cols.add(col)
+    return pairs
+
+
+class HandIdentityTracker:
+    """
+    Parameters:
+    - n_slots: Number of hand slots, e.g. 2 for left and right instrument
+    - max_distance: Pixels a wrist may move between frames and still be
+      the same hand
+    - handedness_weight: Extra cost, in units of max_distance, for matching
+      a hand to a track of the other handedness
+    - max_missing: Frames a track is kept without a detection
+    """
+
+    def __init__(self, n_slots=2, max_distance=200.0, handedness_weight=0.5, max_missing=5):
+        self.n_slots = n_slots
+        self.max_distance = max_distance
+        self.handedness_weight = handedness_weight
+        self.max_missing = max_missing
+        self.tracks: list[HandTrack] = []
+        self.next_id = 0
+
+    def update(self, hands: list[HandLandmarks], handedness: list[tuple[str, float]],
+               frame_width=None) -> list[HandLandmarks]:
+        """
+        Match one frame of detections to the tracks
+
+        Parameters:
+        - hands: Detected hands in MediaPipe order
+        - handedness: (label, score) per detected hand
+        - frame_width: Used to pick a slot by side of the picture when the
+          handedness slot is taken
+
+        Returns one HandLandmarks per slot, empty where no hand is tracked
+        """
+        wrists = np.array([hand.points[WRIST] for hand in hands], dtype=np.float64).reshape(-1, 2)
+        labels = [label for label, _ in handedness]
+
+        matched_tracks = set()
+        matched_hands = set()
+        if self.tracks and hands:
+            track_wrists = np.array([track.wrist for track in self.tracks])
+            distance = np.hypot(*(track_wrists[:, None, :] - wrists[None, :, :]).transpose(2, 0, 1))
+            cost = distance / self.max_distance
+            for t, track in enumerate(self.tracks):
+                for h, label in enumerate(labels):
+                    if track.label_vote != 0 and label != track.label:
+                        cost[t, h] += self.handedness_weight
+            for t, h in assign(cost):
+                if distance[t, h] <= self.max_distance:
+                    self._update_track(self.tracks[t], hands[h], handedness[h])
+                    matched_tracks.add(t)
+                    matched_hands.add(h)
+
+        for t, track in enumerate(self.tracks):
+            if t not in matched_tracks:
+                track.missing += 1
+                track.hand = HandLandmarks()
+        self.tracks = [track for track in self.tracks if track.missing <= self.max_missing]
+
+        for h in range(len(hands)):
+            if h not in matched_hands:
+                self._start_track(hands[h], handedness[h], frame_width)
+
+        slots = [HandLandmarks() for _ in range(self.n_slots)]
+        for track in self.tracks:
+            if track.missing == 0:
+                slots[track.slot] = track.hand
+        return slots
+
+    def ids(self) -> list:
+        """Track id per slot, None where no hand is tracked"""
+        ids = [None] * self.n_slots
+        for track in self.tracks:
+            if track.missing == 0:
+                ids[track.slot] = track.id
+        return ids
+
+    def reset(self):
+        self.tracks = []
+
+    def _update_track(self, track, hand, handedness):
+        label, score = handedness
+        track.wrist = hand.points[WRIST].astype(np.float64)
+        track.hand = hand
+        track.missing = 0
+        # clamp the vote so a long lived track can still change its mind
+        track.label_vote = float(np.clip(
+                track.label_vote + (score if label == "Right" else -score), -10.0, 10.0))
+
+    def _start_track(self, hand, handedness, frame_width):
+        taken = {track.slot for track in self.tracks}
+        free = [slot for slot in range(self.n_slots) if slot not in taken]
+        if not free:
+            return
+        label, score = handedness
+        slot = LABEL_SLOTS.get(label)
+        if slot not in free:
+            slot = free[0]
+            if frame_width and len(free) > 1:
+                # left of the picture prefers the lower slots
+                side = hand.points[WRIST][0] / frame_width
+                slot = free[min(int(side * len(free)), len(free) - 1)]
+        track = HandTrack(self.next_id, slot, hand.points[WRIST].astype(np.float64))
+        self._update_track(track, hand, handedness)
+        self.next_id += 1
+        self.tracks.append(track)
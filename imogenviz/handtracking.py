@@ -1,74 +1,242 @@
-import mediapipe as mp
 import cv2
+import numpy as np
 import time
 import math as math
 from limbs import (
         LimbIndex,
-        LimbPosition
+        HandLandmarks,
+        HAND_CONNECTIONS
         )
+from inference_worker import InferenceWorker
+from hand_identity import HandIdentityTracker
+
+
+def draw_hand(frame, hand: HandLandmarks):
+    """Draw landmarks without mediapipe, for results coming from a worker"""
+    points = [(int(x), int(y)) for x, y in hand.points]
+    for start, end in HAND_CONNECTIONS:
+        cv2.line(frame, points[start], points[end], (224, 224, 224), 2)
+    for point in points:
+        cv2.circle(frame, point, 4, (0, 0, 255), cv2.FILLED)
+
 
 class HandTrackingDynamic:
-    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackCon=0.5):
+    """
+    Parameters:
+    - roi_tracking: Skip palm detection while fewer than maxHands hands are
+      in view. In tracking mode mediapipe already crops every hand around
+      its landmarks of the previous frame and runs only the landmark model
+      on the crop, but it still runs palm detection on every frame with
+      fewer hands than max_num_hands, so with one hand in view, on every
+      frame. With roi_tracking those frames go to a graph sized to the hands
+      already found, which never needs to detect. The full graph takes over
+      when a hand is lost, when no hands are tracked, and every roi_refresh
+      frames so hands entering the picture are still detected
+    - roi_confidence: Hand presence a hand needs to stay tracked by the
+      sized graph (its min_tracking_confidence), a hand below it is lost
+    - roi_refresh: Frames between two full graph frames
+    - backend: "inprocess" runs mediapipe in this process, "process" runs it
+      in an InferenceWorker child process fed through shared memory
+    - shared_frames: With the process backend, frames the worker shares for
+      a FrameSource to decode into (worker.shared_buffers()), 0 copies
+      every frame into shared memory
+    - draw: Default of findFingers(draw=...), pass False when running
+      headless or when a Renderer draws the hands
+    - rgb_input: Frames already are RGB (see FrameSource), skips the
+      per frame BGR -> RGB conversion
+
+    After findFingers, tracked_hands holds one HandLandmarks per hand slot
+    (maxHands of them, empty where no hand is seen) with a persistent
+    identity, and hand_ids the track id in each slot.
+    """
+    def __init__(self, mode=False, maxHands=2, detectionCon=0.5, trackCon=0.5,
+                 roi_tracking=False, roi_confidence=0.8, roi_refresh=30, backend="inprocess",
+                 draw=True, rgb_input=False, shared_frames=0):
         self.__mode__   =  mode
         self.__maxHands__   =  maxHands
         self.__detectionCon__   =   detectionCon
         self.__trackCon__   =   trackCon
+        self.draw = draw
+        self.rgb_input = rgb_input
+        self.hand_list = []
+        self.handedness = []
+        self.results = None
+        self.identity = HandIdentityTracker(n_slots=maxHands)
+        self.tracked_hands = [HandLandmarks() for _ in range(maxHands)]
+        self.hand_ids = [None] * maxHands
+
+        self.worker = None
+        self.roi_hands = {}
+        if backend == "process":
+            self.worker = InferenceWorker(max_hands=maxHands, shared_frames=shared_frames, tracker_kwargs=dict(
+                    mode=mode, detectionCon=detectionCon, trackCon=trackCon,
+                    roi_tracking=roi_tracking, roi_confidence=roi_confidence,
+                    roi_refresh=roi_refresh, rgb_input=rgb_input))
+            return
+        if backend != "inprocess":
+            raise ValueError(f"Unknown backend: {backend}")
+
+        # only the in process model needs mediapipe, a process backend
+        # parent never loads it
+        import mediapipe as mp
+
         self.handsMp = mp.solutions.hands
-        self.hands = self.handsMp.Hands(model_complexity=0)
+        self.hands = self.handsMp.Hands(
+                static_image_mode=mode,
+                max_num_hands=maxHands,
+                model_complexity=0,
+                min_detection_confidence=detectionCon,
+                min_tracking_confidence=trackCon)
         self.mpDraw= mp.solutions.drawing_utils
         self.tipIds = [4, 8, 12, 16, 20]
 
-    def findFingers(self, frame, draw=True):
-        imgRGB = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        self.results = self.hands.process(imgRGB)  
+        # static mode detects on every frame anyway, there is nothing to skip
+        self.roi_tracking = roi_tracking and not mode
+        self.roi_refresh = roi_refresh
+        # one tracking mode graph per number of hands below maxHands, the
+        # graph that ran the previous frame is the only one with a current
+        # tracking state
+        if self.roi_tracking:
+            self.roi_hands = {
+                n: self.handsMp.Hands(
+                        static_image_mode=False,
+                        max_num_hands=n,
+                        model_complexity=0,
+                        min_detection_confidence=detectionCon,
+                        min_tracking_confidence=roi_confidence)
+                for n in range(1, maxHands)}
+        self.active = self.hands
+        self.frames_since_full = 0
+        # how often each path ran, to check the roi is actually used
+        self.roi_frames = 0
+        self.full_frames = 0
+
+    def findFingers(self, frame, draw=None):
+        if draw is None:
+            draw = self.draw
+        if self.worker is not None:
+            self.hand_list, self.handedness = self.worker.process_frame(frame)
+            if draw:
+                for hand in self.hand_list:
+                    draw_hand(frame, hand)
+            self._track_identities(frame)
+            return frame
+
+        rgb = self._to_rgb(frame)
+        self.results = None
+        tracked = len(self.hand_list)
+        if tracked in self.roi_hands and self.frames_since_full < self.roi_refresh:
+            self.results = self._process_roi(rgb, tracked)
+            self.frames_since_full += 1
+
+        if self.results is None:
+            self.results = self._run(self.hands, rgb)
+            self.frames_since_full = 0
+            self.full_frames += 1
+        else:
+            self.roi_frames += 1
+
+        h, w, c = frame.shape
+        self.hand_list = []
+        self.handedness = []
         if self.results.multi_hand_landmarks: 
-            for handLms in self.results.multi_hand_landmarks:
+            for handLms, handedness in zip(
+                    self.results.multi_hand_landmarks, self.results.multi_handedness):
+                self.hand_list.append(HandLandmarks.from_mediapipe(handLms, w, h))
+                classification = handedness.classification[0]
+                self.handedness.append((classification.label, classification.score))
                 if draw:
                     self.mpDraw.draw_landmarks(
                             frame, handLms,self.handsMp.HAND_CONNECTIONS)
 
+        self._track_identities(frame)
         return frame
 
+    def warm_up(self, shape):
+        """
+        Run one black frame of shape through the model, so the first camera
+        frame does not pay for loading the graph (or starting the worker),
+        then forget everything that frame left behind
+        """
+        frame = np.zeros(shape, dtype=np.uint8)
+        self.findFingers(frame, draw=False)
+        self.identity.reset()
+        self.tracked_hands = [HandLandmarks() for _ in self.tracked_hands]
+        self.hand_ids = [None] * len(self.hand_ids)
+        self.hand_list = []
+        self.handedness = []
+        if self.worker is None:
+            self.results = None
+            self.active = None
+            self.frames_since_full = 0
+            self.roi_frames = 0
+            self.full_frames = 0
+
+    def _track_identities(self, frame):
+        self.tracked_hands = self.identity.update(self.hand_list, self.handedness, frame.shape[1])
+        self.hand_ids = self.identity.ids()
+
+    def close(self):
+        if self.worker is not None:
+            self.worker.close()
+        for hands in self.roi_hands.values():
+            hands.close()
+
+    def _to_rgb(self, frame):
+        if self.rgb_input:
+            return np.ascontiguousarray(frame)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+
+    def _run(self, hands, rgb):
+        """Process rgb on one of the graphs, resetting it if another ran the previous frame"""
+        if hands is not self.active:
+            # its tracking state is from frames ago, start over with detection
+            hands.reset()
+            self.active = hands
+        return hands.process(rgb)
+
+    def _process_roi(self, rgb, tracked):
+        """
+        Track the hands of the previous frame on the graph sized to them,
+        None if one was lost and the full graph is needed
+        """
+        results = self._run(self.roi_hands[tracked], rgb)
+        # a hand whose presence fell below roi_confidence is dropped by the graph
+        if len(results.multi_hand_landmarks or ()) < tracked:
+            return None
+        return results
+
     def findPosition( self, frame, handNo=0, draw=False):
-        xList =[]
-        yList =[]
         bbox = []
-        self.limb_list=[]
-        if self.results.multi_hand_landmarks:
-            myHand = self.results.multi_hand_landmarks[handNo]
-            for id, lm in enumerate(myHand.landmark):
-            
-                h, w, c = frame.shape
-                cx, cy = int(lm.x * w), int(lm.y * h)
-                xList.append(cx)
-                yList.append(cy)
-
-                self.limb_list.append(
-                        LimbPosition(LimbIndex(id), cx, cy))
-                if draw:
-                    cv2.circle(frame,  (cx, cy), 5, (255, 0, 255), cv2.FILLED)
+        self.landmarks = HandLandmarks()
+        if self.hand_list:
+            self.landmarks = self.hand_list[handNo]
+
+            if draw:
+                for cx, cy in self.landmarks.points:
+                    cv2.circle(frame,  (int(cx), int(cy)), 5, (255, 0, 255), cv2.FILLED)
 
-            xmin, xmax = min(xList), max(xList)
-            ymin, ymax = min(yList), max(yList)
-            bbox = xmin, ymin, xmax, ymax
+            bbox = self.landmarks.bbox()
+            xmin, ymin, xmax, ymax = bbox
             #print( "Hands Keypoint")
             #print(bbox)
             if draw:
                 cv2.rectangle(frame, (xmin - 20, ymin - 20),(xmax + 20, ymax + 20),
                                (0, 255 , 0) , 2)
 
-        return self.limb_list, bbox
+        return self.landmarks, bbox
     
     def findFingerUp(self):
          fingers=[]
 
-         if self.limb_list[self.tipIds[0]][1] > self.limb_list[self.tipIds[0]-1][1]:
+         # thumb compares x, the other fingers compare y
+         if self.landmarks[self.tipIds[0]][0] > self.landmarks[self.tipIds[0]-1][0]:
               fingers.append(1)
          else:
               fingers.append(0)
 
          for id in range(1, 5):            
-              if self.limb_list[self.tipIds[id]][2] < self.limb_list[self.tipIds[id]-2][2]:
+              if self.landmarks[self.tipIds[id]][1] < self.landmarks[self.tipIds[id]-2][1]:
                    fingers.append(1)
               else:
                    fingers.append(0)
@@ -77,8 +245,8 @@ class HandTrackingDynamic:
 
     def findDistance(self, p1, p2, frame, draw= True, r=15, t=3):
          
-        x1 ,y1 = self.limb_list[p1].xypos
-        x2, y2 = self.limb_list[p2].xypos
+        x1 ,y1 = (int(v) for v in self.landmarks[p1])
+        x2, y2 = (int(v) for v in self.landmarks[p2])
         cx , cy = (x1+x2)//2 , (y1 + y2)//2
 
         if draw:
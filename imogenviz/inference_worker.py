@@ -0,0 +1,158 @@
+# Runs the hand model in a separate process so MediaPipe does not compete
+# with drawing, gesture logic and pyo calls for the interpreter lock.
+#
+# Frames go to the worker through shared memory (no pickling) and the
+# landmarks come back in a second, fixed size shared memory block. The pipe
+# between the two processes only carries tiny "frame in slot i" / "n hands"
+# messages.
+#
+# The frame block is a ring of shared_frames slots plus one. A FrameSource
+# can take the ring as its buffers (FrameSource.use_buffers), then the
+# camera frame is decoded and converted straight into shared memory and
+# only the slot index crosses over, no copy. Any other frame, e.g. from a
+# source with its own buffers, is copied into the last slot first.
+
+import multiprocessing
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+
+from limbs import HandLandmarks, NUM_LIMBS
+
+
+def _worker_main(conn, frame_name, frame_shape, n_slots, result_name, max_hands, tracker_kwargs):
+    # mediapipe is only ever imported in the worker
+    from handtracking import HandTrackingDynamic
+
+    # the spawned child shares the parent's resource tracker, so attaching
+    # here does not hand ownership of the blocks to this process
+    frame_shm = SharedMemory(name=frame_name)
+    result_shm = SharedMemory(name=result_name)
+    frames = np.ndarray((n_slots, *frame_shape), dtype=np.uint8, buffer=frame_shm.buf)
+    landmarks, handedness = _result_arrays(result_shm, max_hands)
+
+    tracker = HandTrackingDynamic(maxHands=max_hands, **tracker_kwargs)
+    conn.send("ready")
+
+    while True:
+        slot = conn.recv()
+        if slot is None:
+            break
+        try:
+            tracker.findFingers(frames[slot], draw=False)
+        except Exception as e:
+            conn.send(f"{type(e).__name__}: {e}")
+            continue
+
+        n = min(len(tracker.hand_list), max_hands)
+        for i in range(n):
+            landmarks[i] = tracker.hand_list[i].points
+            label, score = tracker.handedness[i]
+            handedness[i] = (label == "Right", score)
+        conn.send(n)
+
+    del frames, landmarks, handedness
+    frame_shm.close()
+    result_shm.close()
+
+
+def _result_arrays(result_shm, max_hands):
+    landmarks = np.ndarray((max_hands, NUM_LIMBS, 2), dtype=np.int32, buffer=result_shm.buf)
+    handedness = np.ndarray(
+            (max_hands, 2), dtype=np.float32, buffer=result_shm.buf, offset=landmarks.nbytes)
+    return landmarks, handedness
+
+
+class InferenceWorker:
+    """
+    Hand tracking in a child process
+
+    The process is started on the first frame, as the shared frames are
+    sized from it. Every later frame must have the same shape.
+
+    Parameters:
+    - max_hands: Size of the landmark result block
+    - tracker_kwargs: Passed on to the HandTrackingDynamic in the worker
+    - shared_frames: Slots of the ring a FrameSource can decode into, see
+      shared_buffers, 0 when every frame is copied
+    """
+
+    def __init__(self, max_hands=2, tracker_kwargs=None, shared_frames=0):
+        self.max_hands = max_hands
+        self.tracker_kwargs = tracker_kwargs or {}
+        self.shared_frames = shared_frames
+        self.process = None
+
+    def start(self, frame_shape):
+        # spawn rather than fork, the parent has camera, audio and pipeline
+        # threads running that must not be duplicated
+        ctx = multiprocessing.get_context("spawn")
+
+        # the ring, plus the slot frames from elsewhere are copied into
+        n_slots = self.shared_frames + 1
+        self.frame_shm = SharedMemory(create=True, size=n_slots * int(np.prod(frame_shape)))
+        self.frames = np.ndarray((n_slots, *frame_shape), dtype=np.uint8, buffer=self.frame_shm.buf)
+        self.slots = {self.frames[i].ctypes.data: i for i in range(self.shared_frames)}
+        result_size = self.max_hands * (NUM_LIMBS * 2 * 4 + 2 * 4)
+        self.result_shm = SharedMemory(create=True, size=result_size)
+        self.landmarks, self.handedness = _result_arrays(self.result_shm, self.max_hands)
+
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(
+                target=_worker_main,
+                args=(child_conn, self.frame_shm.name, frame_shape, n_slots,
+                      self.result_shm.name, self.max_hands, self.tracker_kwargs),
+                daemon=True)
+        self.process.start()
+        # wait for the model to load so the first frame is not a surprise
+        if self.conn.recv() != "ready":
+            raise RuntimeError("Inference worker failed to start")
+
+    def shared_buffers(self) -> list:
+        """The ring slots as arrays, for FrameSource.use_buffers, after start"""
+        return list(self.frames[:self.shared_frames])
+
+    def process_frame(self, frame):
+        """
+        Track hands in a frame, BGR or RGB as the tracker's rgb_input says,
+        returns (hands, handedness)
+        """
+        if self.process is None:
+            self.start(frame.shape)
+        if frame.shape != self.frames.shape[1:]:
+            raise ValueError(f"Frame shape {frame.shape} != worker buffer {self.frames.shape[1:]}")
+
+        slot = self.slots.get(frame.ctypes.data)
+        if slot is None:
+            slot = self.shared_frames
+            np.copyto(self.frames[slot], frame)
+        self.conn.send(slot)
+        n = self.conn.recv()
+        if isinstance(n, str):
+            raise RuntimeError(f"Inference worker: {n}")
+
+        # copy out, the block is overwritten by the next frame
+        hands = [HandLandmarks(self.landmarks[i].copy()) for i in range(n)]
+        handedness = [
+                ("Right" if is_right else "Left", float(score))
+                for is_right, score in self.handedness[:n]]
+        return hands, handedness
+
+    def close(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.conn.send(None)
+            self.process.join(timeout=2.0)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+        del self.frames, self.landmarks, self.handedness
+        for shm in (self.frame_shm, self.result_shm):
+            try:
+                shm.close()
+            except BufferError:
+                # a FrameSource still holds the ring, the mapping goes when it does
+                pass
+            shm.unlink()
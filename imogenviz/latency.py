@@ -0,0 +1,202 @@
+# End to end latency from frame capture to a hit being audible.
+#
+# Every frame stamps capture, inference done and gesture decision. Every
+# drum hit additionally stamps the Trig.play() call (inside the CallAfter
+# when a quantizer delays the hit) and, through a TrigFunc running in the
+# audio thread, the block in which the sample starts. That block still has
+# to go through the output buffer and the output chain's delay, so the hit
+# is audible output_latency later, which is the "audible" stamp "total"
+# ends at. The gaps between stamps go into rolling windows for p50/p95/p99.
+#
+# Every hit carries its own stamps. Hits played on one voice queue up until
+# their blocks run, so two quantized hits on the same voice landing before
+# the next block do not overwrite each other.
+
+import csv
+import json
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from pyo import TrigFunc
+
+PERCENTILES = (50, 95, 99)
+
+# segment name -> (from stamp, to stamp)
+SEGMENTS = {
+    "inference": ("capture", "inference"),
+    "decision": ("inference", "decision"),
+    "play": ("decision", "play"),
+    "audio": ("play", "audio"),
+    "output": ("audio", "audible"),
+    "total": ("capture", "audible"),
+}
+FRAME_SEGMENTS = ("inference", "decision")
+
+
+class RollingWindow:
+    """
+    Fixed size ring buffer of the last samples of one segment
+
+    Samples come from the trigger and audio threads while the render thread
+    reads the percentiles, so both sides take the lock.
+    """
+
+    def __init__(self, size=512):
+        self.values = np.zeros(size, dtype=np.float64)
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def add(self, value: float):
+        with self._lock:
+            self.values[self.count % len(self.values)] = value
+            self.count += 1
+
+    def percentiles(self, q=PERCENTILES) -> np.ndarray:
+        with self._lock:
+            if self.count == 0:
+                return np.zeros(len(q))
+            values = self.values[:min(self.count, len(self.values))].copy()
+        return np.percentile(values, q)
+
+
+class LatencyTracker:
+    """
+    Collects latency stamps from the pipeline and the audio server
+
+    Parameters:
+    - server: pyo server, used for the sample position of each onset and
+      the output buffer latency
+    - dsp_latency: Seconds the output chain adds after the onset block,
+      e.g. Mixer.latency for the limiter's lookahead
+    - window: Number of samples kept per segment for the percentiles
+    - max_events: Number of drum hits kept for the export
+    - max_pending: Hits per voice waiting for their block, older ones of a
+      voice whose onsets are never seen are dropped
+    """
+
+    def __init__(self, server, window=512, max_events=10000, dsp_latency=0.0, max_pending=32):
+        self.server = server
+        self.dsp_latency = dsp_latency
+        self.windows = {name: RollingWindow(window) for name in SEGMENTS}
+        self.events = deque(maxlen=max_events)
+        # voice name -> played hits in play order, waiting for their onset
+        self.pending = {}
+        self.max_pending = max_pending
+        self.trig_funcs = []
+
+    @property
+    def output_latency(self) -> float:
+        """
+        Seconds between a computed block and the speakers, the audio
+        buffered plus the delay of the output chain
+        """
+        return self.server.getBufferSize() / self.server.getSamplingRate() + self.dsp_latency
+
+    def watch(self, trig, name):
+        """
+        Stamp the audio block every time trig fires
+
+        Parameters:
+        - name: Voice name, or a callable returning it when the trig fires
+          for trigs shared by several voices (a sampler voice pool)
+        """
+        self.trig_funcs.append(TrigFunc(trig, self._onset, arg=name))
+
+    def frame(self, capture_time, inference_time, decision_time):
+        """Stamps every processed frame has, hit or not"""
+        self.windows["inference"].add(inference_time - capture_time)
+        self.windows["decision"].add(decision_time - inference_time)
+
+    def trigger(self, name, capture_time, inference_time, decision_time) -> dict:
+        """
+        Call when the voice registered as name is decided to play, returns
+        the hit's stamps for played
+        """
+        return {
+            "name": name,
+            "capture": capture_time,
+            "inference": inference_time,
+            "decision": decision_time,
+        }
+
+    def played(self, stamps):
+        """
+        Call right before Trig.play() of the voice with the stamps trigger
+        returned, from whichever thread calls it, so a quantizer's wait
+        counts as decision -> play
+        """
+        stamps["play"] = time.time()
+        queue = self.pending.get(stamps["name"])
+        if queue is None:
+            queue = self.pending.setdefault(stamps["name"], deque(maxlen=self.max_pending))
+        queue.append(stamps)
+
+    def _onset(self, name):
+        # runs in the audio thread, inside the block computing the onset
+        if callable(name):
+            name = name()
+        queue = self.pending.get(name)
+        if not queue:
+            return
+        # hits on a voice start in the order they were played
+        stamps = queue.popleft()
+        stamps["audio"] = time.time()
+        stamps["audible"] = stamps["audio"] + self.output_latency
+        stamps["audio_sample"] = self.server.getCurrentTimeInSamples()
+        for segment, (start, end) in SEGMENTS.items():
+            if segment not in FRAME_SEGMENTS:
+                self.windows[segment].add(stamps[end] - stamps[start])
+        self.events.append(stamps)
+
+    def expected_latency(self) -> float:
+        """
+        Seconds from capture to audible sound, the median of the measured
+        totals (which end at the audible stamp) once hits were timed,
+        before that an estimate of the same span: the frame segments, half
+        a block of waiting for the block that plays the hit, and the
+        output latency
+        """
+        total = self.windows["total"]
+        if total.count:
+            return float(total.percentiles((50,))[0])
+        frame = sum(float(self.windows[segment].percentiles((50,))[0]) for segment in FRAME_SEGMENTS)
+        block_wait = 0.5 * self.server.getBufferSize() / self.server.getSamplingRate()
+        return frame + block_wait + self.output_latency
+
+    def summary(self) -> dict:
+        """
+        Milliseconds per segment and percentile, "output" is the buffer and
+        dsp delay output_buffer_ms and dsp_ms add to every hit
+        """
+        summary = {}
+        for segment, window in self.windows.items():
+            values = window.percentiles() * 1000
+            summary[segment] = {f"p{q}": float(v) for q, v in zip(PERCENTILES, values)}
+            summary[segment]["count"] = window.count
+        summary["output_buffer_ms"] = 1000 * self.server.getBufferSize() / self.server.getSamplingRate()
+        summary["dsp_ms"] = self.dsp_latency * 1000
+        return summary
+
+    def overlay_lines(self) -> list[str]:
+        lines = []
+        for segment in ("inference", "total"):
+            p50, p95, p99 = self.windows[segment].percentiles() * 1000
+            lines.append(f"{segment} p50 {p50:.0f} p95 {p95:.0f} p99 {p99:.0f} ms")
+        return lines
+
+    def export(self, path):
+        """Write the drum hit stamps as CSV, or summary plus hits as JSON"""
+        events = list(self.events)
+        if path.endswith(".csv"):
+            columns = ["name", "capture", "inference", "decision", "play", "audio", "audible", "audio_sample"]
+            with open(path, "w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=columns)
+                writer.writeheader()
+                writer.writerows(events)
+        else:
+            with open(path, "w") as f:
+                json.dump({"summary": self.summary(), "events": events}, f, indent=2)
+        print(f"Saved latency report to {path}")
@@ -7,10 +7,12 @@ from dataclasses import dataclass
 
 from limbs import (
         LimbIndex,
-        LimbPosition,
-        r2distance,
-        average_distance,
-        calculate_center_of_mass
+        HandLandmarks,
+        )
+from gestures import (
+        HandFeatures,
+        compute_features,
+        stack_hands,
         )
 
 
@@ -22,53 +24,43 @@ class GestureData:
     middle_finger_bent: bool = False
     ring_finger_bent: bool = False
     hand_size: float = 0.0
-    average_position: float = 0.0
-
+    center_of_mass: tuple = (0.0, 0.0)
 
-def process_hand(limb_list: list[LimbPosition]):
-    # TODO swaft the limb_list with something indexable as there are many
-    # different values
-    thumb = None
-    index_finger_pip = None
-    index_finger_tip = None
-    middle_finger_pip = None
-    middle_finger_tip = None
-    ring_finger_pip = None
-    ring_finger_tip = None
 
-    for limb in limb_list:
-        if limb.index == LimbIndex.THUMB_TIP:
-            thumb = limb
-        if limb.index == LimbIndex.INDEX_FINGER_PIP:
-            index_finger_pip = limb
-        if limb.index == LimbIndex.INDEX_FINGER_TIP:
-            index_finger_tip = limb
-            
-        if limb.index == LimbIndex.MIDDLE_FINGER_PIP:
-            middle_finger_pip = limb
-        if limb.index == LimbIndex.MIDDLE_FINGER_TIP:
-            middle_finger_tip = limb
+def process_hand(hand: HandLandmarks):
+    if hand is None or len(hand) == 0:
+        return GestureData()
+    return features_to_gesture_data(compute_features(hand.points), 0)
 
-        if limb.index == LimbIndex.RING_FINGER_PIP:
-            ring_finger_pip = limb
-        if limb.index == LimbIndex.RING_FINGER_TIP:
-            ring_finger_tip = limb
-
-    # normalized between 150 and 0 
-    distance_hands = max(0, (average_distance(limb_list)-20)/(150-20))
+def process_hands(hands: list[HandLandmarks]) -> list[GestureData]:
+    """Batched process_hand, all hands share one vectorized feature pass"""
+    features = compute_features(stack_hands(hands))
+    gestures = []
+    feature_index = 0
+    for hand in hands:
+        if hand is None or len(hand) == 0:
+            gestures.append(GestureData())
+        else:
+            gestures.append(features_to_gesture_data(features, feature_index))
+            feature_index += 1
+    return gestures
 
+def features_to_gesture_data(features: HandFeatures, i: int) -> GestureData:
+    bent = features.fingers_bent[i]
+    center_x, center_y = features.center_of_mass[i]
     return GestureData(
-            thumb_index_distance = r2distance(thumb, index_finger_tip),
-            index_finger_bent = check_finger_bent(index_finger_pip, index_finger_tip),
-            middle_finger_bent = check_finger_bent(middle_finger_pip, middle_finger_tip),
-            ring_finger_bent = check_finger_bent(ring_finger_pip, ring_finger_tip),
-            hand_size = distance_hands
+            thumb_index_distance = float(features.pinch_distances[i, 0]),
+            index_finger_bent = bool(bent[0]),
+            middle_finger_bent = bool(bent[1]),
+            ring_finger_bent = bool(bent[2]),
+            hand_size = float(features.hand_size[i]),
+            center_of_mass = (float(center_x), float(center_y)),
         )
 
 def check_finger_bent(pip, tip):
+    """pip and tip are (x, y) rows of HandLandmarks"""
     if pip is None or tip is None:
         return False
-    if pip.y < tip.y:
+    if pip[1] < tip[1]:
         return True
     return False
-
@@ -1,9 +1,12 @@
 
 
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 
 from enum import Enum
+from itertools import chain
+from operator import attrgetter
 import math as math
+import numpy as np
 
 
 class LimbIndex(Enum):
@@ -45,18 +48,101 @@ class LimbPosition:
     def xypos(self) -> tuple[int,int]:
         return self.x, self.y
 
-def r2distance(pos1: LimbPosition, pos2: LimbPosition) -> float:
-    """Calculate Euclidean distance between two LimbPosition objects"""
+
+NUM_LIMBS = 21
+
+_landmark_xy = attrgetter("x", "y")
+
+# bones between landmarks, same as mediapipe's HAND_CONNECTIONS
+HAND_CONNECTIONS = (
+    (0, 1), (1, 2), (2, 3), (3, 4),
+    (0, 5), (5, 6), (6, 7), (7, 8),
+    (5, 9), (9, 10), (10, 11), (11, 12),
+    (9, 13), (13, 14), (14, 15), (15, 16),
+    (13, 17), (0, 17), (17, 18), (18, 19), (19, 20),
+    )
+
+
+@dataclass(eq=False)
+class HandLandmarks:
+    """
+    All landmarks of one hand as a (21, 2) array of pixel coordinates
+
+    Rows are ordered by LimbIndex value, so hand[LimbIndex.THUMB_TIP] gives
+    the (x, y) of the thumb tip without scanning. A hand that was not found
+    holds an empty (0, 2) array.
+    """
+    points: np.ndarray = field(
+            default_factory=lambda: np.empty((0, 2), dtype=np.int32))
+
+    @classmethod
+    def from_mediapipe(cls, hand_landmarks, width: int, height: int) -> "HandLandmarks":
+        """Convert a mediapipe NormalizedLandmarkList to pixel coordinates"""
+        landmarks = hand_landmarks.landmark
+        # the x, y fields are read by attrgetter in C, no Python loop per landmark
+        normalized = np.fromiter(chain.from_iterable(map(_landmark_xy, landmarks)),
+                                 dtype=np.float32, count=2 * len(landmarks))
+        points = np.empty((len(landmarks), 2), dtype=np.int32)
+        np.multiply(normalized.reshape(-1, 2), (width, height), out=points, casting="unsafe")
+        return cls(points)
+
+    @classmethod
+    def from_limb_list(cls, limb_list: list[LimbPosition]) -> "HandLandmarks":
+        if not limb_list:
+            return cls()
+        points = np.zeros((NUM_LIMBS, 2), dtype=np.int32)
+        for limb in limb_list:
+            points[limb.index.value] = limb.x, limb.y
+        return cls(points)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __getitem__(self, index):
+        if isinstance(index, LimbIndex):
+            index = index.value
+        return self.points[index]
+
+    @property
+    def x(self) -> np.ndarray:
+        return self.points[:, 0]
+
+    @property
+    def y(self) -> np.ndarray:
+        return self.points[:, 1]
+
+    def bbox(self) -> tuple:
+        """xmin, ymin, xmax, ymax of the hand, empty tuple if no hand"""
+        if len(self.points) == 0:
+            return ()
+        xmin, ymin = self.points.min(axis=0)
+        xmax, ymax = self.points.max(axis=0)
+        return int(xmin), int(ymin), int(xmax), int(ymax)
+
+    def to_limb_list(self) -> list[LimbPosition]:
+        return [LimbPosition(LimbIndex(i), int(x), int(y))
+                for i, (x, y) in enumerate(self.points)]
+
+
+def _xy(pos) -> tuple:
+    if isinstance(pos, LimbPosition):
+        return pos.x, pos.y
+    return pos[0], pos[1]
+
+def r2distance(pos1, pos2) -> float:
+    """Calculate Euclidean distance between two LimbPositions or (x, y) points"""
     if (pos1 is None) or (pos2 is None):
         return 0.0
-    
-    if pos1.x is None or pos1.y is None or pos2.x is None or pos2.y is None:
+
+    x1, y1 = _xy(pos1)
+    x2, y2 = _xy(pos2)
+    if x1 is None or y1 is None or x2 is None or y2 is None:
         raise ValueError("Cannot calculate distance with None coordinates")
-        
-    return math.sqrt((pos2.x - pos1.x) ** 2 + (pos2.y - pos1.y) ** 2)
 
-def average_distance(positions: list[LimbPosition]) -> float:
-    """Calculate average pairwise distance between all LimbPosition objects"""
+    return math.sqrt((x2 - x1) ** 2 + (y2 - y1) ** 2)
+
+def average_distance(positions) -> float:
+    """Calculate average pairwise distance between all positions of a hand"""
     if positions is None:
         return 0.0
     
@@ -76,9 +162,13 @@ def average_distance(positions: list[LimbPosition]) -> float:
             
     return total_distance / num_pairs
 
-def calculate_center_of_mass(positions: list[LimbPosition]) -> tuple[float, float]:
+def calculate_center_of_mass(positions) -> tuple[float, float]:
     if positions is None or len(positions) == 0:
         return 0.0, 0.0
+
+    if isinstance(positions, HandLandmarks):
+        avg_x, avg_y = positions.points.mean(axis=0)
+        return float(avg_x), float(avg_y)
     
     # Initialize sums
     sum_x = 0
@@ -0,0 +1,182 @@
+# Multi track audio looper.
+#
+# Every track owns one stereo NewTable allocated up front for the longest
+# loop allowed, so recording, overdubbing and clearing never allocate while
+# playing and memory stays fixed for however long the session runs.
+#
+# All tracks are driven by one master Count, an integer sample counter that
+# wraps at the loop length and is the loop position. Reading (TableIndex) and writing (TableWrite) both follow it, so
+# every track is sample aligned with every other and recording can be
+# punched in at any point, it always lands at the right place in the loop.
+# How long a take writes is set by a Linseg gate, which is sample accurate,
+# so a take covers exactly its loops and never overdubs the seam twice.
+#
+# The tracks are summed into Looper.output, a Mixer strip like any other
+# instrument (instrument_mixer(looper=...)), so loops go through the master
+# level and limiter. pyo computes objects in the order they are created, so
+# the looper is created before the mixer that plays it, and each track's
+# writer is created again by set_input, after the bus it records, so it
+# writes that bus's block of the same pass.
+
+from pyo import (
+        CallAfter,
+        Count,
+        Linseg,
+        Mix,
+        NewTable,
+        Sig,
+        SigTo,
+        TableIndex,
+        TableWrite,
+        Trig,
+        )
+
+BEATS_PER_BAR = 4
+
+
+class LooperTrack:
+    """One stereo loop, see Looper for how tracks are created"""
+
+    def __init__(self, looper, max_seconds, volume=0.8):
+        self.looper = looper
+        self.table = NewTable(length=max_seconds, chnls=2)
+        self.recording = False
+        self.has_audio = False
+
+        # while the gate is open the loop gets the input, replacing what is
+        # there (replace=1) or on top of it (replace=0). Once it closes the
+        # writer just writes the loop back unchanged until it is stopped.
+        self.gate = Linseg([(0, 0.0), (1, 0.0)])
+        self.replace = Sig(1.0)
+        self.volume = SigTo(volume, time=0.05)
+
+        self.playback = TableIndex(self.table, looper.position)
+        self.output = self.playback * self.volume
+        self.writer = None
+        self.stop_call = None
+        self.set_input(Sig([0.0, 0.0]))
+
+    def set_input(self, source):
+        """Record from a pyo object, e.g. an instrument bus or Mixer.recorded"""
+        if self.writer is not None:
+            self.stop_recording()
+        self.source = source
+        self.writer = TableWrite(
+                source * self.gate + self.playback * (1 - self.gate * self.replace),
+                self.looper.position, self.table, mode=1)
+        self.writer.stop()
+
+    def _write(self, overdub, loops):
+        self.stop_recording()
+        self.replace.value = 0.0 if overdub else 1.0
+        if loops is None:
+            self.gate.setList([(0, 1.0), (1, 1.0)])
+        else:
+            # open for exactly n loop lengths so every sample is written once
+            duration = loops * self.looper.loop_duration
+            self.gate.setList([(0, 1.0), (duration - 1.0 / self.looper.sr, 1.0), (duration, 0.0)])
+            block = self.looper.server.getBufferSize() / self.looper.sr
+            self.stop_call = CallAfter(self.stop_recording, time=duration + 2 * block)
+        self.gate.play()
+        self.writer.play()
+        self.recording = True
+        self.has_audio = True
+
+    def record(self, loops=1):
+        """Replace the loop with the input, stops after loops passes (None: never)"""
+        self._write(False, loops)
+
+    def overdub(self, loops=1):
+        """Add the input on top of the loop"""
+        self._write(True, loops)
+
+    def stop_recording(self):
+        self.writer.stop()
+        self.gate.stop()
+        self.recording = False
+        if self.stop_call is not None:
+            self.stop_call.stop()
+            self.stop_call = None
+
+    def toggle_record(self):
+        """Record into an empty track, overdub onto one with audio, or stop"""
+        if self.recording:
+            self.stop_recording()
+        elif self.has_audio:
+            self.overdub()
+        else:
+            self.record()
+
+    def clear(self):
+        self.stop_recording()
+        self.table.reset()
+        self.has_audio = False
+
+    def set_volume(self, volume):
+        self.volume.value = volume
+
+
+class Looper:
+    """
+    Several tracks locked to one tempo
+
+    Parameters:
+    - server: Running pyo server
+    - n_tracks: Number of tracks, all allocated up front
+    - bpm: Tempo the loop length follows
+    - bars: Loop length in bars of BEATS_PER_BAR beats
+    - max_seconds: Longest loop a track can hold, sets the table size
+    """
+
+    def __init__(self, server, n_tracks=4, bpm=100.0, bars=2, max_seconds=16.0):
+        self.server = server
+        self.sr = server.getSamplingRate()
+        self.max_seconds = max_seconds
+        self.max_samples = int(max_seconds * self.sr)
+
+        # exact integers, a float phase would hit some samples twice per pass
+        self.start_trig = Trig()
+        self.position = Count(self.start_trig, min=0, max=self.max_samples - 1)
+        self.loop_samples = self.max_samples
+        self.set_tempo(bpm, bars)
+        self.start_trig.play()
+
+        self.tracks = [LooperTrack(self, max_seconds) for _ in range(n_tracks)]
+        # heard on its own, a Mixer strip takes it off the output
+        self.output = Mix([track.output for track in self.tracks], voices=2).out()
+
+    def set_tempo(self, bpm, bars=None):
+        """Change the loop length, the tables are not reallocated"""
+        self.bpm = bpm
+        if bars is not None:
+            self.bars = bars
+        samples = round(self.bars * BEATS_PER_BAR * 60.0 / bpm * self.sr)
+        if samples > self.max_samples:
+            raise ValueError(
+                    f"{self.bars} bars at {bpm} bpm is longer than max_seconds={self.max_seconds}")
+        self.loop_samples = samples
+        self.position.max = samples - 1
+
+    @property
+    def loop_duration(self) -> float:
+        return self.loop_samples / self.sr
+
+    @property
+    def memory_bytes(self) -> int:
+        """Fixed table memory of all tracks, assuming 32 bit samples"""
+        return len(self.tracks) * 2 * self.max_samples * 4
+
+    def set_input(self, source):
+        """
+        Record source on every track, a list of objects is mixed to stereo.
+        Call it after source was created, see the top of this file
+        """
+        if isinstance(source, list):
+            self.input_mix = Mix(source, voices=2)
+            source = self.input_mix
+        for track in self.tracks:
+            track.set_input(source)
+
+    def clear(self):
+        for track in self.tracks:
+            track.clear()
@@ -1,144 +1,301 @@
-import cv2
-import numpy as np
+import sys
+from startup import StartupProfiler
+
+# created before anything heavy is imported so every import shows up in the
+# --profile-startup report
+profiler = StartupProfiler(enabled="--profile-startup" in sys.argv)
+
+import argparse
+import functools
+import json
 import time
-import math as math
+# mediapipe is only imported when the in process model is created, pyo
+# only by start_audio
 from handtracking import HandTrackingDynamic
-from pyo_server import setup_server, close_server
-from limbs import (
-        LimbIndex,
-        LimbPosition,
-        r2distance,
-        average_distance,
-        calculate_center_of_mass
-        )
-from drums import Drums
-from pad_drone import PAD 
-from limb_trigger import (
-        GestureData,
-        process_hand,
+from pyo_server import BACKENDS, BUFFERSIZE, detect_backend, setup_server, close_server
+from theory import MODES, parse_progression
+from controller import (
+        DEFAULT_KEY,
+        DEFAULT_PROGRESSION,
+        GestureController,
+        track_hands,
     )
+from pipeline import Pipeline
+from replay import LandmarkRecorder
+from mapping import DEFAULT_MAPPING, VOCALS_MAPPING, load_mapping
+from smoothing import OneEuroFilter
+from render import RENDER_MODES, Renderer
+from frame_source import open_source
+
+def start_audio(args):
+    """Audio server and instruments, runs on a startup thread while the model loads"""
+    from pad_drone import PAD
+    from drums import Drums
+    from mixer import instrument_mixer
+
+    # the manual backend only computes audio when server.process() is
+    # called, which is what replay.py does, live it would stay silent
+    if (args.audio_backend or detect_backend()) == "manual":
+        raise RuntimeError("No sound card found (manual audio backend), "
+                           "render a recording with replay.py instead")
 
-chord_progression = [
-    ("C", "major", 4),
-    ("F", "sus4", 4),
-    ("F", "maj7", 4),
-    ("G", "dom7", 4),
-    ("A", "minor", 4)
-]
-
-def main():
-    
-    # Setup camera
-    ctime = 0
-    ptime = 0
-    cap = cv2.VideoCapture(0)
-    detector = HandTrackingDynamic()
-    cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
-    cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
-   
-    # Setup instruments
-    server = setup_server()
-    pad = PAD(server=server)
+    # the live mic opens the input too, at the smallest stable buffer size
+    live_vocals = args.vocals and not args.vocal_file
+    buffer_size = args.buffer_size
+    if buffer_size is None:
+        buffer_size = 0 if live_vocals else BUFFERSIZE
+    server = setup_server(
+            backend=args.audio_backend, buffersize=buffer_size or None,
+            output_device=args.audio_device, duplex=1 if live_vocals else 0)
+    # the mixer's shared reverb stands in for the pad's own
+    pad = PAD(server=server, reverb=False)
     drums = Drums(server=server)
-   
-    # define trigger classes
 
+    vocals = None
+    chain = args.vocal_chain.split(",")
+    if args.vocals:
+        from vocals import RoundTripMeter, VocalChain, open_vocal_input
+
+        if args.round_trip and live_vocals:
+            report = RoundTripMeter(server).measure()
+            print(f"Vocal round trip: {report.get('median_ms', float('nan')):.1f} ms "
+                  f"(buffers alone {report['buffer_floor_ms']:.1f} ms), "
+                  f"{report['received']}/{report['clicks']} clicks heard")
+        source = open_vocal_input(args.vocal_file) if args.vocal_file else None
+        vocals = VocalChain(server, source=source, chain=[stage for stage in chain if stage != "reverb"],
+                            pad=pad)
+    looper = None
+    if args.loop_tracks:
+        from looper import Looper
+
+        # before the mixer, which plays the loops through a strip
+        looper = Looper(server, n_tracks=args.loop_tracks, bpm=args.bpm, bars=args.loop_bars)
+    # a dotted eighth echo
+    mixer = instrument_mixer(server, pad, drums, vocals, vocal_reverb=0.3 if "reverb" in chain else 0.0,
+                             delay_time=0.75 * 60.0 / args.bpm, looper=looper)
+    if looper is not None:
+        looper.set_input(mixer.recorded)
+    return server, pad, drums, vocals, mixer, looper
+
+def main(args):
 
-    if not cap.isOpened():
+    # Setup camera, frames are delivered as RGB for mediapipe
+    with profiler.phase("camera"):
+        source = open_source(args.source, args.width, args.height, args.fps, args.fourcc or None)
+    if not source.opened:
         print("Error: Could not open camera.")
         return
-    
-    print("Press 'q' to quit")
-    # Chord and cooldown values
-    current_chord: Tuple = ("F", "maj7", 4)
-    current_index = 0
-
-    # event based cooldown values
-    last_chord_change_time = 0
-
-    last_kick_time = 0
-    last_clap_time = 0
-    last_hihat_time = 0
-    last_snare_time = 0
-
-    d_timeout = 0.8 # seconds, drums
-    p_timeout = 2 # seconds, pad
-    pad.play_chord(*current_chord)
-   
-    while True:
-        ret, frame = cap.read()
-        frame = detector.findFingers(frame) 
-
-        # Below does not belong in main thread
-        limb_list_one, bbox_left = detector.findPosition(frame, handNo=0)
-        try:  
-            limb_list_two, bbox_right = detector.findPosition(frame, handNo=1)
-        except Exception as e:
-            print("ERROR: ", e)
-            limb_list_two = []
-
-        left_limb_list = limb_list_one
-        right_limb_list = limb_list_two
-        # assigning left hand to left part of screen, right to right
-        if len(limb_list_two) > 0:
-            if limb_list_one[0].x > limb_list_two[0].x:
-                left_limb_list = limb_list_two
-                right_limb_list = limb_list_one
-
-        left_hand: GestureData = process_hand(left_limb_list)
-        right_hand: GestureData = process_hand(right_limb_list)
-
-        # TODO MAP TO TRIGGER THREAD
-        # LEFT HAND PROCESSING -> 
-        if left_hand.index_finger_bent and ( ctime - last_kick_time) >= d_timeout:
-            drums.play_kick()
-            last_kick_time = ctime
-
-        if left_hand.ring_finger_bent and ( ctime - last_snare_time) >= d_timeout:
-            drums.play_snare()
-            last_snare_time = ctime
-       
-        if left_hand.middle_finger_bent and ( ctime - last_hihat_time) >= d_timeout:
-            drums.play_hihat()
-            last_hihat_time = ctime
-
-        # RIGHT HAND PROCESSING
-
-        # goes from 15 to 200 -> map so its a logarithmic scale from 10 to 20000
-        cutoff_freq = float(20000 - (np.log(right_hand.thumb_index_distance/15)/np.log(200/15)) * 19990)
-
-        if right_hand.hand_size > 0.8 and ( ctime - last_chord_change_time) >= p_timeout:
-            chord = chord_progression[current_index]
-            current_chord = chord
-            pad.play_chord(*chord)
-        
-            # Update tracking variables
-            last_chord_change_time = ctime
-            current_index = (current_index + 1) % len(chord_progression)
-
-        pad.set_filter(cutoff_freq)
-
-        if not ret:
-            print("Error: Can't receive frame. Exiting...")
-            break
-
-        ctime = time.time()
-        fps =1/(ctime-ptime)
-        ptime = ctime
-
-        cv2.putText(frame, str(int(fps)), (10,70), cv2.FONT_HERSHEY_PLAIN,3,(255,0,255),3)
-        cv2.putText(
-                frame, 
-                str(current_chord[0]) + str(current_chord[1]) + " - octave:" + str(current_chord[2]),
-                (10,140), cv2.FONT_HERSHEY_PLAIN,3,(255,0,255),3)
-
-        cv2.imshow('Camera :)', frame)
-        
-        if cv2.waitKey(1) & 0xFF == ord('q'):
-            break
-    
-    cap.release()
-    cv2.destroyAllWindows()
+
+    # Setup instruments in parallel with the model
+    audio = profiler.background("audio", start_audio, args)
+
+    # the renderer draws the hands itself, from its own thread
+    with profiler.phase("model"):
+        detector = HandTrackingDynamic(
+                roi_tracking=args.roi, backend=args.backend, draw=False, rgb_input=source.rgb,
+                shared_frames=len(source.buffers))
+        detector.warm_up((source.height, source.width, 3))
+        if detector.worker is not None:
+            # the camera decodes straight into the worker's shared memory
+            source.use_buffers(detector.worker.shared_buffers())
+
+    with profiler.phase("audio wait"):
+        server, pad, drums, vocals, mixer, looper = audio.result()
+
+    # these need pyo, which start_audio has imported by now
+    from latency import LatencyTracker
+    from quantizer import QuantizedScheduler
+    from event_looper import EventLooper
+
+    print("Press 'q' to quit" if args.render != "none" else "Press Ctrl+C to quit")
+    # the limiter's lookahead is part of the floor of every hit
+    latency = LatencyTracker(server, dsp_latency=mixer.latency)
+    for i, voice in enumerate(drums.voices):
+        latency.watch(voice.trig, functools.partial(drums.voice_pad_name, i))
+    quantizer = None
+    if args.quantize:
+        quantizer = QuantizedScheduler(
+                server, bpm=args.bpm, division=args.quantize,
+                swing=args.swing, strength=args.quantize_strength)
+    mapping = load_mapping(args.mapping or (VOCALS_MAPPING if vocals is not None else DEFAULT_MAPPING))
+    progression = parse_progression(args.progression, key=args.key, mode=args.mode)
+    smoother = OneEuroFilter() if args.smooth or args.predict else None
+    event_looper = None
+    if args.event_loop:
+        # the controller plays through proxies that log into the event loop
+        event_looper = EventLooper(server, drums, pad, bpm=args.bpm, bars=args.loop_bars)
+        controller = GestureController(
+                event_looper.pad_proxy, event_looper.drums_proxy,
+                latency=latency, quantizer=quantizer, mapping=mapping,
+                smoother=smoother, predict=args.predict, progression=progression,
+                vocals=vocals, mixer=mixer)
+        print("Event looper: e records/stops a loop of events, x clears it")
+    else:
+        controller = GestureController(
+                pad, drums, latency=latency, quantizer=quantizer, mapping=mapping,
+                smoother=smoother, predict=args.predict, progression=progression,
+                vocals=vocals, mixer=mixer)
+
+    if looper is not None:
+        print(f"Looper: {args.loop_tracks} tracks of {looper.loop_duration:.2f}s, "
+              f"{looper.memory_bytes / 1e6:.1f} MB, keys 1-{args.loop_tracks} record/overdub, c clears")
+    recorder = LandmarkRecorder(args.record) if args.record else None
+
+    def trigger(tracked):
+        if recorder is not None:
+            recorder.add(tracked)
+        controller(tracked)
+
+    # capture -> inference -> trigger, with render fed from inference
+    pipeline = Pipeline()
+    frames = pipeline.queue("frames")
+    to_trigger = pipeline.queue("trigger")
+
+    # tracking fps for the debug overlay, from the inference stage's frame count
+    tracking = {"count": 0, "time": time.perf_counter(), "fps": 0.0}
+
+    def status():
+        now = time.perf_counter()
+        count = pipeline.all_stats()["inference"].count
+        if now - tracking["time"] >= 0.5:
+            tracking["fps"] = (count - tracking["count"]) / (now - tracking["time"])
+            tracking.update(count=count, time=now)
+        chord = controller.current_chord
+        lines = [f"tracking {tracking['fps']:.0f} fps", f"{chord[0]}{chord[1]} - octave:{chord[2]}"]
+        return lines + latency.overlay_lines()
+
+    renderer = Renderer(args.render, fps=args.preview_fps, status=status, rgb=source.rgb)
+    to_render = None
+    if not renderer.headless:
+        to_render = pipeline.queue("render")
+        to_show = pipeline.queue("show")
+
+    def capture(_):
+        frame, capture_time = source.read()
+        if frame is None:
+            raise RuntimeError("Can't receive frame")
+        return frame, capture_time
+
+    def inference(item):
+        frame, capture_time = item
+        tracked = track_hands(detector, frame, capture_time)
+        if to_render is not None:
+            # the renderer gets its own copy, the capture ring reuses the buffer
+            snapshot = renderer.handoff(tracked)
+            if snapshot is not None:
+                to_render.put(snapshot)
+        return tracked
+
+    profiler.done()
+    if profiler.enabled:
+        print(profiler.report())
+
+    pipeline.add_stage("capture", capture, outboxes=[frames])
+    pipeline.add_stage("inference", inference, inbox=frames, outboxes=[to_trigger])
+    pipeline.add_stage("trigger", trigger, inbox=to_trigger)
+    if not renderer.headless:
+        pipeline.add_stage("render", renderer.draw, inbox=to_render, outboxes=[to_show])
+    pipeline.start()
+
+    # Only the window itself stays on the main thread as cv2 windows are not thread safe
+    show_stats = None if renderer.headless else pipeline.stats("show")
+    try:
+        while pipeline.running:
+            if renderer.headless:
+                time.sleep(0.1)
+                continue
+            frame = to_show.get(timeout=renderer.interval)
+            start = time.perf_counter()
+            key = renderer.show(frame)
+            if frame is not None:
+                show_stats.record(time.perf_counter() - start)
+
+            if key == ord('q'):
+                break
+            if looper is not None:
+                if ord('1') <= key < ord('1') + len(looper.tracks):
+                    looper.tracks[key - ord('1')].toggle_record()
+                elif key == ord('c'):
+                    looper.clear()
+            if event_looper is not None:
+                if key == ord('e'):
+                    event_looper.toggle_record()
+                elif key == ord('x'):
+                    event_looper.clear()
+    except KeyboardInterrupt:
+        pass
+
+    pipeline.stop()
+    print(pipeline.report())
+    if recorder is not None:
+        recorder.save()
+    print(json.dumps(latency.summary(), indent=2))
+    if args.latency_log:
+        latency.export(args.latency_log)
+    if args.roi and args.backend == "inprocess":
+        print(f"roi frames: {detector.roi_frames}, full frames: {detector.full_frames}")
+    detector.close()
+    source.close()
+    renderer.close()
+    if vocals is not None:
+        vocals.close()
+    close_server(server)
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Hand tracked pad and drums")
+    parser.add_argument("--record", metavar="PATH",
+                        help="save the tracked landmarks to a .npz for replay.py")
+    parser.add_argument("--latency-log", metavar="PATH",
+                        help="export capture to audio latency as .csv or .json on exit")
+    parser.add_argument("--roi", action="store_true",
+                        help="skip palm detection while fewer hands than the maximum are tracked")
+    parser.add_argument("--backend", choices=["inprocess", "process"], default="inprocess",
+                        help="run mediapipe in this process or in a worker process")
+    parser.add_argument("--quantize", type=int, choices=[8, 16],
+                        help="snap drum hits to 1/8 or 1/16 steps")
+    parser.add_argument("--bpm", type=float, default=100.0)
+    parser.add_argument("--swing", type=float, default=0.0, help="0 (straight) to 1")
+    parser.add_argument("--quantize-strength", type=float, default=1.0,
+                        help="1 snaps fully to the grid, 0 leaves hits untouched")
+    parser.add_argument("--loop-tracks", type=int, default=0,
+                        help="number of looper tracks, 0 disables the looper")
+    parser.add_argument("--loop-bars", type=int, default=2)
+    parser.add_argument("--event-loop", action="store_true",
+                        help="loop drum/chord/filter events instead of audio")
+    parser.add_argument("--mapping", metavar="PATH",
+                        help="gesture to parameter mapping config, .json or .yaml, "
+                             "default mappings/default.json or mappings/vocals.json with --vocals")
+    parser.add_argument("--key", default=DEFAULT_KEY, help="key of the chord progression, e.g. D or Bb")
+    parser.add_argument("--mode", choices=list(MODES), default="major")
+    parser.add_argument("--progression", default=DEFAULT_PROGRESSION,
+                        help='Roman numerals or chord names, e.g. "ii7 V7 Imaj7" or "Am F C G"')
+    parser.add_argument("--smooth", action="store_true",
+                        help="One-Euro filter the landmarks against jitter")
+    parser.add_argument("--predict", action="store_true",
+                        help="smooth and extrapolate the landmarks by the measured latency")
+    parser.add_argument("--render", choices=RENDER_MODES, default="debug",
+                        help="none runs headless, preview shows the camera, debug adds overlays")
+    parser.add_argument("--preview-fps", type=float, default=15.0,
+                        help="preview window rate, independent of the tracking rate")
+    parser.add_argument("--source", default="0",
+                        help="camera index, a video file, or synthetic")
+    parser.add_argument("--fps", type=int, default=30, help="requested camera frame rate")
+    parser.add_argument("--fourcc", default="MJPG",
+                        help="camera pixel format, empty for the driver default")
+    parser.add_argument("--audio-backend", choices=[backend for backend in BACKENDS if backend != "manual"],
+                        help="audio backend, detected by default")
+    parser.add_argument("--audio-device", type=int, help="PortAudio output device index")
+    parser.add_argument("--buffer-size", type=int,
+                        help=f"audio buffer in samples, 0 probes the smallest stable size, "
+                             f"default {BUFFERSIZE} or probed with the live mic")
+    parser.add_argument("--vocals", action="store_true", help="sing into the mic through the vocal chain")
+    parser.add_argument("--vocal-file", metavar="WAV", help="loop a sound file instead of the mic")
+    parser.add_argument("--vocal-chain", default="gate,compressor,harmonizer,reverb",
+                        help="comma separated vocal stages")
+    parser.add_argument("--round-trip", action="store_true",
+                        help="measure the mic round trip latency at startup (needs the output to reach the mic)")
+    parser.add_argument("--profile-startup", action="store_true",
+                        help="print import and init time per module and phase at startup")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    main(parser.parse_args())
@@ -0,0 +1,285 @@
+# Declarative gesture -> instrument parameter mapping.
+#
+# A mapping config (JSON, or YAML if PyYAML is installed) routes GestureData
+# features of either hand to instrument parameters and actions:
+#
+#   {"mappings": [{"source": "right.thumb_index_distance",
+#                  "target": "pad.cutoff",
+#                  "in": [15, 200], "out": [20000, 20],
+#                  "curve": "log", "dead_zone": 0.0}],
+#    "rules": [{"source": "right.hand_size", "above": 0.8,
+#               "action": "next_chord", "cooldown": 2.0}]}
+#
+# Sources starting with "both." are features of the two hands together,
+# e.g. "both.distance" between their centers, only set while both are seen.
+#
+# Mappings are continuous. Each one is compiled once into a lookup table
+# over its input range with the curve, dead zone and clamp baked in, and all
+# tables are stacked into one array, so evaluating every mapping of a frame
+# is a single gather + interpolate. Inputs are clamped to the "in" range, so
+# a distance of 0 gives the end of the range instead of log(0) = -inf.
+#
+# Rules are discrete: the action fires while the source is above (or below)
+# the threshold, at most once per cooldown.
+
+import json
+import os
+from dataclasses import dataclass, fields
+
+import numpy as np
+
+from limb_trigger import GestureData
+
+DEFAULT_MAPPING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings", "default.json")
+# the default plus the vocal reverb send and harmony interval
+VOCALS_MAPPING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mappings", "vocals.json")
+
+HANDS = ("left", "right", "both")
+# slot of the "both" pseudo hand, after the two real ones
+BOTH = 2
+CURVES = ("linear", "log", "exp")
+LUT_SIZE = 1024
+
+
+def _field_getter(name):
+    return lambda gesture: float(getattr(gesture, name))
+
+
+# every scalar GestureData field, center_of_mass split into x and y
+FEATURES = {field.name: _field_getter(field.name)
+            for field in fields(GestureData) if field.name != "center_of_mass"}
+FEATURES["center_x"] = lambda gesture: float(gesture.center_of_mass[0])
+FEATURES["center_y"] = lambda gesture: float(gesture.center_of_mass[1])
+
+# features of the (left, right) GestureData pair, for "both." sources
+PAIR_FEATURES = {
+    "distance": lambda pair: float(np.hypot(*np.subtract(pair[1].center_of_mass, pair[0].center_of_mass))),
+}
+
+
+def parse_source(source):
+    """"right.hand_size" -> (1, "hand_size")"""
+    hand, _, feature = source.partition(".")
+    if hand not in HANDS:
+        raise ValueError(f"Unknown hand in source {source!r}, expected one of {HANDS}")
+    features = PAIR_FEATURES if hand == "both" else FEATURES
+    if feature not in features:
+        raise ValueError(f"Unknown feature in source {source!r}, expected one of {list(features)}")
+    return HANDS.index(hand), feature
+
+
+@dataclass
+class Mapping:
+    """
+    One continuous feature -> parameter route
+
+    Parameters:
+    - source: "<left|right>.<feature>" or "both.<feature>", see FEATURES
+      and PAIR_FEATURES
+    - target: "<instrument>.<parameter>", e.g. "pad.cutoff"
+    - input_range: Feature values mapped to the start and end of the output
+    - output_range: Parameter values, may be descending
+    - curve: "linear", "log" (input position on a log scale, input_range
+      must be positive) or "exp" (output moves by equal ratios, for
+      frequencies, output_range must be positive)
+    - dead_zone: Fraction of the input range at its start that maps to the
+      first output value
+    - clamp: Optional (low, high) the output is limited to
+    """
+    source: str
+    target: str
+    input_range: tuple
+    output_range: tuple
+    curve: str = "linear"
+    dead_zone: float = 0.0
+    clamp: tuple = None
+
+    def compile(self, size=LUT_SIZE) -> np.ndarray:
+        """Output values at size evenly spaced inputs across input_range"""
+        in_low, in_high = map(float, self.input_range)
+        out_low, out_high = map(float, self.output_range)
+        if in_low == in_high:
+            raise ValueError(f"{self.target}: empty input range")
+        if self.curve not in CURVES:
+            raise ValueError(f"{self.target}: unknown curve {self.curve!r}, expected one of {CURVES}")
+
+        x = np.linspace(in_low, in_high, size)
+        if self.curve == "log":
+            if in_low <= 0 or in_high <= 0:
+                raise ValueError(f"{self.target}: log curve needs a positive input range")
+            t = np.log(x / in_low) / np.log(in_high / in_low)
+        else:
+            t = (x - in_low) / (in_high - in_low)
+
+        if self.dead_zone > 0:
+            t = (t - self.dead_zone) / (1.0 - self.dead_zone)
+        t = np.clip(t, 0.0, 1.0)
+
+        if self.curve == "exp":
+            if out_low <= 0 or out_high <= 0:
+                raise ValueError(f"{self.target}: exp curve needs a positive output range")
+            table = out_low * (out_high / out_low) ** t
+        else:
+            table = out_low + t * (out_high - out_low)
+
+        if self.clamp is not None:
+            table = np.clip(table, *self.clamp)
+        return table
+
+
+@dataclass
+class Rule:
+    """
+    Fire an action while a feature is past a threshold
+
+    Parameters:
+    - source: "<left|right>.<feature>"
+    - action: Name of a callback given to MappingEngine.bind
+    - above / below: Threshold, the rule is active when the feature is
+      above (or below) it
+    - cooldown: Minimum seconds between two firings
+    """
+    source: str
+    action: str
+    above: float = None
+    below: float = None
+    cooldown: float = 0.0
+
+
+class MappingEngine:
+    """
+    Evaluates all mappings and rules of a config for each frame
+
+    Parameters:
+    - mappings: List of Mapping
+    - rules: List of Rule
+    - lut_size: Entries per lookup table
+    """
+
+    def __init__(self, mappings=(), rules=(), lut_size=LUT_SIZE):
+        self.mappings = list(mappings)
+        self.rules = list(rules)
+        self.lut_size = lut_size
+
+        # continuous mappings, one row per mapping
+        self.sources = [parse_source(m.source) for m in self.mappings]
+        self.tables = np.stack([m.compile(lut_size) for m in self.mappings]) \
+            if self.mappings else np.empty((0, lut_size))
+        self.rows = np.arange(len(self.mappings))
+        in_low = np.array([float(m.input_range[0]) for m in self.mappings])
+        in_high = np.array([float(m.input_range[1]) for m in self.mappings])
+        self.in_low = in_low
+        self.in_scale = (lut_size - 1) / (in_high - in_low) if self.mappings else in_low
+        self.values = np.full(len(self.mappings), np.nan)
+
+        # rules, thresholds as arrays, unused side is +-inf
+        self.rule_sources = [parse_source(r.source) for r in self.rules]
+        self.rule_above = np.array([np.inf if r.above is None else r.above for r in self.rules])
+        self.rule_below = np.array([-np.inf if r.below is None else r.below for r in self.rules])
+        for rule in self.rules:
+            if rule.above is None and rule.below is None:
+                raise ValueError(f"Rule for {rule.action!r} needs above or below")
+        self.rule_cooldown = np.array([r.cooldown for r in self.rules], dtype=np.float64)
+        self.rule_last = np.full(len(self.rules), -np.inf)
+
+        self.setters = None
+        self.actions = None
+
+    def bind(self, instruments: dict, actions: dict):
+        """
+        Resolve targets and actions, call once before update
+
+        Parameters:
+        - instruments: Name -> object with set_param(name, value), the
+          first part of a mapping target
+        - actions: Name -> callback() for the rules
+        """
+        setters = []
+        for mapping in self.mappings:
+            instrument, _, param = mapping.target.partition(".")
+            if instrument not in instruments:
+                raise ValueError(f"Unknown instrument in target {mapping.target!r}")
+            params = getattr(instruments[instrument], "params", None)
+            if params is not None and param not in params.index:
+                raise ValueError(f"Unknown parameter in target {mapping.target!r}, expected one of {params.names}")
+            setters.append((instruments[instrument].set_param, param))
+        for rule in self.rules:
+            if rule.action not in actions:
+                raise ValueError(f"Unknown action {rule.action!r}, expected one of {list(actions)}")
+        self.setters = setters
+        self.actions = [actions[rule.action] for rule in self.rules]
+
+    @staticmethod
+    def _gather(sources, gestures, present):
+        x = np.empty(len(sources))
+        valid = np.empty(len(sources), dtype=bool)
+        for i, (hand, feature) in enumerate(sources):
+            valid[i] = present[hand]
+            features = PAIR_FEATURES if hand == BOTH else FEATURES
+            x[i] = features[feature](gestures[hand]) if valid[i] else np.nan
+        return x, valid & np.isfinite(x)
+
+    def evaluate(self, x: np.ndarray) -> np.ndarray:
+        """Map one input value per mapping through its table"""
+        position = np.clip((x - self.in_low) * self.in_scale, 0, self.lut_size - 1)
+        index = np.minimum(position.astype(np.intp), self.lut_size - 2)
+        frac = position - index
+        return (self.tables[self.rows, index] * (1.0 - frac)
+                + self.tables[self.rows, index + 1] * frac)
+
+    def update(self, gestures: list[GestureData], present: list[bool], timestamp):
+        """
+        Apply every mapping and rule for one frame, a parameter whose hand
+        is missing keeps its last value
+
+        Parameters:
+        - gestures: GestureData per hand slot, left then right
+        - present: Whether each hand was tracked this frame
+        """
+        # the "both" slot sees the pair, and only when both hands are there
+        gestures = [gestures[0], gestures[1], (gestures[0], gestures[1])]
+        present = [present[0], present[1], present[0] and present[1]]
+        if self.mappings:
+            x, valid = self._gather(self.sources, gestures, present)
+            values = self.evaluate(np.where(valid, x, self.in_low))
+            for i in np.flatnonzero(valid):
+                setter, param = self.setters[i]
+                setter(param, float(values[i]))
+                self.values[i] = values[i]
+
+        if self.rules:
+            x, valid = self._gather(self.rule_sources, gestures, present)
+            active = valid & ((x > self.rule_above) | (x < self.rule_below))
+            ready = timestamp - self.rule_last >= self.rule_cooldown
+            for i in np.flatnonzero(active & ready):
+                self.rule_last[i] = timestamp
+                self.actions[i]()
+
+
+def mapping_from_dict(config: dict, lut_size=LUT_SIZE) -> MappingEngine:
+    mappings = [
+        Mapping(
+            source=entry["source"],
+            target=entry["target"],
+            input_range=tuple(entry["in"]),
+            output_range=tuple(entry["out"]),
+            curve=entry.get("curve", "linear"),
+            dead_zone=entry.get("dead_zone", 0.0),
+            clamp=tuple(entry["clamp"]) if "clamp" in entry else None)
+        for entry in config.get("mappings", [])]
+    rules = [Rule(**entry) for entry in config.get("rules", [])]
+    return MappingEngine(mappings, rules, lut_size)
+
+
+def load_mapping(path=DEFAULT_MAPPING) -> MappingEngine:
+    """Load a .json or .yaml/.yml mapping config"""
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            try:
+                import yaml
+            except ImportError:
+                raise ImportError("YAML mapping configs need PyYAML, pip install pyyaml or use JSON")
+            config = yaml.safe_load(f)
+        else:
+            config = json.load(f)
+    return mapping_from_dict(config)
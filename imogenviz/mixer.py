@@ -0,0 +1,160 @@
+# Mixer: channel strips, shared effect sends and a limited master bus.
+#
+#   instrument -> strip (gain) -+----------------------------> master
+#                               +- reverb send -> reverb ----> master
+#                               +- delay send  -> delay  ----> master
+#   master -> gain -> limiter -> out
+#
+# Mixer.recorded is the master without the strips made with recorded=False,
+# the bus the looper records, so its own loops are not recorded again.
+#
+# One reverb and one delay are shared by every instrument, fed by the sum
+# of the strips' sends, so adding an instrument adds a few multiplies
+# instead of another reverb. The effects return fully wet, the dry signal
+# only comes from the strips.
+#
+# The "send" parameter scales every send at once, the default mapping
+# drives it with the distance between the two hands: hands apart, more room.
+# All levels are streams of one ParamBank, so gestures can move them
+# without zipper noise.
+#
+# The limiter's lookahead delays everything that comes out, drum hits and
+# the monitored voice included, so it is kept as short as the vocal chain's
+# stages (1 ms). Mixer.latency reports it for the latency floor.
+
+from dataclasses import dataclass
+
+from pyo import Clip, Compress, Delay, Freeverb, Mix, Pan
+
+from params import Param, ParamBank
+from pyo_server import shared_server
+
+
+@dataclass
+class Channel:
+    """
+    Parameters:
+    - name: Strip name, its parameters are "<name>_gain" and so on
+    - source: pyo object, mono or stereo, it is taken off the output and
+      only heard through the mixer
+    - gain: Strip level
+    - reverb, delay: Send levels into the shared effects
+    - recorded: False leaves the strip out of Mixer.recorded, for the
+      looper's own output. Its sends still reach the effects, which are
+      recorded, so such a strip usually has none
+    """
+    name: str
+    source: object
+    gain: float = 0.8
+    reverb: float = 0.3
+    delay: float = 0.0
+    recorded: bool = True
+
+
+class ChannelStrip:
+    """One instrument's level and sends, see Mixer"""
+
+    def __init__(self, channel: Channel, params: ParamBank, send):
+        self.name = channel.name
+        self.source = channel.source
+        # keep computing it, but no longer straight to the speakers
+        self.source.play()
+        stereo = Pan(self.source, outs=2, pan=0.5) if len(self.source) == 1 else self.source
+        self.output = Mix(stereo, voices=2, mul=params[f"{self.name}_gain"])
+        self.reverb_send = self.output * (params[f"{self.name}_reverb"] * send)
+        self.delay_send = self.output * (params[f"{self.name}_delay"] * send)
+
+
+class Mixer:
+    """
+    Parameters:
+    - server: Running pyo server, the shared audio session by default
+    - channels: List of Channel, one strip each
+    - delay_time: Seconds of the shared delay, e.g. a dotted eighth
+    - lookahead: Milliseconds the limiter looks ahead, the whole output is
+      delayed by this much
+    """
+
+    def __init__(self, server=None, channels=(), delay_time=0.375, lookahead=1.0):
+        self.server = shared_server(server)
+        self.lookahead = lookahead
+        params = {
+            "send": Param(0.5, low=0.0, high=1.0, time=0.1, min_delta=0.005),
+            "reverb_size": Param(0.85, low=0.0, high=1.0, time=0.2, min_delta=0.005),
+            "reverb_damp": Param(0.5, low=0.0, high=1.0, time=0.2, min_delta=0.005),
+            "delay_time": Param(delay_time, low=0.01, high=2.0, time=0.2, min_delta=0.001),
+            "delay_feedback": Param(0.35, low=0.0, high=0.95, time=0.1, min_delta=0.005),
+            "master_gain": Param(0.9, low=0.0, high=1.0, min_delta=0.005),
+            # dBFS the limiter holds the master below
+            "limit": Param(-1.0, low=-24.0, high=0.0, min_delta=0.1),
+        }
+        for channel in channels:
+            params[f"{channel.name}_gain"] = Param(channel.gain, low=0.0, high=1.0, min_delta=0.005)
+            params[f"{channel.name}_reverb"] = Param(channel.reverb, low=0.0, high=1.0, min_delta=0.005)
+            params[f"{channel.name}_delay"] = Param(channel.delay, low=0.0, high=1.0, min_delta=0.005)
+        self.params = ParamBank(params)
+
+        self.strips = {}
+        for channel in channels:
+            self.strips[channel.name] = ChannelStrip(channel, self.params, self.params["send"])
+        unrecorded = [channel.name for channel in channels if not channel.recorded]
+
+        # the shared effects, created after every strip so sends reach them in the same block
+        strips = list(self.strips.values())
+        self.reverb = Freeverb(
+                Mix([strip.reverb_send for strip in strips], voices=2),
+                size=self.params["reverb_size"], damp=self.params["reverb_damp"], bal=1.0)
+        self.delay = Delay(
+                Mix([strip.delay_send for strip in strips], voices=2),
+                delay=self.params["delay_time"], feedback=self.params["delay_feedback"], maxdelay=2.0)
+
+        # everything but the limiter
+        self.master = Mix([strip.output for strip in strips] + [self.reverb, self.delay],
+                          voices=2, mul=self.params["master_gain"])
+        self.recorded = self.master
+        if unrecorded:
+            self.recorded = Mix(
+                    [strip.output for strip in strips if strip.name not in unrecorded]
+                    + [self.reverb, self.delay], voices=2, mul=self.params["master_gain"])
+        self.limiter = Compress(self.master, thresh=self.params["limit"], ratio=20,
+                                risetime=0.001, falltime=0.1, lookahead=lookahead, knee=0.2)
+        # the limiter's lookahead catches almost every peak, the clip the rest
+        self.output = Clip(self.limiter, min=-1.0, max=1.0).out()
+
+    @property
+    def latency(self) -> float:
+        """Seconds the mixer delays its output by, the limiter's lookahead"""
+        return self.lookahead / 1000.0
+
+    def set_param(self, name, value):
+        """
+        Set any smoothed parameter by name, used by the mapping engine
+
+        Parameters:
+        - name: One of self.params.names, e.g. "send" or "pad_reverb"
+        - value: New target, clamped to the parameter range
+        """
+        return self.params.set(name, value)
+
+
+def instrument_mixer(server, pad, drums, vocals=None, vocal_reverb=0.3, delay_time=0.375,
+                     looper=None) -> Mixer:
+    """
+    The strips of the live setup: pad, drums and the vocals and looper if
+    there are any
+
+    Parameters:
+    - pad: PAD made with reverb=False, the mixer's reverb replaces its own
+    - vocal_reverb: Reverb send of the vocals, their chain has no reverb
+    - looper: Looper created before the mixer, record Mixer.recorded with it
+    """
+    channels = [
+        Channel("pad", pad.output, gain=0.8, reverb=0.4),
+        Channel("drums", drums.output, gain=0.9, reverb=0.1),
+    ]
+    if vocals is not None:
+        channels.append(Channel("vocals", vocals.output, gain=0.8, reverb=vocal_reverb, delay=0.2))
+    if looper is not None:
+        # the takes already have the effects they were recorded with
+        channels.append(Channel("loops", looper.output, gain=0.8, reverb=0.0, recorded=False))
+    return Mixer(server, channels, delay_time=delay_time)
@@ -1,157 +1,236 @@
 import numpy as np
+import math
 import os
 from pyo import *
 import time
 
+from params import Param, ParamBank
+from theory import CHORD_QUALITIES, MIDI_FREQUENCIES, chord_voicings, lead_voicing
+from pyo_server import shared_server, close_server
+
 class PAD:
-    def __init__(self, server=None):
-        # Use existing server or create a new one
-        self.server = server
-        self.owns_server = False
-        
-        # Define note frequency ratios for standard tuning
-        self.note_ratios = {
-            "C": 1.0,
-            "C#": 1.059463,
-            "D": 1.122462,
-            "D#": 1.189207,
-            "E": 1.259921,
-            "F": 1.334840,
-            "F#": 1.414214,
-            "G": 1.498307,
-            "G#": 1.587401,
-            "A": 1.681793,
-            "A#": 1.781797,
-            "B": 1.887749
-        }
-        
-        # Define chord structures (semitone intervals from root)
-        self.chord_types = {
-            "major": [0, 4, 7],  # Root, major third, perfect fifth
-            "minor": [0, 3, 7],  # Root, minor third, perfect fifth
-            "dim": [0, 3, 6],    # Root, minor third, diminished fifth
-            "aug": [0, 4, 8],    # Root, major third, augmented fifth
-            "sus4": [0, 5, 7],   # Root, perfect fourth, perfect fifth
-            "maj7": [0, 4, 7, 11],  # Major with major seventh
-            "min7": [0, 3, 7, 10],  # Minor with minor seventh
-            "dom7": [0, 4, 7, 10]   # Major with minor seventh (dominant)
-        }
+    """
+    Parameters:
+    - server: Running pyo server, the shared audio session by default
+    - n_voices: Polyphony, a seventh chord with octaves uses 8
+    - glide: Seconds a voice takes to slide to its note in the next chord
+    - attack, decay, sustain, release: Per voice ADSR envelope
+    - reverb: Own reverb on the output, False when the pad plays through a
+      Mixer, whose shared reverb replaces it
+    """
+    def __init__(self, server=None, n_voices=8, glide=0.15,
+                 attack=0.3, decay=0.2, sustain=0.8, release=1.0, reverb=True):
+        # Use the given server or the shared audio session
+        self.server = shared_server(server)
         
-        # Create oscillator banks for pad sounds (3 oscillators per voice x 4 voices)
-        self.oscillators = []
+        # Voice bank: every voice is a sine, a triangle and a soft saw on the
+        # same frequency with its own ADSR. The three oscillator banks are
+        # multichannel (one stream per voice), so a chord change updates
+        # every voice with one list assignment on self.freqs.
+        self.n_voices = n_voices
+        self.glide = glide
+        self.release = release
         self.current_chord = None
-        
-        # Store the base oscillators that we'll use for each voice
-        for i in range(12):  # Support for up to 12 notes (4 voices with 3 oscillators each)
-            # Create slightly detuned oscillators for rich sound
-            detune = random.uniform(-0.1, 0.1)  # Slight random detune for richness
-            
-            # Use different waveforms for each oscillator to create a rich pad sound
-            if i % 3 == 0:
-                # Sine wave for fundamental
-                osc = Sine(freq=440 + detune, mul=0.0)
-            elif i % 3 == 1:
-                # Triangle for some harmonics
-                osc = LFO(freq=440 + detune, type=2, mul=0.0)
-            else:
-                # Soft saw for more harmonics
-                osc = Phasor(freq=440 + detune, mul=0.0)
-            
-            self.oscillators.append(osc)
+        # MIDI notes of the current chord, the start of the next voice leading
+        self.voicing = None
+
+        # Slight random detune for richness, fixed per voice
+        self.detune = [random.uniform(-0.1, 0.1) for _ in range(n_voices)]
+        self.freqs = SigTo([440.0] * n_voices, time=glide, init=[440.0] * n_voices)
+        self.envelopes = [
+            Adsr(attack=attack, decay=decay, sustain=sustain, release=release, dur=0, mul=0.0)
+            for _ in range(n_voices)
+        ]
+
+        # Sine for fundamental, triangle for some harmonics, soft saw for more
+        self.oscillators = [
+            Sine(freq=self.freqs + self.detune, mul=self.envelopes),
+            LFO(freq=self.freqs + self.detune, type=2, mul=[env * 0.7 for env in self.envelopes]),
+            Phasor(freq=self.freqs + self.detune, mul=[env * 0.5 for env in self.envelopes]),
+        ]
+
+        # Voice allocation state, None = idle (or releasing)
+        self.voice_freq = [None] * n_voices
+        self.voice_pitch = [440.0] * n_voices
+        self.voice_started = [0] * n_voices
+        # server time each voice was released, it is silent release seconds later
+        self.voice_released = [-math.inf] * n_voices
+        self.note_counter = 0
         
         # Create mixer for all oscillators
         self.mixer = Mix(self.oscillators, voices=2)
         
+        # Smoothed control parameters, set_filter/set_reverb only move targets
+        self.params = ParamBank({
+            "cutoff": Param(1000, low=20, high=20000, min_delta=0.01, relative=True),
+            "resonance": Param(0.5, low=0.0, high=1.0, min_delta=0.005),
+            "reverb_size": Param(0.85, low=0.0, high=1.0, time=0.2, min_delta=0.005),
+            "reverb_damp": Param(0.5, low=0.0, high=1.0, time=0.2, min_delta=0.005),
+            "reverb_balance": Param(0.3, low=0.0, high=1.0, time=0.2, min_delta=0.005),
+        })
+
         # Create filters with initial settings
-        self.filter = MoogLP(self.mixer, freq=1000, res=0.5)
+        self.filter = MoogLP(self.mixer, freq=self.params["cutoff"], res=self.params["resonance"])
         
-        # Add reverb for spaciousness
-        self.reverb = Freeverb(self.filter, size=0.85, damp=0.5, bal=0.3)
+        # Add reverb for spaciousness, unless a mixer adds the shared one
+        self.reverb = None
+        if reverb:
+            self.reverb = Freeverb(
+                self.filter, size=self.params["reverb_size"], damp=self.params["reverb_damp"],
+                bal=self.params["reverb_balance"])
         
         # Final output
-        self.output = self.reverb.out()
-        
-        # Stop all oscillators initially
-        for osc in self.oscillators:
-            osc.stop()
+        self.output = (self.filter if self.reverb is None else self.reverb).out()
     
-    def play_chord(self, root_note, chord_type="major", base_octave=4):
+    def play_chord(self, root_note, chord_type="major", base_octave=4, inversion=None):
         """
         Play a chord with the specified root note and type
+
+        The voicing comes from the precomputed tables in theory.py. Unless an
+        inversion is given, the one closest to the chord playing now is
+        picked, so as few voices as possible move, by the smallest steps.
+        Voices already on a note of the new chord keep sounding, the others
+        glide to the nearest new note, and only notes left over start new
+        voices. Voices not needed any more are released.
         
         Parameters:
-        - root_note: The root note of the chord (e.g., "C", "F#")
-        - chord_type: The type of chord ("major", "minor", etc.)
+        - root_note: The root note of the chord (e.g., "C", "F#", "Bb")
+        - chord_type: The type of chord, a name in theory.CHORD_QUALITIES
         - base_octave: The octave of the root note (4 = middle C)
+        - inversion: 0 for root position, None to pick it by voice leading
         """
-        # Stop any currently playing chord
-        self.stop_chord()
-        
-        # Save current chord info
-        self.current_chord = {
+        return self.play_voiced(
+                self.voice_chord(root_note, chord_type, base_octave, inversion, self.voicing))
+
+    def voice_chord(self, root_note, chord_type="major", base_octave=4, inversion=None,
+                    previous=None) -> tuple:
+        """
+        What play_chord plays, without playing it: (chord info, MIDI notes,
+        (frequency, amplitude) notes) for play_voiced
+
+        Parameters:
+        - previous: MIDI notes the voice leading starts from, None for root
+          position
+        """
+        if chord_type not in CHORD_QUALITIES:
+            print(f"Unknown chord type: {chord_type}, using major")
+            chord_type = "major"
+
+        if inversion is None:
+            inversion, voicing = lead_voicing(previous, root_note, chord_type, base_octave)
+        else:
+            voicing = chord_voicings(root_note, chord_type, base_octave)[inversion]
+
+        chord = {
             "root": root_note,
             "type": chord_type,
-            "octave": base_octave
+            "octave": base_octave,
+            "inversion": inversion,
         }
-        
-        # Calculate base frequency for the root note
-        base_freq = 261.63 * (2 ** (base_octave - 4))  # C4 = 261.63 Hz
-        root_freq = base_freq * self.note_ratios[root_note]
-        
-        # Get the intervals for this chord type
-        if chord_type in self.chord_types:
-            intervals = self.chord_types[chord_type]
-        else:
-            print(f"Unknown chord type: {chord_type}, using major")
-            intervals = self.chord_types["major"]
-        
-        # Calculate frequencies for each note in the chord
-        note_freqs = []
-        for interval in intervals:
-            # Convert semitones to frequency ratio
-            ratio = 2 ** (interval / 12)
-            note_freqs.append(root_freq * ratio)
-        
-        # Add octaves for richness (standard technique for pads)
-        extended_freqs = note_freqs.copy()
-        for freq in note_freqs:
-            # Add an octave up
-            extended_freqs.append(freq * 2)
-        
-        # Assign frequencies to oscillators
-        for i, osc in enumerate(self.oscillators):
-            if i < len(extended_freqs):
-                # Set frequency
-                osc.freq = extended_freqs[i]
-                
-                # Set amplitude based on voice position (lower = louder)
-                if i < len(note_freqs):
-                    # Base notes are louder
-                    amplitude = 0.2
-                else:
-                    # Higher octaves are quieter
-                    amplitude = 0.1
-                
-                # Apply slight variation for each oscillator type
-                if i % 3 == 0:
-                    osc.mul = amplitude
-                elif i % 3 == 1:
-                    osc.mul = amplitude * 0.7
-                else:
-                    osc.mul = amplitude * 0.5
-                
-                # Start the oscillator
-                osc.play()
-        
-        # Return the chord info
-        return self.current_chord
+
+        # Base notes are louder, an octave up on top is quieter (standard pad technique)
+        freqs = MIDI_FREQUENCIES[voicing].tolist()
+        half = len(freqs) // 2
+        notes = [(freq, 0.2) for freq in freqs[:half]] + [(freq, 0.1) for freq in freqs[half:]]
+        return chord, voicing, notes
+
+    def play_voiced(self, voiced):
+        """Play a chord from voice_chord, no table lookup or voice leading left to do"""
+        chord, voicing, notes = voiced
+        # Save current chord info
+        self.current_chord = chord
+        self.voicing = voicing
+        self.play_notes(notes)
+        return chord
+
+    def play_notes(self, notes):
+        """
+        Allocate voices to a list of (frequency, amplitude) notes
+
+        Parameters:
+        - notes: At most n_voices notes, extra ones steal the oldest voice
+        """
+        notes = notes[:self.n_voices]
+        new_freq = list(self.voice_freq)
+        glide_time = [self.glide] * self.n_voices
+        note_on = []
+        remaining = []
+
+        # Keep voices that already play a note of the new chord
+        free = set(i for i, freq in enumerate(self.voice_freq) if freq is not None)
+        for freq, amp in notes:
+            match = next((i for i in free if abs(self.voice_freq[i] - freq) < 0.01), None)
+            if match is None:
+                remaining.append((freq, amp))
+            else:
+                free.discard(match)
+
+        # Glide the closest sounding voice to each remaining note
+        unplaced = []
+        for freq, amp in remaining:
+            if not free:
+                unplaced.append((freq, amp))
+                continue
+            voice = min(free, key=lambda i: abs(math.log2(self.voice_freq[i] / freq)))
+            free.discard(voice)
+            new_freq[voice] = freq
+            self.envelopes[voice].mul = amp
+
+        # Leftover sounding voices are released
+        for voice in free:
+            new_freq[voice] = None
+
+        # Start idle voices for what is left, stealing the oldest if needed.
+        # A voice whose release has finished jumps to its note, one still in
+        # its release tail is audible and glides like a sounding voice
+        now = self._now()
+        for freq, amp in unplaced:
+            idle = [i for i in range(self.n_voices) if new_freq[i] is None]
+            silent = [i for i in idle if now - self.voice_released[i] >= self.release]
+            if silent:
+                voice = min(silent, key=lambda i: self.voice_started[i])
+                glide_time[voice] = 0.0
+            elif idle:
+                # the one released longest ago is the quietest
+                voice = min(idle, key=lambda i: self.voice_released[i])
+            else:
+                voice = min(range(self.n_voices), key=lambda i: self.voice_started[i])
+            new_freq[voice] = freq
+            self.envelopes[voice].mul = amp
+            self.note_counter += 1
+            self.voice_started[voice] = self.note_counter
+            note_on.append(voice)
+
+        # One vectorized update for all voices, idle voices keep their pitch
+        self.freqs.time = glide_time
+        for voice, freq in enumerate(new_freq):
+            if freq is not None:
+                self.voice_pitch[voice] = freq
+        self.freqs.value = list(self.voice_pitch)
+
+        for voice in range(self.n_voices):
+            if self.voice_freq[voice] is not None and new_freq[voice] is None:
+                self.envelopes[voice].stop()
+                self.voice_released[voice] = now
+        for voice in note_on:
+            self.envelopes[voice].play()
+        self.voice_freq = new_freq
     
     def stop_chord(self):
-        """Stop all currently playing oscillators"""
-        for osc in self.oscillators:
-            osc.stop()
+        """Release all currently playing voices"""
+        now = self._now()
+        for voice, freq in enumerate(self.voice_freq):
+            if freq is not None:
+                self.envelopes[voice].stop()
+                self.voice_released[voice] = now
+        self.voice_freq = [None] * self.n_voices
         self.current_chord = None
+        self.voicing = None
     
+    def _now(self) -> float:
+        # server clock, it also runs for offline renders
+        return self.server.getCurrentTimeInSamples() / self.server.getSamplingRate()
+
     def set_filter(self, cutoff_freq, resonance=0.5):
         """
         Set the filter cutoff frequency and resonance
@@ -160,28 +239,37 @@ class PAD:
         - cutoff_freq: Cutoff frequency in Hz (20-20000)
         - resonance: Resonance amount (0.0-1.0)
         """
-        # Ensure cutoff is in valid range
-        cutoff_freq = max(20, min(20000, cutoff_freq))
-        resonance = max(0.0, min(1.0, resonance))
-        
-        # Apply to filter
-        self.filter.freq = cutoff_freq
-        self.filter.res = resonance
+        # Clamped to the valid range, changes below the threshold are dropped
+        with self.params.batch():
+            cutoff_freq = self.params.set("cutoff", cutoff_freq)
+            resonance = self.params.set("resonance", resonance)
         
         return {"cutoff": cutoff_freq, "resonance": resonance}
     
+    def set_param(self, name, value):
+        """
+        Set any smoothed parameter by name, used by the mapping engine
+
+        Parameters:
+        - name: One of self.params.names, e.g. "cutoff" or "reverb_size"
+        - value: New target, clamped to the parameter range
+        """
+        return self.params.set(name, value)
+
     def set_reverb(self, size=0.85, damp=0.5, balance=0.3):
         """
-        Adjust reverb parameters for the pad sound
+        Adjust reverb parameters for the pad sound, only heard with the
+        pad's own reverb (reverb=True)
         
         Parameters:
         - size: Room size (0.0-1.0)
         - damp: Damping factor (0.0-1.0)
         - balance: Dry/wet balance (0.0-1.0)
         """
-        self.reverb.size = size
-        self.reverb.damp = damp
-        self.reverb.bal = balance
+        with self.params.batch():
+            self.params.set("reverb_size", size)
+            self.params.set("reverb_damp", damp)
+            self.params.set("reverb_balance", balance)
     
     def close(self):
         """Clean up resources"""
@@ -190,9 +278,6 @@ class PAD:
 
 # Example usage:
 if __name__ == "__main__":
-    # List available devices
-    pa_list_devices()
-    
     # Create a pad synth
     pad = PAD()
     
@@ -233,4 +318,5 @@ if __name__ == "__main__":
     
     # Clean up
     pad.close()
+    close_server()
     print("Done.")
@@ -0,0 +1,119 @@
+# Smoothed, throttled control parameters for the instruments.
+#
+# Gesture features change every camera frame, but writing a float straight
+# into a DSP attribute steps the value once per write, which is audible as
+# zipper noise, and every write is a call into the audio server. Here all
+# parameters of an instrument are the streams of one multichannel SigTo:
+#   - the audio thread ramps each stream to its target, no steps
+#   - a new target is only kept when it moved more than min_delta
+#   - all targets changed during a frame go to the server in one assignment
+#
+# DSP objects take ParamBank streams as their inputs, e.g.
+#   MoogLP(source, freq=params["cutoff"], res=params["resonance"])
+
+import contextlib
+import math
+from dataclasses import dataclass
+
+from pyo import SigTo
+
+
+@dataclass
+class Param:
+    """
+    Parameters:
+    - init: Starting value
+    - low, high: Range targets are clamped to
+    - time: Seconds the smoother takes to reach a new target
+    - min_delta: Smallest change that is sent, smaller moves are dropped
+    - relative: min_delta is a fraction of the current value instead of
+      an absolute amount, for frequencies and other log scaled values
+    """
+    init: float
+    low: float = float("-inf")
+    high: float = float("inf")
+    time: float = 0.05
+    min_delta: float = 0.0
+    relative: bool = False
+
+    def clamp(self, value) -> float:
+        return float(max(self.low, min(self.high, float(value))))
+
+    def changed(self, old, new) -> bool:
+        delta = abs(new - old)
+        if self.relative:
+            delta /= max(abs(old), 1e-9)
+        return delta > self.min_delta
+
+
+class ParamBank:
+    """
+    Named parameters sharing one SigTo, one stream per parameter
+
+    Parameters:
+    - params: Dict of name -> Param, the order sets the stream order
+    """
+
+    def __init__(self, params: dict):
+        self.names = list(params)
+        self.specs = [params[name] for name in self.names]
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.targets = [spec.init for spec in self.specs]
+        self.signal = SigTo(
+                list(self.targets),
+                time=[spec.time for spec in self.specs],
+                init=list(self.targets))
+        self.dirty = False
+        self.deferred = 0
+        # server writes actually done and updates dropped as too small
+        self.writes = 0
+        self.skipped = 0
+
+    def __getitem__(self, name):
+        """Audio rate stream of a parameter, to use as a DSP object input"""
+        return self.signal[self.index[name]]
+
+    def get(self, name) -> float:
+        """Current target of a parameter"""
+        return self.targets[self.index[name]]
+
+    def set(self, name, value) -> float:
+        """Stage a new target, sent now or at the end of the open batch"""
+        i = self.index[name]
+        spec = self.specs[i]
+        value = spec.clamp(value)
+        if not math.isnan(value) and spec.changed(self.targets[i], value):
+            self.targets[i] = value
+            self.dirty = True
+        else:
+            self.skipped += 1
+        if not self.deferred:
+            self.flush()
+        return self.targets[i]
+
+    def set_index(self, i, value):
+        """
+        Write one stream's target straight to the server, for the audio
+        thread: value must already be clamped (a value set() returned), no
+        min_delta check, no batching and nothing allocated
+        """
+        self.targets[i] = value
+        self.signal[i].setValue(value)
+
+    def flush(self):
+        """Send all staged targets to the server in one assignment"""
+        if self.dirty:
+            self.signal.value = list(self.targets)
+            self.dirty = False
+            self.writes += 1
+
+    @contextlib.contextmanager
+    def batch(self):
+        """Collect every set() in the block into a single flush"""
+        self.deferred += 1
+        try:
+            yield self
+        finally:
+            self.deferred -= 1
+            if not self.deferred:
+                self.flush()
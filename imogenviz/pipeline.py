@@ -0,0 +1,172 @@
+# Threaded stages connecting capture -> inference -> trigger -> render.
+#
+# Every stage runs in its own thread and talks to the next one through a
+# LatestQueue, which only ever holds the newest item. A slow stage therefore
+# never builds up a backlog, it just skips stale frames.
+
+import threading
+import time
+from dataclasses import dataclass
+
+
+class LatestQueue:
+    """Bounded single slot queue where a new item replaces an unread one"""
+
+    def __init__(self):
+        self._item = None
+        self._has_item = False
+        self._cond = threading.Condition()
+        self.dropped = 0
+
+    def put(self, item):
+        with self._cond:
+            if self._has_item:
+                self.dropped += 1
+            self._item = item
+            self._has_item = True
+            self._cond.notify()
+
+    def get(self, timeout=None):
+        """Return the newest item, or None if nothing arrived within timeout"""
+        with self._cond:
+            if not self._has_item:
+                self._cond.wait(timeout)
+            if not self._has_item:
+                return None
+            item = self._item
+            self._item = None
+            self._has_item = False
+            return item
+
+
+@dataclass
+class StageStats:
+    count: int = 0
+    total_time: float = 0.0
+    max_time: float = 0.0
+    last_time: float = 0.0
+
+    def record(self, duration: float):
+        self.count += 1
+        self.total_time += duration
+        self.last_time = duration
+        if duration > self.max_time:
+            self.max_time = duration
+
+    @property
+    def mean_time(self) -> float:
+        if self.count == 0:
+            return 0.0
+        return self.total_time / self.count
+
+
+class Stage(threading.Thread):
+    """
+    Worker thread running func on every item taken from inbox
+
+    Parameters:
+    - name: Name used in the timing report
+    - func: Callable taking one item, returning the item for the next stage
+      or None to pass nothing on
+    - inbox: LatestQueue to read from, None for source stages (e.g. capture)
+      which are called in a loop with None
+    - outboxes: LatestQueues receiving every non-None result
+    """
+
+    def __init__(self, name, func, inbox=None, outboxes=None):
+        super().__init__(name=name, daemon=True)
+        self.func = func
+        self.inbox = inbox
+        self.outboxes = outboxes or []
+        self.stats = StageStats()
+        self.error = None
+        self._stop_event = threading.Event()
+
+    def stop(self):
+        self._stop_event.set()
+
+    def run(self):
+        while not self._stop_event.is_set():
+            if self.inbox is None:
+                item = None
+            else:
+                item = self.inbox.get(timeout=0.1)
+                if item is None:
+                    continue
+
+            start = time.perf_counter()
+            try:
+                result = self.func(item)
+            except Exception as e:
+                print(f"ERROR in stage {self.name}: ", e)
+                self.error = e
+                break
+            self.stats.record(time.perf_counter() - start)
+
+            if result is not None:
+                for outbox in self.outboxes:
+                    outbox.put(result)
+
+
+class Pipeline:
+    """Owns a set of stages, starts/stops them and reports their timings"""
+
+    def __init__(self):
+        self.stages = []
+        self.queues = {}
+        # stages running outside of a Stage thread (e.g. render on main thread)
+        self.external_stats = {}
+
+    def add_stage(self, name, func, inbox=None, outboxes=None) -> Stage:
+        stage = Stage(name, func, inbox=inbox, outboxes=outboxes)
+        self.stages.append(stage)
+        return stage
+
+    def queue(self, name) -> LatestQueue:
+        """Create (or fetch) a named queue so its drop count shows up in the report"""
+        if name not in self.queues:
+            self.queues[name] = LatestQueue()
+        return self.queues[name]
+
+    def stats(self, name) -> StageStats:
+        """Timing counters for a stage driven by the caller"""
+        if name not in self.external_stats:
+            self.external_stats[name] = StageStats()
+        return self.external_stats[name]
+
+    def start(self):
+        for stage in self.stages:
+            stage.start()
+
+    def stop(self):
+        for stage in self.stages:
+            stage.stop()
+        for stage in self.stages:
+            stage.join(timeout=1.0)
+
+    @property
+    def running(self) -> bool:
+        return all(stage.is_alive() for stage in self.stages)
+
+    def all_stats(self) -> dict:
+        stats = {stage.name: stage.stats for stage in self.stages}
+        stats.update(self.external_stats)
+        return stats
+
+    def bottleneck(self) -> str:
+        """Name of the stage with the highest mean time per item"""
+        stats = self.all_stats()
+        if not stats:
+            return ""
+        return max(stats, key=lambda name: stats[name].mean_time)
+
+    def report(self) -> str:
+        lines = [f"{'stage':<12}{'count':>8}{'mean ms':>10}{'max ms':>10}"]
+        for name, stats in self.all_stats().items():
+            lines.append(
+                f"{name:<12}{stats.count:>8}"
+                f"{stats.mean_time * 1000:>10.2f}{stats.max_time * 1000:>10.2f}")
+        for name, queue in self.queues.items():
+            lines.append(f"queue {name}: {queue.dropped} dropped")
+        lines.append(f"bottleneck: {self.bottleneck()}")
+        return "\n".join(lines)
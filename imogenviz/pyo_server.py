@@ -1,36 +1,247 @@
+# One audio session shared by every instrument.
+#
+# There is only ever one pyo Server per process, so instead of every module
+# booting its own with its own idea of device, rate and buffer size, they
+# all ask this module for the shared one (shared_server()). pyo is imported
+# on first use, so importing this module costs nothing, and the device list
+# is only touched when a live server is actually started.
+#
+# The backend is detected: JACK if a JACK server is running, otherwise
+# PortAudio (which talks to ALSA / PulseAudio on Linux), and the manual
+# offline backend when the machine has no sound card at all. The buffer
+# size sets the output latency floor, probe_buffer_size() finds the
+# smallest one that runs without dropouts on this machine.
 
-from pyo import *
+import os
+import shutil
+import subprocess
+import sys
 import time
 
 # Suppress ALSA error messages
 os.environ['ALSA_OUTPUT_STDERR'] = '0'
 
-# Global audio configuration (same as before)
+# Global audio configuration
 SAMPLING_RATE = 48000
-OUTPUT_DEVICE = 10
 N_CHANNELS = 2
 BUFFERSIZE = 512
 DUPLEX = 0
-AUDIO="alsa"
-pa_list_devices()
+# None uses the backend's default output. This used to be hardcoded to
+# device 10, setups that relied on that set IMOGENVIZ_AUDIO_DEVICE=10
+OUTPUT_DEVICE = int(os.environ["IMOGENVIZ_AUDIO_DEVICE"]) if os.environ.get("IMOGENVIZ_AUDIO_DEVICE") else None
 
+BACKENDS = ("jack", "portaudio", "coreaudio", "manual")
+# candidates for probe_buffer_size, smallest first
+BUFFER_SIZES = (64, 128, 256, 512, 1024)
 
 
-def setup_server():
-    server = Server(
-        sr=SAMPLING_RATE,
-        duplex=DUPLEX,
-        buffersize=BUFFERSIZE,
-        nchnls=N_CHANNELS,
-        audio=AUDIO
-    )
-    server.setOutputDevice(OUTPUT_DEVICE)
+def jack_running() -> bool:
+    # jack_lsp only succeeds when it can connect to a running JACK server
+    tool = shutil.which("jack_lsp")
+    if tool is None:
+        return False
+    try:
+        return subprocess.run([tool], capture_output=True, timeout=2).returncode == 0
+    except (OSError, subprocess.TimeoutExpired):
+        return False
+
+
+def has_sound_device() -> bool:
+    """Cheap check before PortAudio is touched, it aborts on some machines without one"""
+    if not sys.platform.startswith("linux"):
+        return True
+    runtime = os.environ.get("XDG_RUNTIME_DIR", "")
+    if runtime and any(os.path.exists(os.path.join(runtime, name))
+                       for name in ("pulse/native", "pipewire-0")):
+        return True
+    try:
+        with open("/proc/asound/cards") as f:
+            return "no soundcards" not in f.read()
+    except OSError:
+        return False
+
+
+def detect_backend() -> str:
+    """jack, portaudio or manual (no sound card, audio only by server.process())"""
+    backend = os.environ.get("IMOGENVIZ_AUDIO_BACKEND")
+    if backend:
+        if backend not in BACKENDS:
+            raise ValueError(f"IMOGENVIZ_AUDIO_BACKEND={backend}, expected one of {BACKENDS}")
+        return backend
+    if jack_running():
+        return "jack"
+    if has_sound_device():
+        return "portaudio"
+    return "manual"
+
+
+def _new_server(backend, sr, buffersize, nchnls, duplex, output_device, input_device):
+    from pyo import Server
+
+    server = Server(sr=sr, nchnls=nchnls, buffersize=buffersize, duplex=duplex,
+                    audio=backend, jackname="imogenviz")
+    if backend == "portaudio":
+        # the probe and the session fall back to the same device
+        if output_device is None:
+            output_device = OUTPUT_DEVICE
+        if output_device is not None:
+            server.setOutputDevice(output_device)
+        if input_device is not None:
+            server.setInputDevice(input_device)
     server.boot()
-    server.start()
     return server
 
 
-def close_server(server):
-    server.stop()
-    server.shutdown()
+def probe_buffer_size(backend=None, sr=SAMPLING_RATE, sizes=BUFFER_SIZES, probe_time=0.5,
+                      tolerance=2.5, output_device=OUTPUT_DEVICE, duplex=DUPLEX, input_device=None) -> int:
+    """
+    Smallest buffer size that runs probe_time seconds without a dropout
+
+    A callback running once per block in the audio thread stamps the wall
+    clock, a gap longer than tolerance blocks means the audio callback was
+    late, which is what an xrun sounds like. Every candidate boots its own
+    short lived server, so call this before the session starts. With
+    duplex=1 the input is open while probing, a duplex stream often needs a
+    larger buffer than output alone.
+    """
+    from pyo import Pattern
+
+    backend = backend or detect_backend()
+    if backend == "manual":
+        return BUFFERSIZE
+
+    for size in sizes:
+        server = _new_server(backend, sr, size, N_CHANNELS, duplex, output_device, input_device)
+        block = size / sr
+        stamps = []
+        pattern = Pattern(lambda: stamps.append(time.perf_counter()), time=block)
+        server.start()
+        pattern.play()
+        time.sleep(probe_time)
+        server.stop()
+        del pattern
+        server.shutdown()
+
+        gaps = [b - a for a, b in zip(stamps, stamps[1:])]
+        # a starved stream also shows up as too few callbacks overall
+        expected = probe_time / block
+        if gaps and max(gaps) < tolerance * block and len(stamps) > 0.8 * expected:
+            return size
+    return sizes[-1]
+
+
+class AudioSession:
+    """
+    The process wide audio server
+
+    Parameters:
+    - backend: One of BACKENDS, None detects it
+    - buffersize: Samples per block, None probes the smallest stable size
+    - output_device, input_device: PortAudio device indexes, None default
+    - duplex: 1 to open the input too (microphone)
+    - filename: Record everything to this file, used by offline renders
+    """
+
+    def __init__(self, backend=None, sr=SAMPLING_RATE, buffersize=BUFFERSIZE, nchnls=N_CHANNELS,
+                 duplex=DUPLEX, output_device=OUTPUT_DEVICE, input_device=None, filename=None):
+        self.backend = backend or detect_backend()
+        self.sr = sr
+        self.nchnls = nchnls
+        self.duplex = duplex
+        self.output_device = output_device
+        self.input_device = input_device
+        self.buffersize = buffersize or probe_buffer_size(
+                self.backend, sr, output_device=output_device, duplex=duplex, input_device=input_device)
+        self.filename = filename
+        self.server = None
+
+    @property
+    def offline(self) -> bool:
+        return self.backend == "manual"
+
+    @property
+    def output_latency(self) -> float:
+        """Seconds of one buffer, the floor of the output latency"""
+        return self.buffersize / self.sr
+
+    def start(self):
+        """Boot and start the server once, later calls return the same one"""
+        if self.server is None:
+            self.server = _new_server(self.backend, self.sr, self.buffersize, self.nchnls,
+                                      self.duplex, self.output_device, self.input_device)
+            self.server.start()
+            if self.filename:
+                self.server.recordOptions(filename=self.filename, fileformat=0, sampletype=1)
+                self.server.recstart()
+        return self.server
+
+    def close(self):
+        if self.server is None:
+            return
+        if self.filename:
+            self.server.recstop()
+        self.server.stop()
+        self.server.shutdown()
+        self.server = None
+
+
+_session = None
+
+
+def get_session(**kwargs) -> AudioSession:
+    """
+    The shared session, created with kwargs on the first call. Later calls
+    may repeat them, a kwarg that is not None and differs from the running
+    session (e.g. duplex=1 for a half duplex one) raises ValueError
+    """
+    global _session
+    if _session is None:
+        _session = AudioSession(**kwargs)
+        return _session
+    conflicts = {name: value for name, value in kwargs.items()
+                 if value is not None and getattr(_session, name) != value}
+    if conflicts:
+        current = {name: getattr(_session, name) for name in conflicts}
+        raise ValueError(f"Audio session already running with {current}, can not change it to {conflicts}")
+    return _session
+
+
+def current_session():
+    """The shared session if one was created, None otherwise"""
+    return _session
+
+
+def shared_server(server=None):
+    """server if given, otherwise the started server of the shared session"""
+    if server is not None:
+        return server
+    return get_session().start()
+
+
+def setup_server(**kwargs):
+    """Start the shared live session, kwargs as for AudioSession"""
+    return get_session(**kwargs).start()
+
+
+def setup_offline_server(filename):
+    """
+    Server without a sound card, rendering to filename
+
+    Audio is only computed when server.process() is called, one buffer of
+    BUFFERSIZE samples per call, so the caller decides how fast time passes.
+    """
+    global _session
+    if _session is not None:
+        _session.close()
+    _session = AudioSession(backend="manual", buffersize=BUFFERSIZE, duplex=0, filename=filename)
+    return _session.start()
+
 
+def close_server(server=None):
+    global _session
+    if _session is not None and (server is None or server is _session.server):
+        _session.close()
+        _session = None
+    elif server is not None:
+        server.stop()
+        server.shutdown()
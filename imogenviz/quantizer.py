@@ -0,0 +1,71 @@
+# Snap gesture triggers to a tempo grid on the audio server clock.
+#
+# Without this a hit plays whenever the python loop gets to it, so camera
+# frame time jitter turns straight into timing jitter. Here the hit is
+# delayed to the next 1/8 or 1/16 step and handed to a CallAfter, which
+# fires from the audio thread at the right block no matter what the
+# tracking loop is doing.
+
+import functools
+import math
+
+from pyo import CallAfter
+
+
+class QuantizedScheduler:
+    """
+    Parameters:
+    - server: Running pyo server, its sample clock is the time base
+    - bpm: Tempo in quarter notes per minute
+    - division: Grid steps per whole note, 8 or 16
+    - swing: 0.0 (straight) to 1.0, every second step is pushed later by
+      up to half a step
+    - strength: 1.0 snaps fully to the grid, 0.0 plays immediately, values
+      in between move the hit that fraction of the way
+    """
+
+    def __init__(self, server, bpm=100.0, division=16, swing=0.0, strength=1.0):
+        self.server = server
+        self.bpm = bpm
+        self.division = division
+        self.swing = swing
+        self.strength = strength
+        # grid starts when the scheduler is created
+        self.origin = self.now()
+        self.pending = []
+
+    @property
+    def step_duration(self) -> float:
+        """Seconds per grid step"""
+        return 60.0 / self.bpm * 4 / self.division
+
+    def now(self) -> float:
+        """Server time in seconds, advances one buffer at a time"""
+        return self.server.getCurrentTimeInSamples() / self.server.getSamplingRate()
+
+    def next_step(self, time: float) -> float:
+        """Time of the first grid step at or after time, swing applied"""
+        step = self.step_duration
+        offbeat = step * (1 + min(max(self.swing, 0.0), 1.0) * 0.5)
+        pair = 2 * step
+        pair_start = self.origin + math.floor((time - self.origin) / pair) * pair
+        for candidate in (pair_start, pair_start + offbeat):
+            if candidate >= time:
+                return candidate
+        return pair_start + pair
+
+    def schedule(self, callback, *args, **kwargs) -> float:
+        """Call callback on the grid, returns the delay in seconds"""
+        now = self.now()
+        delay = (self.next_step(now) - now) * self.strength
+        block = self.server.getBufferSize() / self.server.getSamplingRate()
+
+        if delay < block:
+            # already inside the block of the step, no point waiting
+            callback(*args, **kwargs)
+            return 0.0
+
+        # CallAfter objects have to be kept alive until they fired
+        self.pending = [call for call in self.pending if call.isPlaying()]
+        self.pending.append(CallAfter(functools.partial(callback, *args, **kwargs), time=delay))
+        return delay
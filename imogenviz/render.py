@@ -0,0 +1,99 @@
+# Preview window, decoupled from tracking.
+#
+# Drawing landmarks and text and pushing a full frame through cv2.imshow
+# every tracked frame takes a real share of the frame budget, so rendering
+# is its own subsystem with three modes:
+#   none     headless, nothing is drawn and no window is opened
+#   preview  camera picture with the tracked hands, at most fps per second
+#   debug    preview plus tracking and preview fps, chord and latency text
+#
+# handoff() runs on the inference thread: at most fps times per second it
+# copies the frame out of the capture ring, whose buffers are reused a few
+# reads later, and passes the copy on. draw() runs as a pipeline stage on
+# its own thread and composes the picture on that copy. show() only hands
+# the finished picture to the window, on the main thread, as cv2 windows
+# are not thread safe.
+
+import dataclasses
+import time
+
+import cv2
+
+from handtracking import draw_hand
+
+RENDER_MODES = ("none", "preview", "debug")
+
+
+class Renderer:
+    """
+    Parameters:
+    - mode: One of RENDER_MODES
+    - fps: Most pictures composed per second, independent of tracking fps
+    - window: Window title
+    - status: Callable returning the text lines of the debug overlay
+    - rgb: Frames arrive as RGB and are converted back for the window
+    """
+
+    def __init__(self, mode="preview", fps=15.0, window="Camera :)", status=None, rgb=False):
+        if mode not in RENDER_MODES:
+            raise ValueError(f"Unknown render mode: {mode}, expected one of {RENDER_MODES}")
+        self.mode = mode
+        self.interval = 1.0 / fps
+        self.window = window
+        self.status = status
+        self.rgb = rgb
+        self.last_handoff = 0.0
+        self.last_draw = 0.0
+        self.skipped = 0
+
+    @property
+    def headless(self) -> bool:
+        return self.mode == "none"
+
+    def handoff(self, tracked):
+        """
+        Inference thread: tracked with a private copy of its frame, None if
+        it is too early for the next picture
+        """
+        now = time.perf_counter()
+        if self.headless or now - self.last_handoff < self.interval:
+            self.skipped += 1
+            return None
+        self.last_handoff = now
+        # copied before the capture ring can hand the buffer out again
+        if self.rgb:
+            frame = cv2.cvtColor(tracked.frame, cv2.COLOR_RGB2BGR)
+        else:
+            frame = tracked.frame.copy()
+        return dataclasses.replace(tracked, frame=frame)
+
+    def draw(self, tracked):
+        """Pipeline stage: compose the picture on a frame from handoff()"""
+        now = time.perf_counter()
+        fps = 1.0 / max(now - self.last_draw, 1e-6)
+        self.last_draw = now
+
+        frame = tracked.frame
+        for hand in (tracked.left_hand, tracked.right_hand):
+            if hand is not None and len(hand) > 0:
+                draw_hand(frame, hand)
+
+        if self.mode == "debug":
+            # how often this picture is redrawn, tracking fps come with status()
+            cv2.putText(frame, f"preview {fps:.0f} fps", (10, 70), cv2.FONT_HERSHEY_PLAIN, 2, (255, 0, 255), 2)
+            lines = self.status() if self.status is not None else []
+            for i, line in enumerate(lines):
+                cv2.putText(frame, line, (10, 110 + 25 * i), cv2.FONT_HERSHEY_PLAIN, 1.5, (255, 0, 255), 2)
+        return frame
+
+    def show(self, frame) -> int:
+        """Main thread: display a composed picture (None keeps the last one), returns the key code"""
+        if self.headless:
+            return -1
+        if frame is not None:
+            cv2.imshow(self.window, frame)
+        return cv2.waitKey(1) & 0xFF
+
+    def close(self):
+        if not self.headless:
+            cv2.destroyAllWindows()
@@ -0,0 +1,198 @@
+# Record the tracked hands of a live session and replay them headless.
+#
+# A recording is a .npz with one row per tracked frame:
+#   timestamps (N,)          seconds since the first frame
+#   hands      (N, 2, 21, 2) int16 pixel landmarks, left hand then right hand
+#   present    (N, 2)        bool, False where that hand was not found
+#
+# Replay feeds the frames through the same GestureController as the live
+# loop, into a manual pyo server that renders a WAV. No camera or sound card
+# is needed, so the whole control path can be profiled and regression tested.
+#
+# usage: python imogenviz/replay.py session.npz --wav session.wav [--realtime]
+
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from limbs import HandLandmarks, NUM_LIMBS
+from controller import TrackedFrame
+
+# frames allocated at a time while recording
+RECORD_BLOCK = 1024
+
+
+class LandmarkRecorder:
+    """Collects the hands of every TrackedFrame into preallocated arrays"""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.start_time = None
+        self.timestamps = np.zeros(RECORD_BLOCK, dtype=np.float64)
+        self.hands = np.zeros((RECORD_BLOCK, 2, NUM_LIMBS, 2), dtype=np.int16)
+        self.present = np.zeros((RECORD_BLOCK, 2), dtype=bool)
+
+    def _grow(self):
+        size = len(self.timestamps) + RECORD_BLOCK
+        self.timestamps = np.resize(self.timestamps, size)
+        self.hands = np.resize(self.hands, (size, 2, NUM_LIMBS, 2))
+        self.present = np.resize(self.present, (size, 2))
+
+    def add(self, tracked: TrackedFrame):
+        if self.start_time is None:
+            self.start_time = tracked.capture_time
+        if self.count == len(self.timestamps):
+            self._grow()
+
+        i = self.count
+        self.timestamps[i] = tracked.capture_time - self.start_time
+        for slot, hand in enumerate((tracked.left_hand, tracked.right_hand)):
+            found = hand is not None and len(hand) > 0
+            self.present[i, slot] = found
+            if found:
+                self.hands[i, slot] = hand.points
+        self.count += 1
+
+    def save(self):
+        n = self.count
+        np.savez_compressed(
+                self.path,
+                timestamps=self.timestamps[:n],
+                hands=self.hands[:n],
+                present=self.present[:n])
+        print(f"Saved {n} frames to {self.path}")
+
+
+@dataclass
+class Recording:
+    timestamps: np.ndarray
+    hands: np.ndarray
+    present: np.ndarray
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def duration(self) -> float:
+        if len(self) == 0:
+            return 0.0
+        return float(self.timestamps[-1])
+
+    def frame(self, i) -> TrackedFrame:
+        left, right = (
+                HandLandmarks(self.hands[i, slot].astype(np.int32))
+                if self.present[i, slot] else HandLandmarks()
+                for slot in range(2))
+        return TrackedFrame(None, left, right, float(self.timestamps[i]))
+
+
+def load_recording(path) -> Recording:
+    with np.load(path) as data:
+        return Recording(data["timestamps"], data["hands"], data["present"])
+
+
+class ReplayClock:
+    """Stands in for time.time(), returning the position in the recording"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def replay(recording: Recording, controller, server, clock: ReplayClock,
+           realtime=False, tail=2.0):
+    """
+    Drive controller with every frame of recording, advancing the manual
+    server so that audio time follows the recorded timestamps
+
+    Parameters:
+    - realtime: Sleep between frames to play back at the recorded speed,
+      otherwise run as fast as possible
+    - tail: Seconds rendered after the last frame to let sounds ring out
+    """
+    block_time = server.getBufferSize() / server.getSamplingRate()
+    audio_time = 0.0
+    start = time.perf_counter()
+
+    for i in range(len(recording)):
+        tracked = recording.frame(i)
+        while audio_time < tracked.capture_time:
+            server.process()
+            audio_time += block_time
+
+        if realtime:
+            delay = start + tracked.capture_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        clock.now = tracked.capture_time
+        controller(tracked)
+
+    end_time = audio_time + tail
+    while audio_time < end_time:
+        server.process()
+        audio_time += block_time
+
+    return audio_time, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a landmark recording to a WAV")
+    parser.add_argument("recording", help=".npz written by main.py --record")
+    parser.add_argument("--wav", default="replay.wav", help="output file")
+    parser.add_argument("--realtime", action="store_true",
+                        help="replay at recorded speed instead of full speed")
+    parser.add_argument("--quantize", type=int, choices=[8, 16],
+                        help="snap drum hits to 1/8 or 1/16 steps")
+    parser.add_argument("--bpm", type=float, default=100.0)
+    parser.add_argument("--swing", type=float, default=0.0)
+    parser.add_argument("--smooth", action="store_true", help="One-Euro filter the landmarks")
+    parser.add_argument("--mapping", metavar="PATH", help="mapping config, default mappings/default.json")
+    parser.add_argument("--vocals", metavar="WAV", help="sing along from a sound file through the vocal chain")
+    parser.add_argument("--key", help="key of the chord progression, default C")
+    parser.add_argument("--progression", help="chord progression, see main.py --progression")
+    args = parser.parse_args()
+
+    from pyo_server import setup_offline_server, close_server
+    from drums import Drums
+    from pad_drone import PAD
+    from mixer import instrument_mixer
+    from controller import DEFAULT_KEY, DEFAULT_PROGRESSION, GestureController
+    from quantizer import QuantizedScheduler
+    from mapping import DEFAULT_MAPPING, VOCALS_MAPPING, load_mapping
+    from smoothing import OneEuroFilter
+    from theory import parse_progression
+
+    recording = load_recording(args.recording)
+    server = setup_offline_server(args.wav)
+    clock = ReplayClock()
+    quantizer = None
+    if args.quantize:
+        quantizer = QuantizedScheduler(server, bpm=args.bpm, division=args.quantize, swing=args.swing)
+    pad = PAD(server=server, reverb=False)
+    drums = Drums(server=server)
+    vocals = None
+    if args.vocals:
+        from vocals import VocalChain, open_vocal_input
+        vocals = VocalChain(server, source=open_vocal_input(args.vocals),
+                            chain=("gate", "compressor", "harmonizer"), pad=pad)
+    mixer = instrument_mixer(server, pad, drums, vocals, delay_time=0.75 * 60.0 / args.bpm)
+    controller = GestureController(
+            pad, drums, clock=clock, quantizer=quantizer, vocals=vocals, mixer=mixer,
+            mapping=load_mapping(args.mapping or (VOCALS_MAPPING if vocals is not None else DEFAULT_MAPPING)),
+            smoother=OneEuroFilter() if args.smooth else None,
+            progression=parse_progression(args.progression or DEFAULT_PROGRESSION, key=args.key or DEFAULT_KEY))
+
+    audio_time, wall_time = replay(recording, controller, server, clock, realtime=args.realtime)
+    close_server(server)
+    print(f"Rendered {audio_time:.1f}s of audio from {len(recording)} frames "
+          f"in {wall_time:.2f}s ({audio_time / wall_time:.1f}x realtime) -> {args.wav}")
+
+
+if __name__ == "__main__":
+    main()
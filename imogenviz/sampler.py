@@ -0,0 +1,175 @@
+# Sample player for drum kits.
+#
+# Samples are found by scanning a soundbank directory and loaded once into a
+# SampleCache, so any number of pads (and kits) share one table per file.
+# Only samples a pad actually uses are loaded, scanning dozens of files only
+# lists their names.
+#
+# Playback goes through a fixed pool of voices, each a Trig -> TrigEnv ->
+# Pan chain created up front. A hit takes the least recently started voice
+# and points it at the pad's table, so the same sample can overlap itself
+# (fast hihats) without creating pyo objects while playing. Pads in the same
+# choke group cut each other off, like an open and a closed hihat.
+
+import os
+from dataclasses import dataclass
+
+import numpy as np
+
+from pyo_server import shared_server
+from pyo import DataTable, Mix, Pan, SigTo, SndTable, Trig, TrigEnv, sndinfo
+
+SOUNDBANK_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "soundbank")
+SAMPLE_EXTENSIONS = (".wav", ".aif", ".aiff", ".flac")
+
+# seconds a choked voice takes to fade out, short enough to sound like a cut
+CHOKE_TIME = 0.01
+
+
+def scan_soundbank(directory=SOUNDBANK_DIR) -> dict:
+    """Sample name (file name without extension) -> path, nothing is loaded"""
+    samples = {}
+    for entry in sorted(os.scandir(directory), key=lambda entry: entry.name):
+        name, extension = os.path.splitext(entry.name)
+        if entry.is_file() and extension.lower() in SAMPLE_EXTENSIONS:
+            samples[name] = entry.path
+    return samples
+
+
+class SampleCache:
+    """
+    Loads every sample file once, later requests get the same table
+
+    Parameters:
+    - server: Booted pyo server
+    - resample: Convert samples to the server rate at load time, so playback
+      reads the table 1:1 instead of interpolating on every hit
+    """
+
+    def __init__(self, server, resample=False):
+        self.server = server
+        self.resample = resample
+        self.tables = {}
+
+    def load(self, path):
+        path = os.path.abspath(path)
+        if path not in self.tables:
+            self.tables[path] = self._load(path)
+        return self.tables[path]
+
+    def _load(self, path):
+        # stereo files are played from their first channel, pads are panned
+        table = SndTable(path, chnl=0)
+        if not self.resample:
+            return table
+        sr = self.server.getSamplingRate()
+        file_sr = sndinfo(path)[2]
+        if file_sr == sr:
+            return table
+
+        samples = np.asarray(table.getBuffer())
+        size = max(int(round(len(samples) * sr / file_sr)), 1)
+        resampled = DataTable(size=size)
+        positions = np.arange(size) * (file_sr / sr)
+        np.asarray(resampled.getBuffer())[:] = np.interp(positions, np.arange(len(samples)), samples)
+        return resampled
+
+    @property
+    def memory_bytes(self) -> int:
+        """Table memory, assuming 32 bit samples"""
+        return sum(table.getSize() * 4 for table in self.tables.values())
+
+
+@dataclass
+class Pad:
+    """
+    Parameters:
+    - name: Name the pad is played by
+    - sample: Soundbank sample name or a path to a file
+    - volume: Gain at velocity 1.0
+    - pan: 0.0 left to 1.0 right
+    - choke: Group name, a hit stops the other pads of its group
+    """
+    name: str
+    sample: str
+    volume: float = 0.7
+    pan: float = 0.5
+    choke: str = None
+
+
+class Voice:
+    """One playback chain of the pool"""
+
+    def __init__(self, table):
+        self.trig = Trig()
+        self.amp = SigTo(0.0, time=0.0)
+        self.player = TrigEnv(self.trig, table=table, dur=table.getDur(), mul=self.amp)
+        self.pan = Pan(self.player, outs=2, pan=0.5, spread=0.5)
+        self.pad = None
+        self.started = 0
+
+
+class DrumSampler:
+    """
+    Parameters:
+    - server: Booted pyo server, the shared audio session by default
+    - pads: List of Pad
+    - soundbank: Directory sample names are looked up in
+    - n_voices: Size of the voice pool, the most hits sounding at once
+    - cache: SampleCache to share with other samplers, a new one by default
+    - resample: Passed to the new SampleCache
+    """
+
+    def __init__(self, server, pads=(), soundbank=SOUNDBANK_DIR, n_voices=8, cache=None,
+                 resample=False):
+        self.server = shared_server(server)
+        self.samples = scan_soundbank(soundbank)
+        self.cache = cache or SampleCache(self.server, resample=resample)
+        self.pads = {}
+        self.tables = {}
+        for pad in pads:
+            self.add_pad(pad)
+
+        first_table = next(iter(self.tables.values()), None) or DataTable(size=1)
+        self.voices = [Voice(first_table) for _ in range(n_voices)]
+        self.hits = 0
+        self.output = Mix([voice.pan for voice in self.voices], voices=2).out()
+
+    def add_pad(self, pad: Pad):
+        path = self.samples.get(pad.sample, pad.sample)
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"No sample {pad.sample!r} in the soundbank or on disk")
+        self.tables[pad.name] = self.cache.load(path)
+        self.pads[pad.name] = pad
+
+    def play(self, name, velocity=1.0):
+        """Hit a pad, velocity 0.0 to 1.0 scales its volume"""
+        pad = self.pads[name]
+        if pad.choke is not None:
+            self.choke(pad.choke)
+
+        voice = min(self.voices, key=lambda voice: voice.started)
+        self.hits += 1
+        voice.started = self.hits
+        voice.pad = pad
+
+        table = self.tables[name]
+        voice.player.table = table
+        voice.player.dur = table.getDur()
+        voice.pan.pan = pad.pan
+        voice.amp.time = 0.0
+        voice.amp.value = pad.volume * velocity
+        voice.trig.play()
+
+    def choke(self, group):
+        """Fade out every voice playing a pad of group"""
+        for voice in self.voices:
+            if voice.pad is not None and voice.pad.choke == group:
+                voice.amp.time = CHOKE_TIME
+                voice.amp.value = 0.0
+                voice.pad = None
+
+    def voice_pad_name(self, voice_index) -> str:
+        """Name of the pad a voice last played, e.g. for latency tracking"""
+        pad = self.voices[voice_index].pad
+        return pad.name if pad is not None else ""
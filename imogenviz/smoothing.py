@@ -0,0 +1,108 @@
+# Landmark smoothing and latency compensation.
+#
+# MediaPipe landmarks jitter by a few pixels from frame to frame, which is
+# enough to flip a finger between bent and straight when it is held near the
+# switch point. A One-Euro filter (Casiez et al. 2012) is a low pass whose
+# cutoff rises with speed: a still hand is smoothed hard, a fast move passes
+# with little lag. It runs on every coordinate of every hand at once.
+#
+# The filter also tracks a smoothed velocity, so the landmarks can be
+# extrapolated forward by the measured pipeline latency: the gesture is
+# evaluated where the hand is now rather than where it was at capture time.
+
+import numpy as np
+
+from limbs import HandLandmarks, NUM_LIMBS
+
+
+def smoothing_factor(cutoff, dt):
+    """Exponential smoothing alpha of a first order low pass at cutoff Hz"""
+    tau = 1.0 / (2 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    """
+    Parameters:
+    - n_hands: Number of hand slots passed to each call
+    - min_cutoff: Hz, cutoff of a still hand, lower is smoother but laggier
+    - beta: How fast the cutoff rises with speed (per pixel/s)
+    - d_cutoff: Hz, cutoff of the velocity estimate
+    - max_lead: Seconds, longest forward prediction, caps overshoot when
+      the measured latency spikes
+    """
+
+    def __init__(self, n_hands=2, min_cutoff=1.0, beta=0.05, d_cutoff=1.0, max_lead=0.1):
+        self.n_hands = n_hands
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.max_lead = max_lead
+
+        shape = (n_hands, NUM_LIMBS, 2)
+        self.position = np.zeros(shape)
+        self.velocity = np.zeros(shape)
+        self.last_time = np.full(n_hands, np.nan)
+
+    def reset(self, hand=None):
+        """Forget the state of one hand slot, or of all of them"""
+        if hand is None:
+            self.last_time[:] = np.nan
+        else:
+            self.last_time[hand] = np.nan
+
+    def update(self, points: np.ndarray, present: np.ndarray, timestamp) -> np.ndarray:
+        """
+        Filter one frame of all hand slots
+
+        Parameters:
+        - points: (n_hands, 21, 2) raw landmarks, rows of absent hands are ignored
+        - present: (n_hands,) bool, absent slots are reset
+        - timestamp: Capture time of the frame in seconds
+        """
+        dt = timestamp - self.last_time
+        # first frame of a hand (nan) or a repeated timestamp: take it as is
+        fresh = present & ~(dt > 0)
+        running = present & (dt > 0)
+        self.last_time[~present] = np.nan
+
+        if running.any():
+            dt = dt[running][:, None, None]
+            raw = points[running]
+            previous = self.position[running]
+
+            a_d = smoothing_factor(self.d_cutoff, dt)
+            velocity = a_d * (raw - previous) / dt + (1 - a_d) * self.velocity[running]
+            a = smoothing_factor(self.min_cutoff + self.beta * np.abs(velocity), dt)
+            self.position[running] = a * raw + (1 - a) * previous
+            self.velocity[running] = velocity
+
+        self.position[fresh] = points[fresh]
+        self.velocity[fresh] = 0.0
+        self.last_time[present] = timestamp
+        return self.position
+
+    def predict(self, lead: float) -> np.ndarray:
+        """Smoothed landmarks extrapolated lead seconds ahead"""
+        lead = min(max(lead, 0.0), self.max_lead)
+        return self.position + self.velocity * lead
+
+    def __call__(self, hands: list[HandLandmarks], timestamp, lead=0.0) -> list[HandLandmarks]:
+        """
+        Filter a list of hands in slot order, returns new HandLandmarks with
+        float points, missing hands are passed through unchanged
+
+        Parameters:
+        - lead: Seconds to predict ahead, e.g. the measured latency, 0 off
+        """
+        points = np.zeros((self.n_hands, NUM_LIMBS, 2))
+        present = np.zeros(self.n_hands, dtype=bool)
+        for slot, hand in enumerate(hands[:self.n_hands]):
+            if hand is not None and len(hand) > 0:
+                points[slot] = hand.points
+                present[slot] = True
+
+        self.update(points, present, timestamp)
+        filtered = self.predict(lead) if lead > 0 else self.position
+        return [HandLandmarks(filtered[slot].copy()) if present[slot] else hand
+                for slot, hand in enumerate(hands[:self.n_hands])]
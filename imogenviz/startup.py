@@ -0,0 +1,151 @@
+# Startup timing: where the seconds before the first note go.
+#
+# Phases (camera, model, audio, ...) are timed as they run, including the
+# ones running in parallel on a background thread. With import timing on,
+# every module import is timed too, exclusive of the imports it triggers,
+# and summed per top level package, so mediapipe, cv2 and pyo show up as
+# single lines in the report.
+
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+
+class _TimedLoader:
+    """Wraps a module loader to time create_module + exec_module"""
+
+    def __init__(self, loader, name, timer):
+        self._loader = loader
+        self._name = name
+        self._timer = timer
+
+    def create_module(self, spec):
+        # extension modules do their heavy lifting (dlopen) here
+        with self._timer.timing(self._name):
+            return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self._timer.timing(self._name):
+            self._loader.exec_module(module)
+
+    def __getattr__(self, attr):
+        return getattr(self._loader, attr)
+
+
+class ImportTimer:
+    """sys.meta_path hook summing import self time per top level package"""
+
+    def __init__(self):
+        self.times = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def install(self):
+        sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, name, path, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None:
+                    spec.loader = _TimedLoader(spec.loader, name, self)
+                return spec
+        return None
+
+    @contextmanager
+    def timing(self, name):
+        # time spent in nested imports is charged to them, not to us
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            package = name.partition(".")[0]
+            with self._lock:
+                self.times[package] = self.times.get(package, 0.0) + elapsed - nested
+
+
+@dataclass
+class Phase:
+    name: str
+    thread: str
+    start: float
+    end: float = None
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+
+class StartupProfiler:
+    """
+    Parameters:
+    - enabled: Time imports too and print a report, phases are always timed
+      as they are cheap
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.origin = time.perf_counter()
+        self.phases = []
+        self.imports = ImportTimer()
+        self.executor = None
+        self.ready = None
+        if enabled:
+            self.imports.install()
+
+    @contextmanager
+    def phase(self, name):
+        phase = Phase(name, threading.current_thread().name, time.perf_counter())
+        self.phases.append(phase)
+        try:
+            yield phase
+        finally:
+            phase.end = time.perf_counter()
+
+    def background(self, name, func, *args, **kwargs):
+        """Run func as a phase on a background thread, returns its Future"""
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="startup")
+
+        def run():
+            with self.phase(name):
+                return func(*args, **kwargs)
+        return self.executor.submit(run)
+
+    def done(self):
+        """Startup is over, stop timing imports"""
+        self.ready = time.perf_counter()
+        self.imports.uninstall()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def report(self, top=12) -> str:
+        ready = self.ready or time.perf_counter()
+        lines = [f"startup: {(ready - self.origin) * 1000:.0f} ms until the loop starts",
+                 f"{'phase':<16}{'start ms':>10}{'ms':>10}  thread"]
+        for phase in self.phases:
+            lines.append(f"{phase.name:<16}{(phase.start - self.origin) * 1000:>10.0f}"
+                         f"{phase.duration * 1000:>10.0f}  {phase.thread}")
+        if self.imports.times:
+            lines.append(f"{'import':<16}{'ms':>10}")
+            ranked = sorted(self.imports.times.items(), key=lambda item: -item[1])
+            for package, seconds in ranked[:top]:
+                lines.append(f"{package:<16}{seconds * 1000:>10.0f}")
+            rest = sum(seconds for _, seconds in ranked[top:])
+            lines.append(f"{'(other)':<16}{rest * 1000:>10.0f}")
+        return "\n".join(lines)
@@ -1,29 +1,12 @@
 import numpy as np
 import os
 from pyo import * # a bit disgusting but bleh
-# pyo setup
-# Suppress ALSA error messages
-os.environ['ALSA_OUTPUT_STDERR'] = '0'
-# user specific configs that would need to be set depending on your audio setup
-SAMPLING_RATE=48000
-OUTPUT_DEVICE=7
-N_CHANNELS=2
-BUFFERSIZE=512
-DUPLEX=0
+from pyo_server import shared_server
 
 class SimpleSynthesizer:
-    def __init__(self):
-        # Create and configure the server properly (only once)
-        self.server = Server(
-                sr=SAMPLING_RATE,
-                duplex=DUPLEX,
-                buffersize=BUFFERSIZE,
-                nchnls=N_CHANNELS,
-                audio='pa'
-                )
-        self.server.setOutputDevice(OUTPUT_DEVICE)
-        self.server.boot()
-        self.server.start()
+    def __init__(self, server=None):
+        # audio setup lives in pyo_server, shared with every other instrument
+        self.server = shared_server(server)
         
         # Create oscillators using the correct Pyo classes
         self.oscillators = {
@@ -40,8 +23,8 @@ class SimpleSynthesizer:
         self.mixer = Mix(list(self.oscillators.values()), voices=2)
         
         self.filter = Biquad(self.mixer, freq=1000, q=1, type=0)
-        # Output the signal
-        self.filter.out()
+        # Output the signal, self.output can also be a mixer.Channel source
+        self.output = self.filter.out()
     
     def set_oscillator(self, osc_type, active=True, amplitude=0.5):
         """Enable/disable oscillator and set its amplitude"""
@@ -71,9 +54,6 @@ class SimpleSynthesizer:
         # Apply envelope to filter
         self.filter.mul = env
 
-# List available devices before creating the synth
-pa_list_devices()
-
 # Example usage:
 if __name__ == "__main__":
     # Create synth
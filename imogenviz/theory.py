@@ -0,0 +1,214 @@
+# Notes, chords and progressions as precomputed tables.
+#
+# Everything a chord change needs is computed once at import: the frequency
+# of every MIDI note, and for every root, chord quality and inversion the
+# MIDI notes the pad plays (the chord plus the same notes an octave up). A
+# chord change is then a table lookup, a choice between the inversions, and
+# an index into the frequency table.
+#
+# The inversion is picked by voice leading: the one that leaves the most
+# notes where they are and moves the rest by the smallest intervals, so the
+# pad's voices glide a step instead of jumping around the root position.
+#
+# Progressions are written as Roman numerals in a key ("I IV V7 vi" in D)
+# or as plain chord names ("F:sus4 G:dom7").
+
+import re
+
+import numpy as np
+
+# A4 = MIDI 69 = 440 Hz, equal temperament
+MIDI_FREQUENCIES = 440.0 * 2 ** ((np.arange(128) - 69) / 12)
+
+NOTE_NAMES = ("C", "C#", "D", "D#", "E", "F", "F#", "G", "G#", "A", "A#", "B")
+FLAT_NAMES = ("C", "Db", "D", "Eb", "E", "F", "Gb", "G", "Ab", "A", "Bb", "B")
+# pitch class of every spelling, "Bb" and "A#" are the same key
+NOTE_INDEX = {
+    letter + accidental: (pc + shift) % 12
+    for letter, pc in zip("CDEFGAB", (0, 2, 4, 5, 7, 9, 11))
+    for accidental, shift in (("", 0), ("#", 1), ("b", -1))
+}
+
+# semitone intervals from the root
+CHORD_QUALITIES = {
+    "major": (0, 4, 7),
+    "minor": (0, 3, 7),
+    "dim": (0, 3, 6),
+    "aug": (0, 4, 8),
+    "sus2": (0, 2, 7),
+    "sus4": (0, 5, 7),
+    "maj7": (0, 4, 7, 11),
+    "min7": (0, 3, 7, 10),
+    "dom7": (0, 4, 7, 10),
+    "min7b5": (0, 3, 6, 10),
+    "dim7": (0, 3, 6, 9),
+    "maj6": (0, 4, 7, 9),
+    "min6": (0, 3, 7, 9),
+    "add9": (0, 4, 7, 14),
+}
+QUALITY_ALIASES = {
+    "": "major", "maj": "major", "M": "major", "m": "minor", "min": "minor",
+    "7": "dom7", "m7": "min7", "M7": "maj7", "o": "dim", "o7": "dim7",
+    "m7b5": "min7b5", "ø": "min7b5", "ø7": "min7b5", "+": "aug", "6": "maj6", "m6": "min6",
+}
+
+# the octave the tables are built in, other octaves are a transposition
+TABLE_OCTAVE = 4
+# an inversion's bass goes to the octave closest to the root, at most this
+# many semitones above it, so every inversion stays in the chord's register
+MAX_BASS_OFFSET = 6
+
+
+def note_number(root, octave=4) -> int:
+    """MIDI note of a root name in an octave, C4 = 60"""
+    return 12 * (octave + 1) + NOTE_INDEX[root]
+
+
+def note_frequency(root, octave=4) -> float:
+    return float(MIDI_FREQUENCIES[note_number(root, octave)])
+
+
+def _inversion(intervals, k) -> list:
+    # notes below the new bass move up an octave
+    notes = list(intervals[k:]) + [interval + 12 for interval in intervals[:k]]
+    if notes[0] > MAX_BASS_OFFSET:
+        notes = [note - 12 for note in notes]
+    # the pad doubles every note an octave up
+    return notes + [note + 12 for note in notes]
+
+
+def _build_voicings() -> dict:
+    voicings = {}
+    for quality, intervals in CHORD_QUALITIES.items():
+        inversions = np.array([_inversion(intervals, k) for k in range(len(intervals))])
+        roots = 12 * (TABLE_OCTAVE + 1) + np.arange(12)
+        # (root pitch class, inversion, note)
+        voicings[quality] = roots[:, None, None] + inversions[None]
+    return voicings
+
+
+VOICINGS = _build_voicings()
+
+
+def resolve_quality(quality) -> str:
+    """Canonical CHORD_QUALITIES name, accepts the short names in QUALITY_ALIASES"""
+    quality = QUALITY_ALIASES.get(quality, quality)
+    if quality not in CHORD_QUALITIES:
+        raise KeyError(f"Unknown chord quality: {quality}")
+    return quality
+
+
+def chord_voicings(root, quality="major", octave=4) -> np.ndarray:
+    """
+    Every inversion of a chord, (n_inversions, n_notes) MIDI notes
+
+    The first half of each row is the chord, the second half the same notes
+    an octave up.
+    """
+    voicings = VOICINGS[resolve_quality(quality)][NOTE_INDEX[root]] + 12 * (octave - TABLE_OCTAVE)
+    if voicings.min() < 0 or voicings.max() > 127:
+        raise ValueError(f"{root}{quality} in octave {octave} is outside the MIDI range")
+    return voicings
+
+
+def voice_leading_cost(previous, candidates) -> np.ndarray:
+    """
+    Cost of moving from the previous notes to each candidate voicing
+
+    Every candidate note is reached by the nearest previous note. Notes that
+    have to move at all count far more than how far they move, so fewer
+    moving voices always wins, and among those the smallest steps.
+
+    Parameters:
+    - previous: MIDI notes sounding now
+    - candidates: (n_candidates, n_notes) MIDI notes
+    """
+    distance = np.abs(candidates[:, :, None] - np.asarray(previous)[None, None, :]).min(axis=2)
+    return 100 * np.count_nonzero(distance, axis=1) + distance.sum(axis=1)
+
+
+def lead_voicing(previous, root, quality="major", octave=4) -> tuple:
+    """
+    (inversion, MIDI notes) of the chord closest to the previous notes
+
+    Parameters:
+    - previous: MIDI notes sounding now, None or empty for root position
+    """
+    voicings = chord_voicings(root, quality, octave)
+    if previous is None or len(previous) == 0:
+        return 0, voicings[0]
+    # argmin takes the first of equal costs, the lowest inversion
+    inversion = int(np.argmin(voice_leading_cost(previous, voicings)))
+    return inversion, voicings[inversion]
+
+
+def nearest_chord_tone(note, chord) -> int:
+    """
+    MIDI note closest to note (may be fractional) whose pitch class is in chord
+
+    Parameters:
+    - chord: MIDI notes of the chord, any octave
+    """
+    pitch_classes = np.unique(np.asarray(chord) % 12)
+    # candidates in the octaves around note, one per chord pitch class
+    base = 12 * np.floor(note / 12)
+    candidates = (base + pitch_classes[:, None] + np.array([-12, 0, 12])).ravel()
+    return int(candidates[np.argmin(np.abs(candidates - note))])
+
+
+# scale degrees in semitones, for Roman numerals
+MODES = {
+    "major": (0, 2, 4, 5, 7, 9, 11),
+    "minor": (0, 2, 3, 5, 7, 8, 10),
+}
+NUMERALS = ("I", "II", "III", "IV", "V", "VI", "VII")
+_NUMERAL = re.compile(r"^([b#]?)(VII|VI|V|IV|III|II|I|vii|vi|v|iv|iii|ii|i)(.*)$")
+_CHORD_NAME = re.compile(r"^([A-G][#b]?):?(.*)$")
+
+
+def parse_chord(symbol, key="C", mode="major", octave=4) -> tuple:
+    """
+    (root, quality, octave) of one chord symbol
+
+    Parameters:
+    - symbol: A Roman numeral in the key, upper case major, lower case
+      minor, with an optional quality suffix ("V7", "IVmaj7", "bVII",
+      "viio"), or a chord name with an optional quality ("F:sus4", "Am7")
+    - key, mode: Key Roman numerals are read in, mode "major" or "minor"
+    - octave: Octave of the root
+    """
+    match = _NUMERAL.match(symbol)
+    if match:
+        accidental, numeral, suffix = match.groups()
+        minor = numeral.islower()
+        degree = NUMERALS.index(numeral.upper())
+        pc = NOTE_INDEX[key] + MODES[mode][degree] + {"": 0, "#": 1, "b": -1}[accidental]
+        names = FLAT_NAMES if "b" in key or key == "F" else NOTE_NAMES
+        root = names[pc % 12]
+        if suffix == "":
+            quality = "minor" if minor else "major"
+        elif suffix == "7":
+            quality = "min7" if minor else "dom7"
+        elif suffix in ("o", "dim"):
+            quality = "dim"
+        else:
+            quality = resolve_quality(suffix)
+        return root, quality, octave
+
+    match = _CHORD_NAME.match(symbol)
+    if match is None:
+        raise ValueError(f"Cannot read chord {symbol!r}")
+    root, suffix = match.groups()
+    return root, resolve_quality(suffix), octave
+
+
+def parse_progression(progression, key="C", mode="major", octave=4) -> list:
+    """
+    List of (root, quality, octave) chords, as PAD.play_chord takes them
+
+    Parameters:
+    - progression: Chord symbols separated by spaces or dashes,
+      e.g. "I IVsus4 IVmaj7 V7 vi" or "ii7-V7-Imaj7", see parse_chord
+    """
+    symbols = [symbol for symbol in re.split(r"[\s\-]+", progression.strip()) if symbol]
+    return [parse_chord(symbol, key, mode, octave) for symbol in symbols]
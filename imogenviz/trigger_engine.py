@@ -0,0 +1,142 @@
+# Edge triggered finger events.
+#
+# Instead of firing while a finger is bent (level triggered, retriggers every
+# timeout while held) every finger of every hand runs a small state machine:
+#
+#   straight --(bend > on_threshold)--> bent      emits a rising event
+#   bent --(bend < off_threshold)--> straight     emits a falling event
+#
+# The gap between the two thresholds is the hysteresis that stops landmark
+# jitter near the switch point from double firing, and each voice has a
+# refractory period on top. Events carry a velocity estimated from how fast
+# the finger tip moved.
+#
+# The first frame of a hand, and the first one after it was lost, only
+# primes the state machine, so a hand that comes back already bent does
+# not play a hit.
+
+from dataclasses import dataclass
+
+import numpy as np
+
+from limbs import LimbIndex, HandLandmarks
+from gestures import FINGER_PIPS, FINGER_TIPS
+
+FINGERS = ("index", "middle", "ring", "pinky")
+WRIST = LimbIndex.WRIST.value
+MIDDLE_FINGER_MCP = LimbIndex.MIDDLE_FINGER_MCP.value
+
+
+@dataclass
+class TriggerEvent:
+    hand: int
+    finger: int
+    rising: bool
+    time: float
+    velocity: float = 1.0
+
+    @property
+    def finger_name(self) -> str:
+        return FINGERS[self.finger]
+
+
+class TriggerEngine:
+    """
+    Tracks finger bend per hand and dispatches edge events to callbacks
+
+    Bend is measured as (tip.y - pip.y) divided by the palm length (wrist to
+    middle finger mcp), so thresholds do not depend on the distance to the
+    camera. A finger counts as bent above 0, like check_finger_bent.
+
+    Parameters:
+    - n_hands: Number of hand slots passed to update
+    - on_threshold: Bend above which a straight finger becomes bent
+    - off_threshold: Bend below which a bent finger becomes straight
+    - refractory: Seconds after a rising event during which the same finger
+      can not fire again, a float or a (n_hands, 4) array per voice
+    - velocity_full_scale: Tip speed in palm lengths per second mapped to
+      velocity 1.0
+    - min_velocity: Velocity floor so slow bends are still audible
+    """
+
+    def __init__(self, n_hands=2, on_threshold=0.05, off_threshold=-0.05,
+                 refractory=0.06, velocity_full_scale=6.0, min_velocity=0.3):
+        self.n_hands = n_hands
+        self.on_threshold = on_threshold
+        self.off_threshold = off_threshold
+        self.refractory = np.broadcast_to(
+                np.asarray(refractory, dtype=np.float64), (n_hands, len(FINGERS))).copy()
+        self.velocity_full_scale = velocity_full_scale
+        self.min_velocity = min_velocity
+
+        self.bent = np.zeros((n_hands, len(FINGERS)), dtype=bool)
+        self.last_rise = np.full((n_hands, len(FINGERS)), -np.inf)
+        self.prev_tips = np.zeros((n_hands, len(FINGERS)))
+        self.prev_time = np.full(n_hands, np.nan)
+        self.callbacks = {}
+
+    def register(self, hand, finger, callback, rising=True):
+        """
+        Call callback(event) on every rising (or falling) edge of a finger
+
+        Parameters:
+        - hand: Hand slot, index into the list given to update
+        - finger: Index into FINGERS or its name
+        """
+        if isinstance(finger, str):
+            finger = FINGERS.index(finger)
+        self.callbacks.setdefault((hand, finger, rising), []).append(callback)
+
+    def update(self, hands: list[HandLandmarks], timestamp) -> list[TriggerEvent]:
+        """Feed one frame of hands, dispatch and return the resulting events"""
+        events = []
+        for hand_index, hand in enumerate(hands[:self.n_hands]):
+            if hand is None or len(hand) == 0:
+                # hand lost, the first frame after it comes back only primes
+                self.prev_time[hand_index] = np.nan
+                continue
+            events.extend(self._update_hand(hand_index, hand.points, timestamp))
+
+        for event in events:
+            for callback in self.callbacks.get((event.hand, event.finger, event.rising), ()):
+                callback(event)
+        return events
+
+    def _update_hand(self, hand_index, points, timestamp):
+        palm = np.hypot(*(points[MIDDLE_FINGER_MCP] - points[WRIST]).astype(np.float64))
+        palm = max(palm, 1.0)
+        tips = points[FINGER_TIPS, 1].astype(np.float64)
+        bend = (tips - points[FINGER_PIPS, 1]) / palm
+
+        dt = timestamp - self.prev_time[hand_index]
+        priming = np.isnan(dt)
+        if priming or dt <= 0:
+            speed = np.zeros(len(FINGERS))
+        else:
+            speed = (tips - self.prev_tips[hand_index]) / palm / dt
+        self.prev_tips[hand_index] = tips
+        self.prev_time[hand_index] = timestamp
+
+        bent = self.bent[hand_index]
+        if priming:
+            # first frame of a (re)acquired hand: take over the state it is
+            # in without firing, a hand coming back already bent is no hit
+            bent[bend > self.on_threshold] = True
+            bent[bend < self.off_threshold] = False
+            return []
+
+        rising = ~bent & (bend > self.on_threshold)
+        falling = bent & (bend < self.off_threshold)
+        bent[rising] = True
+        bent[falling] = False
+
+        allowed = timestamp - self.last_rise[hand_index] >= self.refractory[hand_index]
+        fire = rising & allowed
+        self.last_rise[hand_index][fire] = timestamp
+
+        velocity = np.clip(speed / self.velocity_full_scale, self.min_velocity, 1.0)
+        events = [TriggerEvent(hand_index, int(f), True, timestamp, float(velocity[f]))
+                  for f in np.flatnonzero(fire)]
+        events.extend(TriggerEvent(hand_index, int(f), False, timestamp, 0.0)
+                      for f in np.flatnonzero(falling))
+        return events
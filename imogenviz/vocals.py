@@ -0,0 +1,279 @@
+# Microphone input with a vocal effects chain.
+#
+# The mic goes through a chain of stages, any subset in this order:
+#   gate        mutes the mic below a level, no bleed between phrases
+#   compressor  evens out the level of the voice
+#   harmonizer  adds harmony voices at intervals from the sung pitch. A Yin
+#               pitch tracker follows the voice, and with a pad to follow
+#               every harmony voice lands on the nearest tone of the chord
+#               the pad is playing
+#   reverb      its own reverb, when the vocals play without a Mixer. In a
+#               mixer the shared reverb send of the vocal strip replaces it
+#
+# Every stage runs with the smallest lookahead / window pyo allows that
+# still sounds clean, as each of them adds to the time between singing and
+# hearing yourself. RoundTripMeter measures that time through the sound
+# card: it plays clicks and times them until they come back in at the mic.
+#
+# The live mic needs a duplex server (AudioSession(duplex=1)). For offline
+# renders and tests a WAV file stands in for the mic.
+
+import math
+import time
+
+from pyo import (
+        Abs,
+        Compress,
+        CosTable,
+        Delay,
+        Freeverb,
+        Gate,
+        Input,
+        Metro,
+        Mix,
+        Pan,
+        Pattern,
+        Phasor,
+        Pow,
+        SfPlayer,
+        Sig,
+        SigTo,
+        Sin,
+        Thresh,
+        Timer,
+        TrigEnv,
+        TrigFunc,
+        Wrap,
+        Yin,
+        )
+
+from params import Param, ParamBank
+from pyo_server import current_session, shared_server
+from theory import nearest_chord_tone
+
+VOCAL_CHAIN = ("gate", "compressor", "harmonizer", "reverb")
+
+# seconds between two harmony updates from the pitch tracker
+TRACK_INTERVAL = 0.025
+# Yin reports this or less when it found no pitch
+MIN_PITCH = 60.0
+
+
+class PitchShifter:
+    """
+    Delay line pitch shifter, one output stream per transposition
+
+    Two taps read the delay line at a delay sweeping over winsize, each
+    faded in and out by a sine window half a sweep apart, so the read
+    position always moves at 2 ** (semitones / 12) of the write speed.
+    This is what pyo's Harmonizer does, built from objects that also run
+    on the manual offline server, where Harmonizer only produces NaN.
+
+    Parameters:
+    - transpo: Semitones, a float or a (multichannel) pyo object
+    - winsize: Seconds of the sweep, shorter is less delay but rougher
+    """
+
+    def __init__(self, signal, transpo=0.0, winsize=0.05, mul=1.0):
+        # sweep rate that makes the read speed 2 ** (transpo / 12)
+        self.rate = (1 - Pow(2.0, transpo / 12.0)) / winsize
+        self.phase = Phasor(freq=self.rate)
+        self.phase2 = Wrap(self.phase + 0.5)
+        taps = []
+        for phase in (self.phase, self.phase2):
+            delay = Delay(signal, delay=phase * winsize + 0.001, maxdelay=winsize + 0.01)
+            taps.append(delay * Sin(phase * math.pi))
+        self.taps = taps
+        self.output = Sig(taps[0] + taps[1], mul=mul)
+
+
+def open_vocal_input(path=None, chnl=0):
+    """
+    Mono mic signal
+
+    Parameters:
+    - path: Sound file to loop instead of the mic, for offline renders
+    - chnl: Input channel of the sound card
+    """
+    if path is None:
+        return Input(chnl=chnl)
+    return Mix(SfPlayer(path, loop=True), voices=1)
+
+
+class VocalChain:
+    """
+    Parameters:
+    - server: Running pyo server, the shared audio session by default, it
+      has to be duplex for the live mic
+    - source: Mic signal, open_vocal_input() by default
+    - chain: Stage names from VOCAL_CHAIN, in that order
+    - intervals: Semitones of the harmony voices above (or below) the voice
+    - pad: PAD to follow, harmonies snap to the tones of its chord
+    """
+
+    def __init__(self, server=None, source=None, chain=VOCAL_CHAIN, intervals=(4, 7),
+                 pad=None):
+        unknown = [stage for stage in chain if stage not in VOCAL_CHAIN]
+        if unknown:
+            raise ValueError(f"Unknown vocal stages {unknown}, expected some of {VOCAL_CHAIN}")
+        session = current_session() if server is None else None
+        self.server = shared_server(server)
+        if source is None:
+            if session is not None and not session.duplex:
+                raise RuntimeError("The live mic needs a duplex server, start it with duplex=1")
+            source = open_vocal_input()
+        self.source = source
+        self.chain = tuple(stage for stage in VOCAL_CHAIN if stage in chain)
+        self.pad = pad
+
+        self.harmony_names = [f"harmony_{i + 1}" for i in range(len(intervals))]
+        params = {
+            "volume": Param(0.8, low=0.0, high=1.0, min_delta=0.005),
+            "gate_thresh": Param(-50.0, low=-90.0, high=0.0, min_delta=0.5),
+            "comp_thresh": Param(-20.0, low=-60.0, high=0.0, min_delta=0.5),
+            "comp_ratio": Param(4.0, low=1.0, high=20.0, min_delta=0.1),
+            "harmony_mix": Param(0.5, low=0.0, high=1.0, min_delta=0.005),
+        }
+        if "reverb" in self.chain:
+            # without the stage (in a Mixer) the vocal strip's reverb send is the wet level
+            params["wet"] = Param(0.3, low=0.0, high=1.0, time=0.2, min_delta=0.005)
+        for name, interval in zip(self.harmony_names, intervals):
+            params[name] = Param(interval, low=-12.0, high=12.0, min_delta=0.5)
+        self.params = ParamBank(params)
+
+        signal = self.source
+        if "gate" in self.chain:
+            self.gate = Gate(signal, thresh=self.params["gate_thresh"], risetime=0.005,
+                             falltime=0.08, lookahead=1.0)
+            signal = self.gate
+        if "compressor" in self.chain:
+            self.compressor = Compress(signal, thresh=self.params["comp_thresh"],
+                                       ratio=self.params["comp_ratio"], risetime=0.005,
+                                       falltime=0.1, lookahead=1.0, knee=0.5)
+            signal = self.compressor
+        if "harmonizer" in self.chain:
+            self.yin = Yin(signal, tolerance=0.2, minfreq=MIN_PITCH, maxfreq=1000, winsize=1024)
+            self.transpo = SigTo([float(interval) for interval in intervals], time=0.03)
+            # a short window keeps the shifter's delay low
+            self.harmonizer = PitchShifter(signal, transpo=self.transpo, winsize=0.05,
+                                           mul=self.params["harmony_mix"])
+            signal = Mix([signal, self.harmonizer.output], voices=1)
+            self.tracker = Pattern(self._track, time=TRACK_INTERVAL).play()
+        self.signal = signal
+        self.output = Pan(signal, outs=2, pan=0.5, mul=self.params["volume"]).out()
+
+        self.reverb = None
+        if "reverb" in self.chain:
+            # dry is already on the output, the reverb only adds the room
+            self.send = signal * self.params["wet"]
+            self.reverb = Freeverb(self.send, size=0.85, damp=0.5, bal=1.0).out()
+
+    def _track(self):
+        # audio thread, every TRACK_INTERVAL: retune the harmony voices
+        pitch = self.yin.get()
+        if pitch <= MIN_PITCH:
+            return
+        note = 69 + 12 * math.log2(pitch / 440.0)
+        chord = self.pad.voicing if self.pad is not None else None
+        transpo = []
+        for name in self.harmony_names:
+            target = note + round(self.params.get(name))
+            if chord is not None:
+                target = nearest_chord_tone(target, chord)
+            transpo.append(target - note)
+        current = self.transpo.value
+        if any(abs(a - b) > 0.05 for a, b in zip(transpo, current)):
+            self.transpo.value = transpo
+
+    def set_param(self, name, value):
+        """
+        Set any smoothed parameter by name, used by the mapping engine
+
+        Parameters:
+        - name: One of self.params.names, e.g. "harmony_mix" or "harmony_1",
+          "wet" only with the reverb stage
+        - value: New target, clamped to the parameter range
+        """
+        return self.params.set(name, value)
+
+    def close(self):
+        if "harmonizer" in self.chain:
+            self.tracker.stop()
+        if self.reverb is not None:
+            self.reverb.stop()
+        self.output.stop()
+
+
+class RoundTripMeter:
+    """
+    Time from a click leaving the output until it arrives at the input
+
+    Needs the output to reach the mic, a loopback cable or the speakers
+    close enough. The result includes both buffers and the converters,
+    which is what a singer hears as the delay of their own voice.
+
+    Parameters:
+    - server: Running duplex pyo server, the shared session by default
+    - mic: Input signal, Input(0) by default
+    - loopback: Seconds, instead of a mic the clicks come back through a
+      delay this long, to check the meter offline
+    - threshold: Input level that counts as the click arriving
+    - interval: Seconds between clicks, longer than the round trip
+    """
+
+    def __init__(self, server=None, mic=None, loopback=None, threshold=0.1, interval=0.5, level=0.5):
+        self.server = shared_server(server)
+        self.interval = interval
+        self.metro = Metro(interval)
+        self.click = TrigEnv(self.metro, table=CosTable([(0, 0.0), (32, 1.0), (8191, 0.0)]),
+                             dur=0.005, mul=level)
+        self.output = Pan(self.click, outs=2, pan=0.5)
+        # created after the click, so a loopback hears it in the same block
+        if loopback is not None:
+            mic = Delay(self.click, delay=loopback, maxdelay=max(1.0, loopback))
+        self.mic = mic if mic is not None else Input(0)
+        self.onset = Thresh(Abs(self.mic), threshold=threshold)
+        # sample accurate, started by the click and stopped by its arrival
+        self.timer = Timer(self.onset, self.metro)
+        self.waiting = False
+        self.sent = 0
+        self.samples = []
+        self.callbacks = [TrigFunc(self.metro, self._sent), TrigFunc(self.onset, self._received)]
+
+    def _sent(self):
+        self.sent += 1
+        self.waiting = True
+
+    def _received(self):
+        # only the first crossing of each click, the rest is its tail
+        if self.waiting:
+            self.waiting = False
+            self.samples.append(self.timer.get())
+
+    def measure(self, n_clicks=5) -> dict:
+        """Play n_clicks clicks and report the round trip, blocks for their duration"""
+        self.sent = 0
+        self.samples = []
+        self.output.out()
+        self.metro.play()
+        duration = n_clicks * self.interval
+        session = current_session()
+        if session is not None and session.offline and session.server is self.server:
+            # manual server, audio only advances when we compute it
+            blocks = int(duration * self.server.getSamplingRate() / self.server.getBufferSize())
+            for _ in range(blocks):
+                self.server.process()
+        else:
+            time.sleep(duration)
+        self.metro.stop()
+        self.output.stop()
+        return self.report()
+
+    def report(self) -> dict:
+        """Round trip in ms, and the floor set by the input and output buffers"""
+        buffer_ms = 1000 * self.server.getBufferSize() / self.server.getSamplingRate()
+        report = {"clicks": self.sent, "received": len(self.samples), "buffer_floor_ms": 2 * buffer_ms}
+        if self.samples:
+            samples = sorted(1000 * sample for sample in self.samples)
+            report.update(min_ms=samples[0], median_ms=samples[len(samples) // 2], max_ms=samples[-1])
+        return report